@@ -0,0 +1,549 @@
+"""
+Builds valid synthetic roms encrypted with generated test keys, so the parsers
+can be exercised without real dumps or prod.keys.
+"""
+
+import hashlib
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from random import Random
+
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from nxroms.keyring import Keyring
+
+# fixed test keys, nothing here is a real console key
+TEST_HEADER_KEY = bytes(range(0x20))
+TEST_KEY_AREA_KEY = bytes(range(0x40, 0x50))
+
+# the decrypted key area of every nca: xts, ctr and an unused key
+TEST_KEY_AREA = bytes(range(0x80, 0xC0))
+
+MEDIA_SIZE = 0x200
+ROMFS_EMPTY = 0xFFFFFFFF
+IVFC_LEVELS = 6
+
+
+@dataclass
+class FixtureSpec:
+    # romfs files of the program nca
+    file_count: int = 8
+    file_size: int = 0x4000
+
+    # directories between the root and every file
+    romfs_depth: int = 2
+
+    # size of the code in the exefs
+    exefs_size: int = 0x3000
+
+    # log2 of the ivfc block size
+    ivfc_block_log2: int = 14
+
+    title_id: int = 0x0100000000001000
+    name: str = "Test Game"
+    seed: int = 0
+
+
+def write_keys(path: str | Path):
+    """
+    Writes the test keys in the prod.keys format
+    """
+    with open(path, "w") as f:
+        f.write(f"header_key = {TEST_HEADER_KEY.hex()}\n")
+        f.writelines(
+            f"key_area_key_{kind}_00 = {TEST_KEY_AREA_KEY.hex()}\n"
+            for kind in ("application", "ocean", "system")
+        )
+
+
+def install_keys(path: str | Path) -> Keyring:
+    """
+    Writes the test keys and makes them the default keyring
+    """
+    write_keys(path)
+    keyring = Keyring(path)
+    Keyring.set_default(keyring)
+    return keyring
+
+
+def _align(value: int, align: int) -> int:
+    return (value + align - 1) // align * align
+
+
+def _pad(data: bytes, align: int) -> bytes:
+    return data + bytes(_align(len(data), align) - len(data))
+
+
+def ctr_encrypt(data: bytes, key: bytes, ctr: int, offset: int) -> bytes:
+    """
+    Encrypts section data the way the ncas do, the counter depends on the offset in the nca
+    """
+    iv = ((offset >> 4) | (ctr << 64)).to_bytes(16, "big")
+    encryptor = Cipher(algorithms.AES(key), modes.CTR(iv)).encryptor()
+    return encryptor.update(data) + encryptor.finalize()
+
+
+def xts_encrypt(data: bytes, key: bytes, sector: int = 0) -> bytes:
+    out = []
+    for offset in range(0, len(data), 0x200):
+        tweak = (sector + offset // 0x200).to_bytes(16, "big")
+        encryptor = Cipher(algorithms.AES(key), modes.XTS(tweak)).encryptor()
+        out.append(encryptor.update(data[offset : offset + 0x200]) + encryptor.finalize())
+    return b"".join(out)
+
+
+def _romfs_hash(parent: int, name: bytes, count: int) -> int:
+    value = parent ^ 123456789
+    for c in name:
+        value = ((value >> 5) | (value << 27)) & 0xFFFFFFFF
+        value ^= c
+    return value % count
+
+
+def _split(path: str) -> tuple[str, bytes]:
+    parent, _, name = path.rpartition("/")
+    return parent, name.encode()
+
+
+def build_romfs(files: dict[str, bytes]) -> bytes:
+    """
+    Builds a RomFS image with its hash tables, directory and file tables
+
+    Args:
+        files (dict[str, bytes]): The data of every file by path, like `dir/file.bin`
+    """
+    children: dict[str, list[str]] = {"": []}
+    dir_files: dict[str, list[str]] = {"": []}
+    for path in sorted(files):
+        parent = ""
+        for part in path.split("/")[:-1]:
+            current = f"{parent}/{part}" if parent else part
+            if current not in children:
+                children[current] = []
+                dir_files[current] = []
+                children[parent].append(current)
+            parent = current
+        dir_files[parent].append(path)
+
+    dirs = []
+
+    def visit(directory: str):
+        dirs.append(directory)
+        for x in children[directory]:
+            visit(x)
+
+    visit("")
+    file_order = [x for d in dirs for x in dir_files[d]]
+
+    dir_offsets = {}
+    offset = 0
+    for d in dirs:
+        dir_offsets[d] = offset
+        offset += _align(0x18 + len(_split(d)[1]), 4)
+
+    file_offsets = {}
+    offset = 0
+    for x in file_order:
+        file_offsets[x] = offset
+        offset += _align(0x20 + len(_split(x)[1]), 4)
+
+    data = bytearray()
+    data_offsets = {}
+    for x in file_order:
+        data += bytes(_align(len(data), 0x10) - len(data))
+        data_offsets[x] = len(data)
+        data += files[x]
+
+    dir_buckets = [ROMFS_EMPTY] * len(dirs)
+    dir_next = {}
+    for d in dirs:
+        parent, name = _split(d)
+        bucket = _romfs_hash(dir_offsets[parent] if d else 0, name, len(dirs))
+        dir_next[d] = dir_buckets[bucket]
+        dir_buckets[bucket] = dir_offsets[d]
+
+    file_count = max(len(file_order), 1)
+    file_buckets = [ROMFS_EMPTY] * file_count
+    file_next = {}
+    for x in file_order:
+        parent, name = _split(x)
+        bucket = _romfs_hash(dir_offsets[parent], name, file_count)
+        file_next[x] = file_buckets[bucket]
+        file_buckets[bucket] = file_offsets[x]
+
+    dir_table = bytearray()
+    for d in dirs:
+        parent, name = _split(d)
+        siblings = children[parent] if d else [d]
+        index = siblings.index(d)
+
+        sibling = dir_offsets[siblings[index + 1]] if index + 1 < len(siblings) else ROMFS_EMPTY
+        child = dir_offsets[children[d][0]] if children[d] else ROMFS_EMPTY
+        file = file_offsets[dir_files[d][0]] if dir_files[d] else ROMFS_EMPTY
+
+        entry = struct.pack(
+            "<IIIIII", dir_offsets[parent] if d else 0, sibling, child, file, dir_next[d], len(name)
+        )
+        dir_table += _pad(entry + name, 4)
+
+    file_table = bytearray()
+    for x in file_order:
+        parent, name = _split(x)
+        siblings = dir_files[parent]
+        index = siblings.index(x)
+
+        sibling = file_offsets[siblings[index + 1]] if index + 1 < len(siblings) else ROMFS_EMPTY
+        entry = struct.pack(
+            "<IIQQII",
+            dir_offsets[parent],
+            sibling,
+            data_offsets[x],
+            len(files[x]),
+            file_next[x],
+            len(name),
+        )
+        file_table += _pad(entry + name, 4)
+
+    dir_hash = struct.pack(f"<{len(dir_buckets)}I", *dir_buckets)
+    file_hash = struct.pack(f"<{len(file_buckets)}I", *file_buckets)
+
+    dir_hash_offset = 0x50
+    dir_table_offset = dir_hash_offset + len(dir_hash)
+    file_hash_offset = dir_table_offset + len(dir_table)
+    file_table_offset = file_hash_offset + len(file_hash)
+    data_offset = _align(file_table_offset + len(file_table), 0x10)
+
+    header = struct.pack(
+        "<QQQQQQQQQQ",
+        0x50,
+        dir_hash_offset,
+        len(dir_hash),
+        dir_table_offset,
+        len(dir_table),
+        file_hash_offset,
+        len(file_hash),
+        file_table_offset,
+        len(file_table),
+        data_offset,
+    )
+    tables = _pad(header + dir_hash + dir_table + file_hash + file_table, 0x10)
+    return tables + bytes(data)
+
+
+def build_ivfc(data: bytes, block_log2: int = 14, rng: Random | None = None) -> tuple[bytes, bytes]:
+    """
+    Builds the hash levels of a romfs section
+
+    Returns:
+        The section, with the levels first and the data last, and its hash data
+    """
+    rng = rng or Random(0)
+    block_size = 1 << block_log2
+
+    levels = [data]
+    while len(levels) < IVFC_LEVELS:
+        hashes = bytearray()
+        for offset in range(0, len(levels[0]), block_size):
+            block = levels[0][offset : offset + block_size]
+            hashes += hashlib.sha256(block.ljust(block_size, b"\0")).digest()
+        levels.insert(0, bytes(hashes))
+
+    if len(levels[0]) > block_size:
+        raise ValueError("The data is too large for the ivfc block size")
+    master = hashlib.sha256(levels[0].ljust(block_size, b"\0")).digest()
+
+    section = bytearray()
+    descriptors = bytearray()
+    for level in levels:
+        section += bytes(_align(len(section), block_size) - len(section))
+        descriptors += struct.pack("<QQII", len(section), len(level), block_log2, 0)
+        section += level
+    section += bytes(_align(len(section), MEDIA_SIZE) - len(section))
+
+    salt = rng.randbytes(0x20)
+    hash_data = b"IVFC" + struct.pack("<III", 0x20000, 0x20, IVFC_LEVELS + 1)
+    hash_data += descriptors + salt + master
+    return bytes(section), hash_data.ljust(0xF8, b"\0")
+
+
+def build_sha256(data: bytes, block_size: int = 0x1000) -> tuple[bytes, bytes]:
+    """
+    Builds the hash table of a partition section
+
+    Returns:
+        The section, with the hash table first, and its hash data
+    """
+    hashes = b"".join(
+        hashlib.sha256(data[x : x + block_size]).digest()
+        for x in range(0, len(data), block_size)
+    )
+    data_offset = _align(len(hashes), MEDIA_SIZE)
+    section = _pad(hashes.ljust(data_offset, b"\0") + data, MEDIA_SIZE)
+
+    hash_data = hashlib.sha256(hashes).digest() + struct.pack("<II", block_size, 2)
+    hash_data += struct.pack("<QQQQ", 0, len(hashes), data_offset, len(data))
+    return section, hash_data.ljust(0xF8, b"\0")
+
+
+def build_pfs0(
+    files: list[tuple[str, bytes]],
+    magic: bytes = b"PFS0",
+    entry_size: int = 0x18,
+    hashed_size: int = 0x200,
+) -> bytes:
+    """
+    Builds a PFS0, or an HFS0 with `magic` b"HFS0" and `entry_size` 0x40
+
+    Args:
+        files (list[tuple[str, bytes]]): The name and data of every entry
+        hashed_size (int): How much of every entry the HFS0 hashes cover
+    """
+    names = bytearray()
+    name_offsets = []
+    for name, _ in files:
+        name_offsets.append(len(names))
+        names += name.encode() + b"\0"
+
+    header_size = 0x10 + entry_size * len(files) + len(names)
+    names += bytes(_align(header_size, 0x20) - header_size)
+
+    entries = bytearray()
+    offset = 0
+    for (name, data), name_offset in zip(files, name_offsets):
+        if entry_size == 0x18:
+            entries += struct.pack("<QQII", offset, len(data), name_offset, 0)
+        else:
+            hashed = min(hashed_size, len(data))
+            entries += struct.pack("<QQIIQ", offset, len(data), name_offset, hashed, 0)
+            entries += hashlib.sha256(data[:hashed]).digest()
+        offset += len(data)
+
+    header = magic + struct.pack("<III", len(files), len(names), 0) + entries + names
+    return header + b"".join(x for _, x in files)
+
+
+def build_nca(
+    sections: list[tuple[str, bytes]],
+    content_type: int = 0,
+    program_id: int = 0x0100000000001000,
+    ivfc_block_log2: int = 14,
+    rng: Random | None = None,
+) -> bytes:
+    """
+    Builds an NCA3 with AES-CTR sections, encrypted with the test keys
+
+    Args:
+        sections (list[tuple[str, bytes]]): The kind, `romfs` or `pfs0`, and plain data of every section
+        content_type (int): The `ContentType` value
+        program_id (int): The title id
+    """
+    rng = rng or Random(0)
+    ctr_key = TEST_KEY_AREA[0x20:0x30]
+
+    body = bytearray()
+    fs_entries = bytearray()
+    fs_headers = []
+    offset = 0xC00
+
+    for index, (kind, payload) in enumerate(sections):
+        ctr = index + 1
+        if kind == "romfs":
+            section, hash_data = build_ivfc(payload, ivfc_block_log2, rng)
+            fs_type, hash_type = 0, 3
+        else:
+            section, hash_data = build_sha256(payload)
+            fs_type, hash_type = 1, 2
+
+        start = _align(offset, MEDIA_SIZE)
+        body += bytes(start - offset)
+        body += ctr_encrypt(section, ctr_key, ctr, start)
+        offset = start + len(section)
+
+        fs_entries += struct.pack("<IIQ", start // MEDIA_SIZE, offset // MEDIA_SIZE, 0)
+
+        # version, fs type, hash type, aes ctr encryption
+        fs_header = struct.pack("<HBBBBH", 2, fs_type, hash_type, 3, 0, 0) + hash_data
+        fs_header = fs_header.ljust(0x140, b"\0") + struct.pack("<Q", ctr)
+        fs_headers.append(fs_header.ljust(0x200, b"\0"))
+
+    encryptor = Cipher(algorithms.AES(TEST_KEY_AREA_KEY), modes.ECB()).encryptor()
+    key_area = encryptor.update(TEST_KEY_AREA) + encryptor.finalize()
+    header_hashes = b"".join(hashlib.sha256(x).digest() for x in fs_headers)
+
+    main = b"NCA3" + bytes([1, content_type, 0, 0])
+    main += struct.pack("<QQI", offset, program_id, 0) + bytes([0, 0, 12, 0])
+    # key generation and the rights id stay zero
+    main = main.ljust(0x40, b"\0")
+    main += fs_entries.ljust(0x40, b"\0") + header_hashes.ljust(0x80, b"\0") + key_area
+
+    header = rng.randbytes(0x200) + main.ljust(0x200, b"\0") + b"".join(fs_headers)
+    return xts_encrypt(header.ljust(0xC00, b"\0"), TEST_HEADER_KEY) + bytes(body)
+
+
+def build_nacp(name: str = "Test Game", publisher: str = "nxroms", version: str = "1.0.0") -> bytes:
+    title = name.encode().ljust(0x200, b"\0") + publisher.encode().ljust(0x100, b"\0")
+    nacp = (title * 16).ljust(0x3060, b"\0") + version.encode().ljust(0x10, b"\0")
+    return nacp.ljust(0x4000, b"\0")
+
+
+def build_cnmt(title_id: int, contents: list[tuple[bytes, int]], version: int = 0) -> bytes:
+    """
+    Builds the content meta of an application
+
+    Args:
+        contents (list[tuple[bytes, int]]): Every nca and its content meta content type
+    """
+    extended = struct.pack("<QII", title_id + 0x800, 0, 0)
+    header = struct.pack(
+        "<QIBBHHHBBBB", title_id, version, 0x80, 0, len(extended), len(contents), 0, 0, 0, 0, 0
+    ).ljust(0x20, b"\0")
+
+    records = bytearray()
+    for data, content_type in contents:
+        digest = hashlib.sha256(data).digest()
+        records += digest + digest[:0x10] + len(data).to_bytes(6, "little") + bytes([content_type, 0])
+
+    return header + extended + bytes(records) + bytes(0x20)
+
+
+def nca_name(data: bytes) -> str:
+    return hashlib.sha256(data).digest()[:0x10].hex() + ".nca"
+
+
+def build_romfs_files(spec: FixtureSpec, rng: Random) -> dict[str, bytes]:
+    """
+    Builds the files of the program romfs, spread over directories `romfs_depth` deep
+    """
+    files = {}
+    for index in range(spec.file_count):
+        parts = [f"dir{(index >> level) % 4}" for level in range(spec.romfs_depth)]
+        files["/".join([*parts, f"file{index}.bin"])] = rng.randbytes(spec.file_size)
+    return files
+
+
+def build_nsp_entries(spec: FixtureSpec | None = None) -> list[tuple[str, bytes]]:
+    """
+    Builds the ncas and ticket of an application: a program nca with an exefs and a romfs,
+    a control nca with the nacp and the meta nca
+
+    Returns:
+        The name and data of every entry
+    """
+    spec = spec or FixtureSpec()
+    rng = Random(spec.seed)
+    title_id = spec.title_id
+
+    control_files = {
+        "control.nacp": build_nacp(spec.name),
+        "icon_AmericanEnglish.dat": rng.randbytes(0x1000),
+    }
+    control = build_nca(
+        [("romfs", build_romfs(control_files))], 2, title_id, spec.ivfc_block_log2, rng
+    )
+
+    exefs = build_pfs0(
+        [("main", rng.randbytes(spec.exefs_size)), ("main.npdm", rng.randbytes(0x400))]
+    )
+    romfs = build_romfs(build_romfs_files(spec, rng))
+    program = build_nca(
+        [("pfs0", exefs), ("romfs", romfs)], 0, title_id, spec.ivfc_block_log2, rng
+    )
+
+    cnmt = build_cnmt(title_id, [(program, 1), (control, 3)])
+    meta = build_nca(
+        [("pfs0", build_pfs0([(f"Application_{title_id:016x}.cnmt", cnmt)]))],
+        1,
+        title_id,
+        spec.ivfc_block_log2,
+        rng,
+    )
+
+    return [
+        (nca_name(program), program),
+        (nca_name(control), control),
+        (nca_name(meta).replace(".nca", ".cnmt.nca"), meta),
+        ("ticket.tik", bytes(0x2C0)),
+    ]
+
+
+def build_nsp(spec: FixtureSpec | None = None) -> bytes:
+    return build_pfs0(build_nsp_entries(spec))
+
+
+def build_xci(entries: list[tuple[str, bytes]], padding: int = 0x10000) -> bytes:
+    """
+    Builds a gamecard image with `entries` in the secure partition
+
+    Args:
+        entries (list[tuple[str, bytes]]): The name and data of every secure entry
+        padding (int): The count of 0xFF bytes after the data, like an untrimmed dump
+    """
+    partitions = [
+        ("update", build_pfs0([], b"HFS0", 0x40)),
+        ("normal", build_pfs0([], b"HFS0", 0x40)),
+        ("secure", build_pfs0(entries, b"HFS0", 0x40)),
+    ]
+
+    # the root entries hash the header of every partition
+    names = bytearray()
+    name_offsets = []
+    for name, _ in partitions:
+        name_offsets.append(len(names))
+        names += name.encode() + b"\0"
+
+    header_size = 0x10 + 0x40 * len(partitions) + len(names)
+    names += bytes(_align(header_size, 0x20) - header_size)
+
+    root_entries = bytearray()
+    offset = 0
+    for (_, data), name_offset in zip(partitions, name_offsets):
+        count, names_size = struct.unpack_from("<II", data, 4)
+        hashed = 0x10 + 0x40 * count + names_size
+        root_entries += struct.pack("<QQIIQ", offset, len(data), name_offset, hashed, 0)
+        root_entries += hashlib.sha256(data[:hashed]).digest()
+        offset += len(data)
+
+    root = b"HFS0" + struct.pack("<III", len(partitions), len(names), 0) + root_entries + names
+    root_offset = 0xF000
+    total = _align(root_offset + len(root) + offset, MEDIA_SIZE)
+
+    head = bytes(0x100) + b"HEAD" + struct.pack("<I", 0x10)
+    # card size, 0xFA is 1 GB
+    head = head.ljust(0x10C, b"\0") + bytes([0, 0xFA, 0, 0])
+    head = head.ljust(0x118, b"\0") + struct.pack("<I", total // MEDIA_SIZE - 1)
+    head = head.ljust(0x130, b"\0") + struct.pack("<QQ", root_offset, len(root))
+    head += hashlib.sha256(root).digest()
+
+    image = head.ljust(root_offset, b"\0") + root + b"".join(x for _, x in partitions)
+    return _pad(image, MEDIA_SIZE) + b"\xff" * padding
+
+
+def write_fixtures(out_dir: str | Path, spec: FixtureSpec | None = None, count: int = 1) -> list[Path]:
+    """
+    Writes `count` nsps and as many xcis, each with its own title id
+
+    Returns:
+        The written roms
+    """
+    spec = spec or FixtureSpec()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    paths = []
+    for index in range(count):
+        rom_spec = FixtureSpec(**{
+            **spec.__dict__,
+            "title_id": spec.title_id + (index << 13),
+            "seed": spec.seed + index,
+        })
+        entries = build_nsp_entries(rom_spec)
+
+        nsp = out_dir / f"game{index}.nsp"
+        nsp.write_bytes(build_pfs0(entries))
+
+        xci = out_dir / f"game{index}.xci"
+        xci.write_bytes(build_xci(entries))
+        paths += [nsp, xci]
+
+    return paths
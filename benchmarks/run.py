@@ -0,0 +1,308 @@
+"""
+Times every layer on synthetic roms and keeps the results, so regressions show up
+against the previous runs.
+
+    python -m benchmarks.run
+    python -m benchmarks.run --file-count 200 --file-size 0x40000 --only ctr_read
+"""
+
+from argparse import ArgumentParser
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from typing import Callable
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import time
+
+from nxroms.extract import extract_romfs
+from nxroms.fs.fs import FsType
+from nxroms.fs.romfs import RomFS
+from nxroms.nca.header import NcaHeader
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from nxroms.roms.xci import Xci
+from nxroms.scanner import scan_file
+
+from .fixtures import FixtureSpec, install_keys, write_fixtures
+
+RESULTS_PATH = Path(__file__).parent / "results.jsonl"
+
+# reads of the ctr benchmark
+READ_CHUNK_SIZE = 0x100000
+
+HEADER_PARSE_COUNT = 200
+
+# a run slower than the median of the previous ones by this much is a regression
+REGRESSION_THRESHOLD = 0.2
+
+
+@dataclass
+class BenchResult:
+    name: str
+
+    # the best of the repeats, in seconds
+    seconds: float
+
+    # bytes processed by one repeat, for the throughput
+    bytes: int = 0
+
+    @property
+    def throughput(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+
+def measure(func: Callable[[], int], repeat: int) -> tuple[float, int]:
+    """
+    Runs `func` `repeat` times
+
+    Returns:
+        The fastest time and what `func` returned, the bytes it processed
+    """
+    best = None
+    processed = 0
+    for _ in range(repeat):
+        start = perf_counter()
+        processed = func()
+        elapsed = perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return best, processed
+
+
+def _get_program_romfs(nsp: Nsp):
+    for nca in nsp.get_ncas():
+        for header in nca.header.fs_headers:
+            if header.fs_type == FsType.ROM_FS and nca.header.content_type.name == "PROGRAM":
+                return nca, header
+    raise ValueError("The fixture has no program romfs")
+
+
+class Benchmarks:
+    def __init__(self, roms: list[Path], work_dir: Path, repeat: int):
+        self.roms = roms
+        self.nsp = next(x for x in roms if x.suffix == ".nsp")
+        self.xci = next(x for x in roms if x.suffix == ".xci")
+        self.work_dir = work_dir
+        self.repeat = repeat
+
+    def header_parse(self) -> int:
+        file = File(str(self.nsp))
+        try:
+            raw = Nsp(file).get_items()[0].peek_at(0, 0xC00)
+        finally:
+            file.close()
+
+        for _ in range(HEADER_PARSE_COUNT):
+            NcaHeader(raw)
+        return len(raw) * HEADER_PARSE_COUNT
+
+    def header_lazy(self) -> int:
+        file = File(str(self.nsp))
+        try:
+            raw = Nsp(file).get_items()[0].peek_at(0, 0xC00)
+        finally:
+            file.close()
+
+        for _ in range(HEADER_PARSE_COUNT):
+            header = NcaHeader(raw, lazy=True)
+            header.content_type, header.program_id
+        return len(raw) * HEADER_PARSE_COUNT
+
+    def ctr_read(self) -> int:
+        file = File(str(self.nsp))
+        try:
+            nca, header = _get_program_romfs(Nsp(file))
+            section = nca.open_section(header)
+
+            total = 0
+            while data := section.read(READ_CHUNK_SIZE):
+                total += len(data)
+            return total
+        finally:
+            file.close()
+
+    def romfs_walk(self) -> int:
+        file = File(str(self.nsp))
+        try:
+            nca, header = _get_program_romfs(Nsp(file))
+            romfs = RomFS(nca.open_fs(header))
+            for x in romfs.files:
+                romfs.get_path(x)
+            return romfs.header.file_meta_table_size + romfs.header.dir_meta_table_size
+        finally:
+            file.close()
+
+    def extract(self) -> int:
+        out = self.work_dir / "extract"
+        file = File(str(self.nsp))
+        try:
+            nca, header = _get_program_romfs(Nsp(file))
+            manifest = extract_romfs(nca.open_romfs(header), out, ("sha256",))
+            return sum(x.size for x in manifest)
+        finally:
+            file.close()
+            shutil.rmtree(out, ignore_errors=True)
+
+    def xci_parse(self) -> int:
+        file = File(str(self.xci))
+        try:
+            Xci(file).open_nsp().get_ncas()
+            return 0
+        finally:
+            file.close()
+
+    def scan(self) -> int:
+        for x in self.roms:
+            record = scan_file(str(x))
+            if record.error:
+                raise RuntimeError(f"{x}: {record.error}")
+        return sum(x.stat().st_size for x in self.roms)
+
+    def get_all(self) -> dict[str, Callable[[], int]]:
+        return {
+            "header_parse": self.header_parse,
+            "header_lazy": self.header_lazy,
+            "ctr_read": self.ctr_read,
+            "romfs_walk": self.romfs_walk,
+            "extract": self.extract,
+            "xci_parse": self.xci_parse,
+            "scan": self.scan,
+        }
+
+    def run(self, only: list[str] | None = None) -> list[BenchResult]:
+        results = []
+        for name, func in self.get_all().items():
+            if only and name not in only:
+                continue
+
+            seconds, processed = measure(func, self.repeat)
+            results.append(BenchResult(name, seconds, processed))
+
+        return results
+
+
+def _get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path: Path, spec: FixtureSpec) -> list[dict]:
+    """
+    Reads the previous runs made with the same fixtures
+    """
+    if not path.exists():
+        return []
+
+    runs = []
+    with path.open() as f:
+        for line in f:
+            if not line.strip():
+                continue
+            run = json.loads(line)
+            if run.get("spec") == asdict(spec):
+                runs.append(run)
+    return runs
+
+
+def find_regressions(
+    results: list[BenchResult], history: list[dict], threshold: float, window: int
+) -> list[tuple[str, float, float]]:
+    """
+    Compares every result with the median of the last `window` runs
+
+    Returns:
+        The name, baseline and current time of every benchmark that got slower by more than `threshold`
+    """
+    regressions = []
+    for result in results:
+        previous = [
+            x["results"][result.name]["seconds"]
+            for x in history[-window:]
+            if result.name in x["results"]
+        ]
+        if not previous:
+            continue
+
+        baseline = median(previous)
+        if result.seconds > baseline * (1 + threshold):
+            regressions.append((result.name, baseline, result.seconds))
+
+    return regressions
+
+
+def save_run(path: Path, spec: FixtureSpec, results: list[BenchResult]):
+    run = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _get_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "spec": asdict(spec),
+        "results": {
+            x.name: {"seconds": x.seconds, "bytes": x.bytes, "throughput": x.throughput}
+            for x in results
+        },
+    }
+    with path.open("a") as f:
+        f.write(json.dumps(run) + "\n")
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = ArgumentParser(description="Benchmarks nxroms on synthetic roms")
+    parser.add_argument("--file-count", type=int, default=64)
+    parser.add_argument("--file-size", type=lambda x: int(x, 0), default=0x10000)
+    parser.add_argument("--depth", type=int, default=3, help="romfs directory depth")
+    parser.add_argument("--roms", type=int, default=4, help="nsps and xcis for the scan")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="benchmarks to run")
+    parser.add_argument("--results", type=Path, default=RESULTS_PATH)
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    parser.add_argument("--window", type=int, default=5, help="previous runs to compare with")
+    args = parser.parse_args(argv)
+
+    spec = FixtureSpec(
+        file_count=args.file_count, file_size=args.file_size, romfs_depth=args.depth
+    )
+
+    with TemporaryDirectory(prefix="nxroms-bench-") as tmp:
+        work_dir = Path(tmp)
+        install_keys(work_dir / "test.keys")
+        roms = write_fixtures(work_dir / "roms", spec, args.roms)
+
+        results = Benchmarks(roms, work_dir, args.repeat).run(args.only)
+
+    history = load_history(args.results, spec)
+    regressions = find_regressions(results, history, args.threshold, args.window)
+
+    for x in results:
+        throughput = f"{x.throughput / 0x100000:10.1f} MiB/s" if x.bytes else ""
+        print(f"{x.name:<14}{x.seconds * 1000:10.2f} ms {throughput}")
+
+    for name, baseline, current in regressions:
+        print(
+            f"regression: {name} took {current * 1000:.2f} ms, {baseline * 1000:.2f} ms before",
+            file=sys.stderr,
+        )
+
+    if not args.no_save:
+        save_run(args.results, spec, results)
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,324 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import AsyncIterator, Callable, TypeVar
+from weakref import WeakKeyDictionary
+import asyncio
+
+from .cache import MetadataCache
+from .cnmt import Cnmt
+from .fs.fs import FsHeader, FsType
+from .fs.pfs0 import PFS0, PFSItem
+from .fs.romfs import RomFS, RomFSFile
+from .nca.nca import Nca
+from .readers import File, IReadable, MultiFile, is_xci, open_split
+from .roms.nsp import Nsp
+from .roms.verify import NcaHashResult
+from .roms.xci import Xci
+
+T = TypeVar("T")
+
+# blocking calls that may run at once, reads and aes both release the gil
+AIO_MAX_WORKERS = 16
+
+# calls that may wait for a worker, further callers wait on the event loop
+AIO_MAX_PENDING = 256
+
+AIO_CHUNK_SIZE = 0x100000
+
+# romfs entries yielded between giving control back to the event loop
+AIO_ITER_BATCH = 256
+
+
+class AsyncRunner:
+    def __init__(
+        self, max_workers: int = AIO_MAX_WORKERS, max_pending: int = AIO_MAX_PENDING
+    ):
+        """
+        Runs blocking calls on a bounded thread pool. Callers past `max_pending` wait
+        on the event loop instead of queueing more work, which keeps memory bounded under load.
+
+        Args:
+            max_workers (int): The count of threads
+            max_pending (int): How many calls may be queued or running at once
+        """
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix="nxroms-aio")
+
+        # semaphores bind to the loop they are first used in, so one is kept per loop.
+        # a semaphore that was waited on references its loop, so closed loops are also dropped by hand
+        self._slots: WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = (
+            WeakKeyDictionary()
+        )
+
+    def _get_slots(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        slots = self._slots.get(loop)
+        if slots is None:
+            for x in [x for x in self._slots if x.is_closed()]:
+                del self._slots[x]
+
+            slots = self._slots[loop] = asyncio.Semaphore(self.max_pending)
+        return slots
+
+    async def run(self, func: Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+
+        async with self._get_slots(loop):
+            return await loop.run_in_executor(
+                self._executor, partial(func, *args, **kwargs)
+            )
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._slots.clear()
+
+
+_default_runner: AsyncRunner | None = None
+
+
+def get_default_runner() -> AsyncRunner:
+    global _default_runner
+    if _default_runner is None:
+        _default_runner = AsyncRunner()
+    return _default_runner
+
+
+class AsyncReadable:
+    def __init__(self, source: IReadable, runner: AsyncRunner | None = None):
+        """
+        Async view over a readable, every read runs on `runner`.
+        Reads are positional on the source, so many coroutines can share it.
+
+        Args:
+            source (IReadable): The blocking readable
+            runner (AsyncRunner): Where blocking calls run, shared by default
+        """
+        self.source = source
+        self.runner = runner or get_default_runner()
+
+        self._pos = 0
+
+    async def peek_at(self, offset: int, size: int) -> bytes:
+        return await self.runner.run(self.source.peek_at, offset, size)
+
+    async def read(self, size: int) -> bytes:
+        data = await self.peek_at(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int):
+        self._pos = offset
+
+    async def stream(
+        self, offset: int = 0, size: int | None = None, chunk_size: int = AIO_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields the data from `offset` in chunks. The next chunk is read while the
+        caller handles the current one, and no more than that, so a slow consumer slows the reads down.
+
+        Args:
+            offset (int): Where to start
+            size (int): How much to read, until the end of the source if None
+            chunk_size (int): The size of every chunk
+        """
+        end = None if size is None else offset + size
+
+        def next_size(pos: int) -> int:
+            return chunk_size if end is None else min(chunk_size, end - pos)
+
+        pending = None
+        if next_size(offset) > 0:
+            pending = asyncio.ensure_future(self.peek_at(offset, next_size(offset)))
+
+        try:
+            while pending is not None:
+                data = await pending
+                pending = None
+                if not data:
+                    return
+
+                offset += len(data)
+                if len(data) == chunk_size and next_size(offset) > 0:
+                    pending = asyncio.ensure_future(
+                        self.peek_at(offset, next_size(offset))
+                    )
+
+                yield data
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+
+class AsyncFile(AsyncReadable):
+    source: File | MultiFile
+
+    @classmethod
+    async def open(cls, path: str | Path, runner: AsyncRunner | None = None):
+        """
+        Opens a file, or the parts of a split dump, without blocking the event loop
+        """
+        runner = runner or get_default_runner()
+        return cls(await runner.run(open_split, path), runner)
+
+    async def close(self):
+        await self.runner.run(self.source.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+class AsyncRomFS:
+    def __init__(self, romfs: RomFS, runner: AsyncRunner):
+        self.romfs = romfs
+        self.runner = runner
+
+    @property
+    def files(self) -> list[RomFSFile]:
+        return self.romfs.files
+
+    async def __aiter__(self) -> AsyncIterator[RomFSFile]:
+        for i, x in enumerate(self.romfs.files):
+            # large tables shouldn't hold the event loop
+            if i and i % AIO_ITER_BATCH == 0:
+                await asyncio.sleep(0)
+            yield x
+
+    def open_file(self, file: RomFSFile) -> AsyncReadable:
+        return AsyncReadable(self.romfs.get_file(file), self.runner)
+
+    def stream_file(
+        self, file: RomFSFile, chunk_size: int = AIO_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        return self.open_file(file).stream(0, file.size, chunk_size)
+
+
+class AsyncPFS0:
+    def __init__(self, pfs: PFS0, runner: AsyncRunner):
+        self.pfs = pfs
+        self.runner = runner
+
+    def get_items(self) -> list[PFSItem]:
+        return self.pfs.get_items()
+
+    def open_item(self, item: PFSItem) -> AsyncReadable:
+        return AsyncReadable(item, self.runner)
+
+    def stream_item(
+        self, item: PFSItem, chunk_size: int = AIO_CHUNK_SIZE
+    ) -> AsyncIterator[bytes]:
+        return self.open_item(item).stream(0, item.entry.size, chunk_size)
+
+
+class AsyncNca:
+    def __init__(self, nca: Nca, runner: AsyncRunner):
+        self.nca = nca
+        self.runner = runner
+
+    @property
+    def header(self):
+        return self.nca.header
+
+    @property
+    def entry(self):
+        return self.nca.entry
+
+    def _find_fs_header(self, fs_type: FsType) -> FsHeader:
+        for x in self.nca.header.fs_headers:
+            if x.fs_type == fs_type:
+                return x
+        raise ValueError(f"The nca doesn't have a {fs_type.name} section")
+
+    async def open_romfs(
+        self, header: FsHeader | None = None, verify: bool = False
+    ) -> AsyncRomFS:
+        """
+        Opens a romfs section, parsing its file table on the runner
+
+        Args:
+            header (FsHeader): The filesystem header, the first romfs section if None
+            verify (bool): Check blocks against the hash levels as they are read
+        """
+        header = header or self._find_fs_header(FsType.ROM_FS)
+        romfs = await self.runner.run(self.nca.open_romfs, header, verify)
+        return AsyncRomFS(romfs, self.runner)
+
+    async def open_pfs(
+        self, header: FsHeader | None = None, verify: bool = False
+    ) -> AsyncPFS0:
+        header = header or self._find_fs_header(FsType.PARTITION_FS)
+        pfs = await self.runner.run(self.nca.open_pfs, header, verify)
+        return AsyncPFS0(pfs, self.runner)
+
+
+class AsyncNsp:
+    def __init__(self, nsp: Nsp, runner: AsyncRunner, file: AsyncFile | None = None):
+        """
+        Async wrapper over an nsp, or the secure partition of an xci. Use `AsyncNsp.open`
+        """
+        self.nsp = nsp
+        self.runner = runner
+        self.file = file
+
+    @classmethod
+    async def open(
+        cls,
+        path: str | Path,
+        cache: MetadataCache | None = None,
+        runner: AsyncRunner | None = None,
+    ):
+        """
+        Opens an nsp or xci, parsing its headers on the runner
+
+        Args:
+            path (str | Path): The rom, split dumps are joined
+            cache (MetadataCache): Where parsed headers are looked up
+            runner (AsyncRunner): Where blocking calls run, shared by default
+        """
+        runner = runner or get_default_runner()
+        file = await AsyncFile.open(path, runner)
+
+        def parse():
+            if is_xci(path):
+                return Xci(file.source, cache).open_nsp()
+            return Nsp(file.source, cache=cache)
+
+        try:
+            nsp = await runner.run(parse)
+        except BaseException:
+            await file.close()
+            raise
+
+        return cls(nsp, runner, file)
+
+    def get_items(self) -> list[PFSItem]:
+        # the header is already in memory
+        return self.nsp.get_items()
+
+    async def get_ncas(self) -> list[AsyncNca]:
+        ncas = await self.runner.run(self.nsp.get_ncas)
+        return [AsyncNca(x, self.runner) for x in ncas]
+
+    async def get_cnmts(self) -> list[Cnmt]:
+        return await self.runner.run(self.nsp.get_cnmts)
+
+    async def verify_ncas(self, **kwargs) -> list[NcaHashResult]:
+        return await self.runner.run(self.nsp.verify_ncas, **kwargs)
+
+    def open_item(self, item: PFSItem) -> AsyncReadable:
+        return AsyncReadable(item, self.runner)
+
+    async def close(self):
+        if self.file is not None:
+            await self.file.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
@@ -5,10 +5,13 @@ class BinaryRepr:
         cls = self.__class__.__name__
         fields = []
 
-        for name, attr in self.__class__.__dict__.items():
-            if isinstance(attr, (DataTypeDescriptor)):
-                value = getattr(self, name)
-                fields.append(f"{name}={value!r}")
+        seen = set()
+        for klass in reversed(self.__class__.__mro__):
+            for name, attr in klass.__dict__.items():
+                if isinstance(attr, (DataTypeDescriptor)) and name not in seen:
+                    seen.add(name)
+                    value = getattr(self, name)
+                    fields.append(f"{name}={value!r}")
             
         for name, value in self.__dict__.items():
             if name.startswith("_"):
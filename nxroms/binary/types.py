@@ -70,6 +70,12 @@ class DataType(DataTypeDescriptor):
         return value
 
 
+class UInt16(DataType):
+    format_string = "<H"
+    value: int
+    size = 0x2
+
+
 class UInt32(DataType):
     format_string = "<I"
     value: int
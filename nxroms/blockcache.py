@@ -0,0 +1,268 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING
+import os
+import threading
+
+from .utils import Bitmap
+
+if TYPE_CHECKING:
+    from .readers import CTRReadable
+
+BLOCK_CACHE_PATH = Path.home() / ".switch/blocks"
+BLOCK_CACHE_MAX_SIZE = 0x100000000
+BLOCK_CACHE_BLOCK_SIZE = 0x10000
+
+# new blocks written before the bitmap is saved again
+BITMAP_SAVE_INTERVAL = 256
+
+
+class CachedSection:
+    def __init__(self, cache: "BlockCache", key: str, base: int, size: int):
+        """
+        The decrypted blocks of one nca section, stored in a sparse file. A bitmap
+        records which blocks are present, it is saved next to the data.
+
+        Args:
+            cache (BlockCache): The owner
+            key (str): The name of the files
+            base (int): Where the section starts in the nca
+            size (int): The size of the section
+        """
+        self.cache = cache
+        self.key = key
+        self.base = base
+        self.size = size
+        self.block_size = cache.block_size
+
+        self.data_path = cache.path / f"{key}.data"
+        self.bitmap_path = cache.path / f"{key}.map"
+
+        self.bitmap = Bitmap(-(-size // self.block_size))
+        if self.bitmap_path.exists():
+            data = self.bitmap_path.read_bytes()
+            if len(data) == len(self.bitmap.data):
+                self.bitmap.data[:] = data
+
+        self._fd = os.open(self.data_path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+
+        # bumped on eviction, so a read that raced with it is retried as a miss
+        self._generation = 0
+
+    @property
+    def stored_size(self) -> int:
+        return self.bitmap.count() * self.block_size
+
+    def _block_range(self, index: int) -> tuple[int, int]:
+        start = index * self.block_size
+        return start, min(start + self.block_size, self.size)
+
+    def _fetch(self, source: "CTRReadable", first: int, last: int) -> bytes:
+        # a run of missing blocks is decrypted at once, offsets relative to the region may be negative
+        start = self._block_range(first)[0]
+        end = self._block_range(last)[1]
+
+        offset = self.base + start - source._start
+        data = source.decrypt_at(offset, source.peek_encrypted_at(offset, end - start))
+
+        # a section larger than the whole cache stops being cached once it fills it
+        last = min(last, first + self.cache._room(self) // self.block_size - 1)
+        if last < first:
+            return data
+
+        with self._lock:
+            generation = self._generation
+
+        os.pwrite(self._fd, data[: self._block_range(last)[1] - start], start)
+
+        with self._lock:
+            # an eviction in between dropped the file, the blocks aren't marked
+            if generation == self._generation:
+                for index in range(first, last + 1):
+                    if index not in self.bitmap:
+                        self.bitmap.add(index)
+                        self._unsaved += 1
+                        self.cache._grow(self, self.block_size)
+
+                if self._unsaved >= BITMAP_SAVE_INTERVAL:
+                    self._save()
+
+        self.cache._trim(self)
+        return data
+
+    def read(self, source: "CTRReadable", offset: int, size: int) -> bytes:
+        """
+        Reads decrypted data, from the cache when present, decrypting and storing the missing blocks
+
+        Args:
+            source (CTRReadable): The section, used to decrypt missing blocks
+            offset (int): The offset in the nca
+            size (int): The count of bytes
+        """
+        start = offset - self.base
+        end = min(start + size, self.size)
+        if start >= end:
+            return b""
+
+        first = start // self.block_size
+        last = (end - 1) // self.block_size
+
+        with self._lock:
+            generation = self._generation
+            present = [x in self.bitmap for x in range(first, last + 1)]
+
+        self.cache._touch(self)
+
+        chunks = []
+        index = first
+        while index <= last:
+            # runs of present or missing blocks are read together
+            run_end = index
+            while run_end < last and present[run_end + 1 - first] == present[index - first]:
+                run_end += 1
+
+            if present[index - first]:
+                run_start = self._block_range(index)[0]
+                length = self._block_range(run_end)[1] - run_start
+                data = os.pread(self._fd, length, run_start)
+
+                with self._lock:
+                    stale = generation != self._generation
+                if stale or len(data) < length:
+                    data = self._fetch(source, index, run_end)
+            else:
+                data = self._fetch(source, index, run_end)
+
+            chunks.append(data)
+            index = run_end + 1
+
+        data = b"".join(chunks)
+        skip = start - first * self.block_size
+        return data[skip : skip + end - start]
+
+    def _save(self):
+        tmp = self.bitmap_path.with_suffix(".tmp")
+        tmp.write_bytes(self.bitmap.data)
+        os.replace(tmp, self.bitmap_path)
+        self._unsaved = 0
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            freed = self.stored_size
+
+            os.ftruncate(self._fd, 0)
+            self.bitmap.data[:] = bytes(len(self.bitmap.data))
+            self._save()
+
+        return freed
+
+    def close(self):
+        with self._lock:
+            if self._unsaved:
+                self._save()
+            os.close(self._fd)
+
+
+class BlockCache:
+    def __init__(
+        self,
+        path: str | Path = BLOCK_CACHE_PATH,
+        max_size: int = BLOCK_CACHE_MAX_SIZE,
+        block_size: int = BLOCK_CACHE_BLOCK_SIZE,
+    ):
+        """
+        A persistent cache of decrypted nca blocks, one sparse file per nca section.
+        Later reads of a cached block skip the decryption and come from the page cache.
+        When the stored blocks go over `max_size` the least recently used sections are dropped.
+
+        Args:
+            path (str | Path): The cache directory
+            max_size (int): The most decrypted data kept
+            block_size (int): The size of every cached block, a multiple of 0x10
+        """
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        self.max_size = max_size
+        self.block_size = block_size
+
+        self._sections: dict[str, CachedSection] = {}
+        self._lock = threading.Lock()
+
+        # stored size of every section on disk, least recently used first
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self._load()
+
+    def _load(self):
+        maps = sorted(self.path.glob("*.map"), key=lambda x: x.stat().st_mtime)
+        for x in maps:
+            size = sum(b.bit_count() for b in x.read_bytes()) * self.block_size
+            self._sizes[x.stem] = size
+            self._size += size
+
+    def get_section(self, content_id: str, index: int, base: int, size: int) -> CachedSection:
+        """
+        Gets the cache of a section, opening it if needed
+
+        Args:
+            content_id (str): The id of the nca, it changes with its content
+            index (int): The section index
+            base (int): Where the section starts in the nca
+            size (int): The size of the section
+        """
+        key = f"{content_id}_{index}"
+        with self._lock:
+            section = self._sections.get(key)
+            if section is None:
+                section = self._sections[key] = CachedSection(self, key, base, size)
+                self._sizes.setdefault(key, section.stored_size)
+            return section
+
+    def _touch(self, section: CachedSection):
+        with self._lock:
+            if section.key in self._sizes:
+                self._sizes.move_to_end(section.key)
+
+    def _grow(self, section: CachedSection, size: int):
+        with self._lock:
+            self._sizes[section.key] = self._sizes.get(section.key, 0) + size
+            self._size += size
+
+    def _room(self, section: CachedSection) -> int:
+        # other sections can be dropped to make room, but not the one being read
+        with self._lock:
+            return max(self.max_size - self._sizes.get(section.key, 0), 0)
+
+    def _trim(self, keep: CachedSection):
+        while True:
+            with self._lock:
+                if self._size <= self.max_size:
+                    return
+
+                # the section being read is never dropped, `_room` keeps it under the size
+                victim = next((x for x in self._sizes if x != keep.key), None)
+                if victim is None:
+                    return
+
+                self._size -= self._sizes.pop(victim)
+                section = self._sections.get(victim)
+
+            if section is not None:
+                section.clear()
+            else:
+                for suffix in (".data", ".map"):
+                    (self.path / f"{victim}{suffix}").unlink(missing_ok=True)
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def close(self):
+        with self._lock:
+            for x in self._sections.values():
+                x.close()
+            self._sections.clear()
@@ -0,0 +1,305 @@
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+import os
+import sqlite3
+import threading
+import time
+
+from .fs.pfs0 import PFSHeader
+from .nacp import Nacp
+from .nca.header import NCA_ENCRYPTED_SIZE, NcaHeader
+from .readers import File, IReadable, MemoryRegion, MultiFile, resolve_offset
+
+CACHE_PATH = Path.home() / ".switch/cache.sqlite"
+CACHE_MAX_SIZE = 0x10000000
+
+# bump when the layout of the stored blobs changes
+SCHEMA_VERSION = 2
+
+# hits only refresh the access time of entries older than this, in seconds
+ACCESS_UPDATE_INTERVAL = 600
+
+
+@dataclass(frozen=True)
+class FileIdentity:
+    path: str
+    size: int
+    mtime: int
+
+    @classmethod
+    def from_file(cls, file: File | MultiFile):
+        if isinstance(file, MultiFile):
+            # split dumps are keyed by their first part
+            mtime = max(os.stat(x).st_mtime_ns for x in file.paths)
+            return cls(os.path.abspath(file.paths[0]), file.size, mtime)
+
+        st = os.fstat(file.fileno())
+        return cls(os.path.abspath(file.source.name), st.st_size, st.st_mtime_ns)
+
+
+class MetadataCache:
+    def __init__(self, path: Path | str = CACHE_PATH, max_size: int = CACHE_MAX_SIZE):
+        """
+        A persistent cache of parsed metadata, keyed by file identity and container offset.
+        Entries of a file are dropped as soon as its size or mtime changes.
+
+        Args:
+            path (Path | str): The sqlite database
+            max_size (int): The maximum size of the stored blobs, the least recently used are evicted
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # the headers are decrypted, only the owner may read them
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+        os.chmod(path, 0o600)
+
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+
+        # access times of hits, written with the next put or on close so reads don't write
+        self._touched: dict[tuple[str, int, str], float] = {}
+
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._setup()
+
+    def _setup(self):
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            self._db.execute("DROP TABLE IF EXISTS entries")
+            self._db.execute("DROP TABLE IF EXISTS usage")
+            self._db.commit()
+
+            # version 1 stored decrypted key areas, nothing of them is left in the free pages
+            self._db.execute("VACUUM")
+            self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                path TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                kind TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (path, offset, kind)
+            )
+            """
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+        )
+
+        # the size of the blobs, shared by every process using the cache
+        self._db.execute("CREATE TABLE IF NOT EXISTS usage (size INTEGER NOT NULL)")
+        self._db.execute(
+            """
+            INSERT INTO usage SELECT COALESCE(SUM(LENGTH(data)), 0) FROM entries
+            WHERE NOT EXISTS (SELECT 1 FROM usage)
+            """
+        )
+        self._db.commit()
+
+    @contextmanager
+    def _write(self):
+        # the write lock is taken up front, so the size read inside stays right while other processes write
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._db.rollback()
+            raise
+        self._db.commit()
+
+    def _grow(self, size: int):
+        self._db.execute("UPDATE usage SET size = size + ?", (size,))
+
+    @property
+    def size(self) -> int:
+        """
+        The size of the stored blobs
+        """
+        with self._lock:
+            return self._db.execute("SELECT size FROM usage").fetchone()[0]
+
+    def get(self, identity: FileIdentity, offset: int, kind: str) -> bytes | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime, accessed, data FROM entries WHERE path = ? AND offset = ? AND kind = ?",
+                (identity.path, offset, kind),
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            size, mtime, accessed, data = row
+            if (size, mtime) != (identity.size, identity.mtime):
+                self._invalidate(identity.path)
+                return None
+
+            now = time.time()
+            if now - accessed > ACCESS_UPDATE_INTERVAL:
+                self._touched[(identity.path, offset, kind)] = now
+            return data
+
+    def _flush_touched(self) -> bool:
+        if not self._touched:
+            return False
+
+        self._db.executemany(
+            "UPDATE entries SET accessed = ? WHERE path = ? AND offset = ? AND kind = ?",
+            [(accessed, *key) for key, accessed in self._touched.items()],
+        )
+        self._touched.clear()
+        return True
+
+    def flush(self):
+        """
+        Writes the access times of the hits since the last write
+        """
+        with self._lock:
+            if self._flush_touched():
+                self._db.commit()
+
+    def put(self, identity: FileIdentity, offset: int, kind: str, data: bytes):
+        with self._lock, self._write():
+            old = self._db.execute(
+                "SELECT LENGTH(data) FROM entries WHERE path = ? AND offset = ? AND kind = ?",
+                (identity.path, offset, kind),
+            ).fetchone()
+
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    identity.path,
+                    offset,
+                    kind,
+                    identity.size,
+                    identity.mtime,
+                    time.time(),
+                    data,
+                ),
+            )
+            self._grow(len(data) - (old[0] if old else 0))
+            self._flush_touched()
+
+            size = self._db.execute("SELECT size FROM usage").fetchone()[0]
+            if size > self.max_size:
+                self._evict(size)
+
+    def _invalidate(self, path: str):
+        with self._write():
+            freed = self._db.execute(
+                "SELECT COALESCE(SUM(LENGTH(data)), 0) FROM entries WHERE path = ?",
+                (path,),
+            ).fetchone()[0]
+
+            self._db.execute("DELETE FROM entries WHERE path = ?", (path,))
+            self._grow(-freed)
+
+    def _evict(self, size: int):
+        # drop the least recently used entries until the cache is at 3/4 of its size
+        target = self.max_size * 3 // 4
+        rows = self._db.execute(
+            "SELECT path, offset, kind, LENGTH(data) FROM entries ORDER BY accessed"
+        )
+
+        evicted = []
+        freed = 0
+        for path, offset, kind, length in rows:
+            if size - freed <= target:
+                break
+
+            evicted.append((path, offset, kind))
+            freed += length
+
+        rows.close()
+        self._db.executemany(
+            "DELETE FROM entries WHERE path = ? AND offset = ? AND kind = ?", evicted
+        )
+        self._grow(-freed)
+
+    def clear(self):
+        with self._lock, self._write():
+            self._db.execute("DELETE FROM entries")
+            self._db.execute("UPDATE usage SET size = 0")
+
+    def close(self):
+        self.flush()
+        self._db.close()
+
+    def _locate(self, source: IReadable) -> tuple[FileIdentity, int] | None:
+        resolved = resolve_offset(source)
+        if resolved is None:
+            return None
+
+        root, offset = resolved
+        if not isinstance(root, (File, MultiFile)):
+            return None
+
+        return FileIdentity.from_file(root), offset
+
+    def _get_or_load(
+        self, source: IReadable, kind: str, load: Callable[[], bytes]
+    ) -> bytes:
+        location = self._locate(source)
+        if location is None:
+            return load()
+
+        identity, offset = location
+        data = self.get(identity, offset, kind)
+        if data is None:
+            data = load()
+            self.put(identity, offset, kind, data)
+
+        return data
+
+    def get_nca_header(self, source: IReadable) -> NcaHeader:
+        """
+        Gets the header of the nca at `source`, decrypting it only if it isn't cached.
+        The key area is stored encrypted, as it is in the header, and decrypted again on every load.
+
+        Args:
+            source (IReadable): The nca, usually a `PFSItem`
+        """
+
+        def load():
+            header = NcaHeader(source.peek_at(0, NCA_ENCRYPTED_SIZE), lazy=True)
+            return header.peek_at(0, NCA_ENCRYPTED_SIZE)
+
+        data = self._get_or_load(source, "nca_header", load)
+        return NcaHeader(data, decrypted=True)
+
+    def get_pfs_header(
+        self, source: IReadable, magic: bytes, entry_size: int
+    ) -> PFSHeader:
+        """
+        Gets a PFS0/HFS0 header, including its entry and string tables
+
+        Args:
+            source (IReadable): The partition
+            magic (bytes): The expected magic
+            entry_size (int): The size of every entry
+        """
+
+        def load():
+            header = PFSHeader(source, magic, entry_size)
+            return source.peek_at(0, header.raw_data_pos)
+
+        data = self._get_or_load(source, "pfs_header:" + magic.decode(), load)
+        return PFSHeader(MemoryRegion(data), magic, entry_size)
+
+    def get_nacp(self, nca) -> Nacp:
+        """
+        Gets the control.nacp of a control nca
+
+        Args:
+            nca (Nca): The control nca
+        """
+        data = self._get_or_load(nca.source, "nacp", lambda: Nacp.read_from_nca(nca))
+        return Nacp(MemoryRegion(data))
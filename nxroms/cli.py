@@ -0,0 +1,573 @@
+from argparse import SUPPRESS, ArgumentParser, Namespace
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from time import monotonic
+from typing import Callable, Iterable
+import json
+import os
+import sys
+import threading
+
+from .extract import ManifestEntry, extract, write_manifest
+from .fs.fs import FsType
+from .fs.pfs0 import PFS0, PFSItem
+from .fs.romfs import RomFS
+from .hashes import HASH_ALGORITHMS
+from .keyring import InvalidKeys, Keyring, KeysNotFound
+from .nca.nca import Nca
+from .readers import IReadable, is_xci, open_split
+from .roms.nsp import Nsp
+from .roms.xci import Xci
+from .scanner import LibraryScanner, ScanRecord, find_roms, scan_file, stat_rom
+from .server import INVALID_ROM_ERRORS, NotFound, OpenRom, walk
+
+EXIT_OK = 0
+
+# something was invalid or couldn't be read, the other files were still processed
+EXIT_FAILED = 1
+
+# bad arguments, argparse exits with it too
+EXIT_USAGE = 2
+EXIT_KEYS = 3
+EXIT_INTERRUPTED = 130
+
+# seconds between progress redraws
+PROGRESS_INTERVAL = 0.1
+
+
+class Progress:
+    def __init__(self, total: int, total_bytes: int = 0, enabled: bool = True):
+        """
+        A progress line on stderr with the done count and the throughput
+
+        Args:
+            total (int): The count of items
+            total_bytes (int): Their size, 0 if unknown
+            enabled (bool): Draw it, it's never drawn when stderr isn't a terminal
+        """
+        self.total = total
+        self.total_bytes = total_bytes
+        self.enabled = enabled and sys.stderr.isatty()
+
+        self.done = 0
+        self.bytes = 0
+
+        self._started = monotonic()
+        self._drawn = 0.0
+        self._lock = threading.Lock()
+
+    def update(self, count: int = 0, size: int = 0, name: str = ""):
+        with self._lock:
+            self.done += count
+            self.bytes += size
+
+            now = monotonic()
+            if self.enabled and (now - self._drawn >= PROGRESS_INTERVAL or self.done == self.total):
+                self._drawn = now
+                self._draw(now, name)
+
+    def _draw(self, now: float, name: str):
+        elapsed = max(now - self._started, 1e-9)
+        line = f"[{self.done}/{self.total}] {self.bytes / elapsed / 0x100000:.1f} MiB/s"
+        if self.total_bytes:
+            line += f" {self.bytes * 100 // self.total_bytes}%"
+        if name:
+            line += f" {os.path.basename(name)}"
+
+        sys.stderr.write(f"\r\x1b[K{line[:200]}")
+        sys.stderr.flush()
+
+    def clear(self):
+        if self.enabled:
+            sys.stderr.write("\r\x1b[K")
+            sys.stderr.flush()
+
+
+class Output:
+    def __init__(self, mode: str, progress: Progress | None = None):
+        """
+        Writes results as text, as a single json array or as one json object per line
+
+        Args:
+            mode (str): `text`, `json` or `jsonl`
+            progress (Progress): Cleared before every line so they don't mix
+        """
+        self.mode = mode
+        self.progress = progress
+        self.records: list[dict] = []
+        self._lock = threading.Lock()
+
+    def emit(self, record: dict, text: str):
+        with self._lock:
+            if self.mode == "json":
+                self.records.append(record)
+                return
+
+            if self.progress is not None:
+                self.progress.clear()
+
+            print(json.dumps(record) if self.mode == "jsonl" else text, flush=True)
+
+    def close(self):
+        if self.progress is not None:
+            self.progress.clear()
+        if self.mode == "json":
+            print(json.dumps(self.records, indent=2))
+
+
+def _get_output(args: Namespace, progress: Progress | None = None) -> Output:
+    if args.json:
+        return Output("json", progress)
+    if args.jsonl:
+        return Output("jsonl", progress)
+    return Output("text", progress)
+
+
+def _get_size(path: str) -> int:
+    try:
+        return stat_rom(path).st_size
+    except OSError:
+        return 0
+
+
+def _describe_error(e: Exception) -> str:
+    return f"{type(e).__name__}: {e}"
+
+
+def _run_parallel(
+    func: Callable[[str], tuple[dict, str, bool]],
+    paths: list[str],
+    args: Namespace,
+) -> int:
+    # every file is processed on its own thread, results are written as they finish
+    progress = Progress(len(paths), sum(_get_size(x) for x in paths), not args.quiet)
+    output = _get_output(args, progress)
+    failed = False
+
+    def run(path: str):
+        try:
+            return func(path)
+        except Exception as e:
+            error = _describe_error(e)
+            return {"path": path, "error": error}, f"{path}: {error}", False
+
+    try:
+        with ThreadPoolExecutor(args.jobs) as executor:
+            futures = {executor.submit(run, x): x for x in paths}
+            for future in as_completed(futures):
+                record, text, ok = future.result()
+                failed |= not ok
+
+                path = futures[future]
+                progress.update(1, _get_size(path), path)
+                output.emit(record, text)
+    finally:
+        output.close()
+
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def _format_record(record: ScanRecord) -> str:
+    if record.error:
+        return f"{record.path}: {record.error}"
+
+    version = f"v{record.version}" if record.version else "-"
+    return f"{record.title_id or '-'}  {version:<10} {record.name or '-'}  [{record.path}]"
+
+
+def cmd_info(args: Namespace) -> int:
+    def info(path: str):
+        record = scan_file(path)
+        text = _format_record(record)
+        if args.verbose and not record.error:
+            text += "".join(
+                f"\n    {x.content_type:<12} {x.size:>14}  {x.name}" for x in record.contents
+            )
+        return record.to_dict(), text, record.error is None
+
+    return _run_parallel(info, args.roms, args)
+
+
+def cmd_verify(args: Namespace) -> int:
+    def verify(path: str):
+        file = open_split(path)
+        try:
+            record = {"path": path}
+            lines = []
+            ok = True
+
+            if is_xci(path):
+                xci = Xci(file)
+                checks = xci.verify_partitions(deep=True)
+                record["partitions"] = {x.name: x.valid for x in checks}
+                for x in checks:
+                    ok &= x.valid
+                    if not x.valid:
+                        lines.append(f"    BAD  hfs0 {x.name}")
+                nsp = xci.open_nsp()
+            else:
+                nsp = Nsp(file)
+
+            results = nsp.verify_ncas(workers=args.workers)
+            record["ncas"] = [
+                {
+                    "name": x.name,
+                    "size": x.size,
+                    "sha256": x.digest.hex(),
+                    "expected": x.expected.hex() if x.expected else None,
+                    "valid": x.valid,
+                }
+                for x in results
+            ]
+            for x in results:
+                ok &= x.valid
+                if not x.valid or args.verbose:
+                    lines.append(f"    {'OK ' if x.valid else 'BAD'}  {x.name}")
+
+            record["valid"] = ok
+            text = "\n".join([f"{'OK ' if ok else 'BAD'}  {path}", *lines])
+            return record, text, ok
+        finally:
+            file.close()
+
+    return _run_parallel(verify, args.roms, args)
+
+
+def _output_path(path: str, out: Path) -> Path:
+    stem = Path(path.rstrip("/\\")).stem
+    return out / f"{stem}.nsp"
+
+
+def cmd_convert(args: Namespace) -> int:
+    out = Path(args.output)
+    to_dir = len(args.roms) > 1 or out.is_dir() or args.output.endswith(("/", os.sep))
+    if to_dir:
+        # outputs are named after the input, two inputs with the same name would overwrite each other
+        targets: dict[Path, str] = {}
+        for path in args.roms:
+            target = _output_path(path, out)
+            if target in targets:
+                print(
+                    f"nxroms: {targets[target]} and {path} would both be written to {target}",
+                    file=sys.stderr,
+                )
+                return EXIT_USAGE
+            targets[target] = path
+
+        out.mkdir(parents=True, exist_ok=True)
+
+    def convert(path: str):
+        target = _output_path(path, out) if to_dir else out
+
+        file = open_split(path)
+        try:
+            results = Xci(file).to_nsp(target, hash=not args.no_hash)
+        finally:
+            file.close()
+
+        ok = all(x.valid for x in results)
+        record = {
+            "path": path,
+            "output": str(target),
+            "valid": ok,
+            "ncas": {x.name: x.valid for x in results},
+        }
+        return record, f"{'OK ' if ok else 'BAD'}  {path} -> {target}", ok
+
+    return _run_parallel(convert, args.roms, args)
+
+
+def cmd_scan(args: Namespace) -> int:
+    scanner = LibraryScanner(
+        args.catalog, args.jobs, args.keys, args.cache, resume=not args.rescan
+    )
+    output = None
+    failed = False
+
+    try:
+        if args.catalog is not None and not args.rescan:
+            changes = scanner.update(args.paths)
+            records = changes.added + changes.changed
+            removed = changes.removed
+
+            # only the new and changed files count, the others were skipped
+            progress = Progress(len(records), sum(x.size for x in records), not args.quiet)
+        else:
+            paths = list(find_roms(args.paths))
+            records = scanner.scan_paths(paths)
+            removed = []
+
+            progress = Progress(len(paths), sum(_get_size(x) for x in paths), not args.quiet)
+
+        output = _get_output(args, progress)
+        for x in removed:
+            output.emit({"path": x, "removed": True}, f"removed  {x}")
+
+        for record in records:
+            failed |= record.error is not None
+            progress.update(1, record.size, record.path)
+            output.emit(record.to_dict(), _format_record(record))
+    finally:
+        if output is not None:
+            output.close()
+        scanner.close()
+
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def _split_inner(path: str) -> list[str]:
+    return [x for x in path.split("/") if x]
+
+
+def _open_node(rom_path: str, inner: str):
+    rom = OpenRom(rom_path)
+    parts = _split_inner(inner)
+    if ".." in parts:
+        raise NotFound(inner)
+
+    node, rest = walk(rom, parts)
+    return rom, node, rest
+
+
+def _romfs_entries(romfs: RomFS, prefix: str) -> list[tuple[str, IReadable, int]]:
+    # a prefix selects a file or a directory of the romfs
+    file = romfs.find_file(prefix) if prefix else None
+    if file is not None:
+        return [(os.path.basename(prefix), romfs.get_file(file), file.size)]
+
+    entries = []
+    for x in romfs.files:
+        path = romfs.get_path(x)
+        if prefix and not path.startswith(prefix.rstrip("/") + "/"):
+            continue
+
+        name = path[len(prefix.rstrip("/")) + 1 :] if prefix else path
+        entries.append((name, romfs.get_file(x), x.size))
+
+    if not entries and prefix:
+        raise NotFound(prefix)
+    return entries
+
+
+def _node_entries(node, rest: str, name: str) -> list[tuple[str, IReadable, int]]:
+    """
+    Gets the files under a node, with their path relative to it
+    """
+    if isinstance(node, RomFS):
+        return _romfs_entries(node, rest)
+
+    if isinstance(node, Xci):
+        entries = []
+        for x in node.hfs_header.entry_table:
+            partition = _node_entries(node.open_hfs(x.name), "", "")
+            entries += [(f"{x.name}/{n}", s, z) for n, s, z in partition]
+        return entries
+
+    if isinstance(node, PFS0):
+        return [(x.entry.name, x, x.entry.size) for x in node.get_items()]
+
+    if isinstance(node, Nca):
+        entries = []
+        for header in node.header.fs_headers:
+            if header.fs_type == FsType.ROM_FS:
+                fs = node.open_romfs(header)
+            else:
+                fs = node.open_pfs(header)
+            entries += [(f"fs{header.index}/{n}", s, z) for n, s, z in _node_entries(fs, "", "")]
+        return entries
+
+    if isinstance(node, PFSItem):
+        return [(name, node, node.entry.size)]
+
+    raise NotFound(name)
+
+
+def cmd_ls(args: Namespace) -> int:
+    output = _get_output(args)
+    rom, node, rest = _open_node(args.rom, args.path)
+    try:
+        entries = _node_entries(node, rest, os.path.basename(args.path.rstrip("/")))
+        for name, _, size in entries:
+            output.emit({"name": name, "size": size}, f"{size:>14}  {name}")
+    except NotFound:
+        raise
+    except Exception as e:
+        # a corrupt container is reported like a failed file of the other commands
+        error = _describe_error(e)
+        output.emit({"path": args.path, "error": error}, f"{args.path}: {error}")
+        return EXIT_FAILED
+    finally:
+        output.close()
+        rom.file.close()
+
+    return EXIT_OK
+
+
+def cmd_extract(args: Namespace) -> int:
+    hashes = tuple(x for x in args.hashes.split(",") if x) if args.hashes else ()
+    for x in hashes:
+        if x not in HASH_ALGORITHMS:
+            print(f"Unknown hash: {x}", file=sys.stderr)
+            return EXIT_USAGE
+
+    rom, node, rest = _open_node(args.rom, args.path)
+    try:
+        entries = _node_entries(node, rest, os.path.basename(args.path.rstrip("/")) or "data")
+        progress = Progress(len(entries), sum(x[2] for x in entries), not args.quiet)
+        output = _get_output(args, progress)
+        manifest: list[ManifestEntry] = []
+        failed = False
+
+        def run(entry):
+            try:
+                return extract([entry], args.output, hashes)[0]
+            except Exception as e:
+                return e
+
+        try:
+            # files of a container are extracted in parallel, each in a single pass
+            with ThreadPoolExecutor(args.jobs) as executor:
+                futures = {executor.submit(run, x): x for x in entries}
+                for future in as_completed(futures):
+                    entry = future.result()
+                    if isinstance(entry, Exception):
+                        # the other files are still extracted
+                        name, _, size = futures[future]
+                        error = _describe_error(entry)
+                        failed = True
+
+                        progress.update(1, size, name)
+                        output.emit({"name": name, "error": error}, f"{name}: {error}")
+                        continue
+
+                    manifest.append(entry)
+                    progress.update(1, entry.size, entry.name)
+
+                    digests = " ".join(f"{k}:{v}" for k, v in entry.digests.items())
+                    output.emit(
+                        {"name": entry.name, "size": entry.size, "digests": entry.digests},
+                        f"{entry.size:>14}  {entry.name}  {digests}".rstrip(),
+                    )
+        finally:
+            output.close()
+
+        if args.manifest:
+            manifest.sort(key=lambda x: x.name)
+            write_manifest(manifest, args.manifest)
+    finally:
+        rom.file.close()
+
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+def _add_output_options(parser: ArgumentParser):
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--json", action="store_true", help="print a json array at the end")
+    group.add_argument("--jsonl", action="store_true", help="print a json object per result")
+
+
+def _add_common_options(parser: ArgumentParser, defaults: bool):
+    # the subcommands accept them too, without overwriting the values given before the subcommand
+    def default(value):
+        return value if defaults else SUPPRESS
+
+    parser.add_argument(
+        "--keys", default=default(None), help="the prod.keys file, defaults to ~/.switch/prod.keys"
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=default(os.cpu_count() or 1), help="files processed at once"
+    )
+    parser.add_argument(
+        "-q", "--quiet", action="store_true", default=default(False), help="don't show the progress"
+    )
+
+
+def build_parser() -> ArgumentParser:
+    parser = ArgumentParser(prog="nxroms", description="Inspect, verify and convert nsp and xci files")
+    _add_common_options(parser, True)
+
+    common = ArgumentParser(add_help=False)
+    _add_common_options(common, False)
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_command(name: str, help: str) -> ArgumentParser:
+        return commands.add_parser(name, help=help, parents=[common])
+
+    p = add_command("info", "show the title id, name, version and contents")
+    p.add_argument("roms", nargs="+")
+    p.add_argument("-v", "--verbose", action="store_true", help="list the ncas")
+    _add_output_options(p)
+    p.set_defaults(func=cmd_info)
+
+    p = add_command("ls", "list the files under a container, nca or romfs directory")
+    p.add_argument("rom")
+    p.add_argument("path", nargs="?", default="", help="like secure/<nca>/romfs/dir")
+    _add_output_options(p)
+    p.set_defaults(func=cmd_ls)
+
+    p = add_command("extract", "extract a container, nca filesystem, romfs directory or file")
+    p.add_argument("rom")
+    p.add_argument("path", nargs="?", default="", help="what to extract, everything by default")
+    p.add_argument("-o", "--output", default=".", help="the output directory")
+    p.add_argument(
+        "--hashes", default="", help=f"hash the files while extracting, any of {','.join(HASH_ALGORITHMS)}"
+    )
+    p.add_argument("--manifest", help="write the sizes and digests to this json file")
+    _add_output_options(p)
+    p.set_defaults(func=cmd_extract)
+
+    p = add_command("verify", "check the hashes of every nca and of the xci partitions")
+    p.add_argument("roms", nargs="+")
+    p.add_argument("--workers", type=int, help="ncas hashed at once per file")
+    p.add_argument("-v", "--verbose", action="store_true", help="list every nca")
+    _add_output_options(p)
+    p.set_defaults(func=cmd_verify)
+
+    p = add_command("scan", "scan directories of roms in a process pool")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("--catalog", help="a .jsonl or .db catalog, only new and changed roms are scanned")
+    p.add_argument("--cache", help="a metadata cache shared by the workers")
+    p.add_argument("--rescan", action="store_true", help="scan everything again")
+    _add_output_options(p)
+    p.set_defaults(func=cmd_scan)
+
+    p = add_command("convert", "convert xcis to nsps")
+    p.add_argument("roms", nargs="+")
+    p.add_argument("-o", "--output", required=True, help="the nsp, or a directory for several")
+    p.add_argument("--no-hash", action="store_true", help="don't check the nca hashes while copying")
+    _add_output_options(p)
+    p.set_defaults(func=cmd_convert)
+
+    return parser
+
+
+def main(argv: Iterable[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+
+    try:
+        Keyring.set_default(Keyring(args.keys) if args.keys else Keyring())
+    except (KeysNotFound, InvalidKeys, OSError) as e:
+        print(f"nxroms: {e}", file=sys.stderr)
+        return EXIT_KEYS
+
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # the reader went away, like `head`, the rest of the output is dropped
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    except NotFound as e:
+        print(f"nxroms: not found: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    except INVALID_ROM_ERRORS as e:
+        print(f"nxroms: invalid rom: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    except (KeysNotFound, InvalidKeys) as e:
+        print(f"nxroms: {e}", file=sys.stderr)
+        return EXIT_KEYS
+    except (OSError, ValueError) as e:
+        print(f"nxroms: {e}", file=sys.stderr)
+        return EXIT_FAILED
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
@@ -0,0 +1,143 @@
+from enum import Enum
+
+from .binary.repr import BinaryRepr
+from .binary.types import Bytes, Enumeration, UInt16, UInt32, UInt64
+from .readers import IReadable, MemoryRegion, Readable
+
+CNMT_HEADER_SIZE = 0x20
+CONTENT_INFO_SIZE = 0x38
+CONTENT_META_INFO_SIZE = 0x10
+
+
+class ContentMetaType(Enum):
+    SYSTEM_PROGRAM = 0x01
+    SYSTEM_DATA = 0x02
+    SYSTEM_UPDATE = 0x03
+    BOOT_IMAGE_PACKAGE = 0x04
+    BOOT_IMAGE_PACKAGE_SAFE = 0x05
+    APPLICATION = 0x80
+    PATCH = 0x81
+    ADD_ON_CONTENT = 0x82
+    DELTA = 0x83
+    DATA_PATCH = 0x84
+
+
+# not the same values as the nca content type
+class CnmtContentType(Enum):
+    META = 0x00
+    PROGRAM = 0x01
+    DATA = 0x02
+    CONTROL = 0x03
+    HTML_DOCUMENT = 0x04
+    LEGAL_INFORMATION = 0x05
+    DELTA_FRAGMENT = 0x06
+
+
+class ContentInfo(BinaryRepr, MemoryRegion):
+    hash = Bytes(0, 0x20)
+    content_id = Bytes(0x20, 0x10, lambda x: x.hex())
+    size = Bytes(0x30, 0x6, lambda x: int.from_bytes(x, "little"))
+    content_type: CnmtContentType = Enumeration(0x36, CnmtContentType)
+    id_offset = Bytes(0x37, 0x1, lambda x: x[0])
+
+    @property
+    def nca_name(self) -> str:
+        return self.content_id + ".nca"
+
+
+class ContentMetaInfo(BinaryRepr, MemoryRegion):
+    title_id = UInt64(0)
+    version = UInt32(0x8)
+    meta_type: ContentMetaType = Enumeration(0xC, ContentMetaType)
+    attributes = Bytes(0xD, 0x1, lambda x: x[0])
+
+
+class ApplicationMetaExtendedHeader(BinaryRepr, MemoryRegion):
+    patch_id = UInt64(0)
+    required_system_version = UInt32(0x8)
+    required_application_version = UInt32(0xC)
+
+
+class PatchMetaExtendedHeader(BinaryRepr, MemoryRegion):
+    application_id = UInt64(0)
+    required_system_version = UInt32(0x8)
+    extended_data_size = UInt32(0xC)
+
+
+class AddOnContentMetaExtendedHeader(BinaryRepr, MemoryRegion):
+    application_id = UInt64(0)
+    required_application_version = UInt32(0x8)
+
+
+class DeltaMetaExtendedHeader(BinaryRepr, MemoryRegion):
+    application_id = UInt64(0)
+    extended_data_size = UInt32(0x8)
+
+
+class SystemUpdateMetaExtendedHeader(BinaryRepr, MemoryRegion):
+    extended_data_size = UInt32(0)
+
+
+EXTENDED_HEADERS = {
+    ContentMetaType.APPLICATION: ApplicationMetaExtendedHeader,
+    ContentMetaType.PATCH: PatchMetaExtendedHeader,
+    ContentMetaType.ADD_ON_CONTENT: AddOnContentMetaExtendedHeader,
+    ContentMetaType.DELTA: DeltaMetaExtendedHeader,
+    ContentMetaType.SYSTEM_UPDATE: SystemUpdateMetaExtendedHeader,
+}
+
+
+class Cnmt(BinaryRepr, Readable):
+    title_id = UInt64(0)
+    version = UInt32(0x8)
+    meta_type: ContentMetaType = Enumeration(0xC, ContentMetaType)
+    extended_header_size = UInt16(0xE)
+    content_count = UInt16(0x10)
+    content_meta_count = UInt16(0x12)
+    attributes = Bytes(0x14, 0x1, lambda x: x[0])
+    required_download_system_version = UInt32(0x18)
+
+    def __init__(self, source: IReadable):
+        """
+        The content meta of a title, found in the PFS0 of a META nca as `<type>_<title id>.cnmt`
+
+        Args:
+            source (IReadable): The .cnmt file
+        """
+        super().__init__(source)
+
+        self.extended_header = None
+        header_class = EXTENDED_HEADERS.get(self.meta_type)
+        if header_class is not None and self.extended_header_size:
+            self.extended_header = header_class(
+                self.peek_at(CNMT_HEADER_SIZE, self.extended_header_size)
+            )
+
+        offset = CNMT_HEADER_SIZE + self.extended_header_size
+        data = self.peek_at(offset, self.content_count * CONTENT_INFO_SIZE)
+        self.contents = [
+            ContentInfo(data[x : x + CONTENT_INFO_SIZE])
+            for x in range(0, len(data), CONTENT_INFO_SIZE)
+        ]
+
+        offset += self.content_count * CONTENT_INFO_SIZE
+        data = self.peek_at(offset, self.content_meta_count * CONTENT_META_INFO_SIZE)
+        self.content_meta = [
+            ContentMetaInfo(data[x : x + CONTENT_META_INFO_SIZE])
+            for x in range(0, len(data), CONTENT_META_INFO_SIZE)
+        ]
+
+    @property
+    def application_id(self) -> int:
+        """
+        The id of the base application, for patches and add-ons it comes from the extended header
+        """
+        if hasattr(self.extended_header, "application_id"):
+            return self.extended_header.application_id
+        return self.title_id
+
+    def get_content_hashes(self) -> dict[str, bytes]:
+        """
+        Gets the full sha256 of every content, by nca name
+        """
+        return {x.nca_name: x.hash for x in self.contents}
@@ -0,0 +1,261 @@
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Iterable
+import os
+import sqlite3
+
+from .delta import read_block_hashes
+from .fs.fs import FsType
+from .nca.verify import HASH_SIZE, get_hash_levels
+from .readers import open_split
+from .scanner import find_roms, open_rom, stat_rom
+
+# rows inserted per statement
+DEDUP_BATCH_SIZE = 0x4000
+
+DEDUP_READ_SIZE = 0x100000
+
+# 128 bits are plenty to tell blocks apart and halve the size of the index
+DEDUP_KEY_SIZE = 0x10
+
+
+@dataclass
+class DuplicateStats:
+    total_bytes: int
+    unique_bytes: int
+
+    @property
+    def duplicate_bytes(self) -> int:
+        return self.total_bytes - self.unique_bytes
+
+
+@dataclass
+class DedupCandidate:
+    hash: str
+    size: int
+    count: int
+
+    # one of the files or blocks with this content
+    example: str
+
+    @property
+    def wasted_bytes(self) -> int:
+        return self.size * (self.count - 1)
+
+
+@dataclass
+class RomUniqueness:
+    path: str
+    title_id: str | None
+    total_bytes: int
+
+    # bytes of blocks that no other rom has
+    unique_bytes: int
+
+    @property
+    def ratio(self) -> float:
+        return self.unique_bytes / self.total_bytes if self.total_bytes else 0.0
+
+
+class DedupIndex:
+    def __init__(self, path: str | Path, hash_files: bool = True):
+        """
+        A content addressed index of the romfs files and data blocks of many roms, kept in sqlite
+        so memory doesn't grow with the library. Blocks are keyed by the hashes already stored
+        in the hash levels, only files are hashed by reading them.
+
+        Args:
+            path (str | Path): The database
+            hash_files (bool): Also hash every romfs file, without it only the hash tables are read
+        """
+        self.hash_files = hash_files
+
+        self._db = sqlite3.connect(path)
+        self._db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS roms (
+                id INTEGER PRIMARY KEY,
+                path TEXT UNIQUE NOT NULL,
+                size INTEGER NOT NULL,
+                mtime INTEGER NOT NULL,
+                title_id TEXT
+            );
+            CREATE TABLE IF NOT EXISTS blocks (
+                rom INTEGER NOT NULL,
+                hash BLOB NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                rom INTEGER NOT NULL,
+                hash BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                path TEXT NOT NULL
+            );
+            """
+        )
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+    def _remove(self, rom_id: int):
+        self._db.execute("DELETE FROM blocks WHERE rom = ?", (rom_id,))
+        self._db.execute("DELETE FROM files WHERE rom = ?", (rom_id,))
+        self._db.execute("DELETE FROM roms WHERE id = ?", (rom_id,))
+
+    def add_rom(self, path: str | Path) -> bool:
+        """
+        Indexes the romfs sections of every nca of a rom
+
+        Returns:
+            False if the rom was already indexed and didn't change
+        """
+        path = os.path.abspath(path)
+        st = stat_rom(path)
+
+        row = self._db.execute(
+            "SELECT id, size, mtime FROM roms WHERE path = ?", (path,)
+        ).fetchone()
+        if row is not None:
+            if (row[1], row[2]) == (st.st_size, st.st_mtime_ns):
+                return False
+            self._remove(row[0])
+
+        file = open_split(path)
+        try:
+            nsp = open_rom(file, path)
+            cursor = self._db.execute(
+                "INSERT INTO roms (path, size, mtime) VALUES (?, ?, ?)",
+                (path, st.st_size, st.st_mtime_ns),
+            )
+            rom_id = cursor.lastrowid
+
+            title_id = None
+            for nca in nsp.get_ncas():
+                for header in nca.header.fs_headers:
+                    if header.fs_type != FsType.ROM_FS:
+                        continue
+
+                    title_id = title_id or f"{nca.header.program_id:016x}"
+                    self._add_section(rom_id, nca, header)
+
+            self._db.execute("UPDATE roms SET title_id = ? WHERE id = ?", (title_id, rom_id))
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+        finally:
+            file.close()
+
+        return True
+
+    def _add_section(self, rom_id: int, nca, header):
+        hashes = read_block_hashes(nca, header)
+        data_size = get_hash_levels(header)[-1].size
+
+        rows = []
+        for index in range(len(hashes.table) // HASH_SIZE):
+            size = min(hashes.block_size, data_size - index * hashes.block_size)
+            if size <= 0:
+                break
+
+            rows.append((rom_id, hashes.get(index)[:DEDUP_KEY_SIZE], size))
+            if len(rows) >= DEDUP_BATCH_SIZE:
+                self._db.executemany("INSERT INTO blocks VALUES (?, ?, ?)", rows)
+                rows.clear()
+
+        self._db.executemany("INSERT INTO blocks VALUES (?, ?, ?)", rows)
+
+        if not self.hash_files:
+            return
+
+        romfs = nca.open_romfs(header)
+        rows = []
+        for x in romfs.files:
+            data = romfs.get_file(x)
+
+            h = sha256()
+            for offset in range(0, x.size, DEDUP_READ_SIZE):
+                h.update(data.peek_at(offset, DEDUP_READ_SIZE))
+
+            name = f"{nca.entry.name if nca.entry else ''}/{romfs.get_path(x)}"
+            rows.append((rom_id, h.digest()[:DEDUP_KEY_SIZE], x.size, name))
+
+        self._db.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", rows)
+
+    def add_roms(self, paths: Iterable[str | Path]) -> dict[str, Exception]:
+        """
+        Walks `paths` and indexes every rom
+
+        Returns:
+            The roms that couldn't be read, with their error
+        """
+        errors = {}
+        for path in find_roms(paths):
+            try:
+                self.add_rom(path)
+            except Exception as e:
+                errors[path] = e
+
+        return errors
+
+    def _ensure_indexes(self):
+        # created after the bulk inserts, which are much faster without them
+        self._db.execute("CREATE INDEX IF NOT EXISTS blocks_hash ON blocks (hash, rom)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_hash ON files (hash, rom)")
+        self._db.commit()
+
+    def get_stats(self, table: str = "blocks") -> DuplicateStats:
+        """
+        Gets the total bytes and the bytes left if every duplicate was stored once
+
+        Args:
+            table (str): `blocks` or `files`
+        """
+        if table not in ("blocks", "files"):
+            raise ValueError(f"Invalid table: {table}")
+
+        self._ensure_indexes()
+        total, unique = self._db.execute(
+            f"""
+            SELECT COALESCE(SUM(size * count), 0), COALESCE(SUM(size), 0) FROM (
+                SELECT MAX(size) AS size, COUNT(*) AS count FROM {table} GROUP BY hash
+            )
+            """
+        ).fetchone()
+
+        return DuplicateStats(total, unique)
+
+    def get_candidates(self, limit: int = 100) -> list[DedupCandidate]:
+        """
+        Gets the files whose duplicates waste the most space
+        """
+        self._ensure_indexes()
+        rows = self._db.execute(
+            """
+            SELECT hash, MAX(size), COUNT(*), MIN(path) FROM files
+            GROUP BY hash HAVING COUNT(*) > 1
+            ORDER BY MAX(size) * (COUNT(*) - 1) DESC LIMIT ?
+            """,
+            (limit,),
+        )
+
+        return [DedupCandidate(h.hex(), size, count, path) for h, size, count, path in rows]
+
+    def get_uniqueness(self) -> list[RomUniqueness]:
+        """
+        Gets how many bytes of every rom are found in no other rom, by data block
+        """
+        self._ensure_indexes()
+        rows = self._db.execute(
+            """
+            SELECT r.path, r.title_id, COALESCE(SUM(b.size), 0), COALESCE(SUM(CASE WHEN NOT EXISTS (
+                SELECT 1 FROM blocks o WHERE o.hash = b.hash AND o.rom != b.rom
+            ) THEN b.size ELSE 0 END), 0)
+            FROM roms r LEFT JOIN blocks b ON b.rom = r.id
+            GROUP BY r.id ORDER BY r.path
+            """
+        )
+
+        return [RomUniqueness(*x) for x in rows]
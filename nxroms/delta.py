@@ -0,0 +1,241 @@
+from dataclasses import dataclass, field
+
+from .fs.fs import FsHeader, FsType
+from .fs.romfs import RomFS, RomFSFile
+from .nca.nca import Nca
+from .nca.verify import HASH_SIZE, get_hash_levels
+
+# how much of a file is compared at once when there are no usable hashes
+DELTA_COMPARE_SIZE = 0x100000
+
+
+@dataclass
+class BlockHashes:
+    block_size: int
+
+    # the hash of every data block, one after the other
+    table: bytes
+
+    def get(self, index: int) -> bytes | None:
+        hash = self.table[index * HASH_SIZE : (index + 1) * HASH_SIZE]
+        return hash if len(hash) == HASH_SIZE else None
+
+
+@dataclass
+class FileDelta:
+    path: str
+
+    # added, removed or changed
+    status: str
+    old_size: int | None
+    new_size: int | None
+
+    # byte ranges of the new file that cover every change, end exclusive
+    ranges: list[tuple[int, int]] = field(default_factory=list)
+
+
+@dataclass
+class DeltaResult:
+    files: list[FileDelta] = field(default_factory=list)
+    unchanged: int = 0
+
+    # file data read to compare blocks whose hashes differ
+    bytes_read: int = 0
+
+    def get_status(self, status: str) -> list[FileDelta]:
+        return [x for x in self.files if x.status == status]
+
+
+def read_block_hashes(nca: Nca, header: FsHeader) -> BlockHashes:
+    """
+    Reads the hashes of the data blocks of a section, the level right above the data
+
+    Args:
+        nca (Nca): The nca
+        header (FsHeader): The filesystem header of the section
+    """
+    *_, table_level, data_level = get_hash_levels(header)
+    table = nca.open_section(header).peek_at(table_level.offset, table_level.size)
+
+    return BlockHashes(data_level.block_size, table)
+
+
+def _add_range(ranges: list[tuple[int, int]], start: int, end: int):
+    if start >= end:
+        return
+    if ranges and ranges[-1][1] >= start:
+        ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
+    else:
+        ranges.append((start, end))
+
+
+def _find_mismatch(old: memoryview, new: memoryview) -> tuple[int, int]:
+    # bisects with slice comparisons, which are memcmp, instead of comparing byte by byte
+    size = min(len(old), len(new))
+
+    low, high = 0, size
+    while low < high:
+        mid = (low + high) // 2
+        if old[low : mid + 1] == new[low : mid + 1]:
+            low = mid + 1
+        else:
+            high = mid
+    first = low
+
+    low, high = first, size
+    while low < high:
+        mid = (low + high) // 2
+        if old[mid:size] == new[mid:size]:
+            high = mid
+        else:
+            low = mid + 1
+
+    return first, low
+
+
+class _Differ:
+    def __init__(
+        self,
+        old: RomFS,
+        new: RomFS,
+        old_hashes: BlockHashes | None,
+        new_hashes: BlockHashes | None,
+        chunk_size: int,
+    ):
+        self.old = old
+        self.new = new
+        self.chunk_size = chunk_size
+        self.result = DeltaResult()
+
+        # blocks can only be matched by hash if both sides use the same size
+        self.hashes = None
+        if old_hashes and new_hashes and old_hashes.block_size == new_hashes.block_size:
+            self.hashes = (old_hashes, new_hashes)
+
+    def _read(self, romfs: RomFS, offset: int, size: int) -> bytes:
+        data = romfs.peek_at(romfs.header.data_offset + offset, size) or b""
+        self.result.bytes_read += len(data)
+        return data
+
+    def _compare(self, old_file: RomFSFile, new_file: RomFSFile, start: int, end: int, ranges):
+        for pos in range(start, end, self.chunk_size):
+            size = min(self.chunk_size, end - pos)
+            old = memoryview(self._read(self.old, old_file.offset + pos, size))
+            new = memoryview(self._read(self.new, new_file.offset + pos, size))
+
+            if old != new:
+                first, last = _find_mismatch(old, new)
+                _add_range(ranges, pos + first, pos + last)
+
+    def diff_file(self, old_file: RomFSFile, new_file: RomFSFile) -> list[tuple[int, int]]:
+        ranges = []
+        common = min(old_file.size, new_file.size)
+
+        old_start = self.old.header.data_offset + old_file.offset
+        new_start = self.new.header.data_offset + new_file.offset
+
+        block_size = self.hashes[0].block_size if self.hashes else None
+        if block_size is None or old_start % block_size != new_start % block_size:
+            # the blocks don't line up, the data has to be compared
+            self._compare(old_file, new_file, 0, common, ranges)
+        else:
+            old_hashes, new_hashes = self.hashes
+            skew = new_start % block_size
+
+            # every window of the file that falls in one block, matching blocks are skipped unread
+            for pos in range(-skew, common, block_size):
+                start, end = max(pos, 0), min(pos + block_size, common)
+
+                old_hash = old_hashes.get((old_start + start) // block_size)
+                new_hash = new_hashes.get((new_start + start) // block_size)
+                if old_hash is not None and old_hash == new_hash:
+                    continue
+
+                self._compare(old_file, new_file, start, end, ranges)
+
+        _add_range(ranges, common, new_file.size)
+        return ranges
+
+    def diff(self) -> DeltaResult:
+        old_files = {self.old.get_path(x): x for x in self.old.files}
+        new_files = {self.new.get_path(x): x for x in self.new.files}
+
+        for path, new_file in sorted(new_files.items()):
+            old_file = old_files.get(path)
+            if old_file is None:
+                self.result.files.append(
+                    FileDelta(path, "added", None, new_file.size, [(0, new_file.size)])
+                )
+                continue
+
+            ranges = self.diff_file(old_file, new_file)
+            if ranges or old_file.size != new_file.size:
+                self.result.files.append(
+                    FileDelta(path, "changed", old_file.size, new_file.size, ranges)
+                )
+            else:
+                self.result.unchanged += 1
+
+        for path in sorted(old_files.keys() - new_files.keys()):
+            self.result.files.append(
+                FileDelta(path, "removed", old_files[path].size, None)
+            )
+
+        return self.result
+
+
+def diff_romfs(
+    old: RomFS,
+    new: RomFS,
+    old_hashes: BlockHashes | None = None,
+    new_hashes: BlockHashes | None = None,
+    chunk_size: int = DELTA_COMPARE_SIZE,
+) -> DeltaResult:
+    """
+    Compares two RomFS by their file tables. With the block hashes of both images, a file
+    whose blocks hash the same is unchanged without reading it, and only the blocks that differ are read
+
+    Args:
+        old (RomFS): The old image
+        new (RomFS): The new image
+        old_hashes (BlockHashes): The data block hashes of the old image, see `read_block_hashes`
+        new_hashes (BlockHashes): The data block hashes of the new image
+        chunk_size (int): How much is compared at once when the blocks don't line up
+
+    Returns:
+        The added, removed and changed files, with the changed ranges
+    """
+    return _Differ(old, new, old_hashes, new_hashes, chunk_size).diff()
+
+
+def _get_romfs_header(nca: Nca) -> FsHeader:
+    for x in nca.header.fs_headers:
+        if x.fs_type == FsType.ROM_FS:
+            return x
+    raise ValueError("The nca doesn't have a romfs section")
+
+
+def diff_ncas(
+    old: Nca,
+    new: Nca,
+    old_header: FsHeader | None = None,
+    new_header: FsHeader | None = None,
+) -> DeltaResult:
+    """
+    Compares the romfs of two ncas, like two versions of a program nca, using their hash tables first
+
+    Args:
+        old (Nca): The old nca
+        new (Nca): The new nca
+        old_header (FsHeader): The old romfs section, the first one if None
+        new_header (FsHeader): The new romfs section, the first one if None
+    """
+    old_header = old_header or _get_romfs_header(old)
+    new_header = new_header or _get_romfs_header(new)
+
+    return diff_romfs(
+        old.open_romfs(old_header),
+        new.open_romfs(new_header),
+        read_block_hashes(old, old_header),
+        read_block_hashes(new, new_header),
+    )
@@ -0,0 +1,95 @@
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable
+import json
+import os
+
+from .fs.pfs0 import PFS0
+from .fs.romfs import RomFS
+from .hashes import HASH_ALGORITHMS, new_hashers
+from .readers import IReadable
+from .transfer import copy_region
+
+
+@dataclass
+class ManifestEntry:
+    name: str
+    size: int
+
+    # hex digests by algorithm
+    digests: dict[str, str]
+
+
+def extract(
+    entries: Iterable[tuple[str, IReadable, int]],
+    out_dir: str | Path,
+    hashes: tuple[str, ...] = HASH_ALGORITHMS,
+) -> list[ManifestEntry]:
+    """
+    Writes every entry under `out_dir`, hashing it in the same pass. Every
+    algorithm runs on its own thread, so hashing several doesn't slow the copy down
+
+    Args:
+        entries (Iterable[tuple[str, IReadable, int]]): The relative path, data and size of every file
+        out_dir (str | Path): Where to write the files
+        hashes (tuple[str, ...]): The algorithms, any of `HASH_ALGORITHMS` or hashlib
+
+    Returns:
+        The size and digests of every file
+    """
+    out_dir = Path(out_dir)
+    manifest = []
+
+    for name, source, size in entries:
+        # names come from the container, they can't point outside of `out_dir`
+        if ".." in Path(name).parts or Path(name).is_absolute():
+            raise ValueError(f"Invalid entry name: {name}")
+
+        path = out_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        hashers = new_hashers(hashes)
+        with path.open("wb") as f:
+            copy_region(source, f, 0, size, list(hashers.values()))
+
+        manifest.append(
+            ManifestEntry(name, size, {k: v.hexdigest() for k, v in hashers.items()})
+        )
+
+    return manifest
+
+
+def extract_pfs(
+    pfs: PFS0, out_dir: str | Path, hashes: tuple[str, ...] = HASH_ALGORITHMS
+) -> list[ManifestEntry]:
+    """
+    Extracts the items of a PFS0, like the ncas of an nsp
+    """
+    return extract(
+        ((x.entry.name, x, x.entry.size) for x in pfs.get_items()), out_dir, hashes
+    )
+
+
+def extract_romfs(
+    romfs: RomFS, out_dir: str | Path, hashes: tuple[str, ...] = HASH_ALGORITHMS
+) -> list[ManifestEntry]:
+    """
+    Extracts the files of a RomFS keeping their directories
+    """
+    return extract(
+        ((romfs.get_path(x), romfs.get_file(x), x.size) for x in romfs.files),
+        out_dir,
+        hashes,
+    )
+
+
+def write_manifest(manifest: list[ManifestEntry], path: str | Path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump([asdict(x) for x in manifest], f, indent=2)
+    os.replace(tmp, path)
+
+
+def read_manifest(path: str | Path) -> list[ManifestEntry]:
+    with open(path) as f:
+        return [ManifestEntry(**x) for x in json.load(f)]
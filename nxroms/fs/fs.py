@@ -96,6 +96,7 @@ class HierarchicalIntegrity(BinaryRepr, MemoryRegion):
     version = UInt32(0x4)
     master_hash_size = UInt32(0x8)
     info_level_hash: InfoLevelHash = Bytes(0xC, 0xB4, InfoLevelHash)
+    master_hash = Bytes(0xC0, 0x20)
 
     def __init__(self, source: bytes):
         super().__init__(source)
@@ -133,3 +134,13 @@ class FsHeader(BinaryRepr, MemoryRegion):
 class InvalidFs(Exception):
     def __init__(self, expected, given):
         super().__init__(f"Invalid filesystem: expected {expected}, given {given}")
+
+
+class UnsupportedEncryption(InvalidFs):
+    def __init__(self, given):
+        super().__init__(EncryptionType.AES_CTR, given)
+
+
+class UnsupportedHashType(InvalidFs):
+    def __init__(self, given):
+        super().__init__("a sha256 hash type", given)
@@ -1,9 +1,18 @@
 from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+import os
+import struct
 
 from nxroms.binary.repr import BinaryRepr
 
 from ..binary.types import Bytes, UInt32, UInt64
-from ..readers import IReadable, Readable, MemoryRegion, ReadableRegion
+from ..readers import File, IReadable, Readable, MemoryRegion, ReadableRegion
+from ..transfer import copy_region
+from ..utils import align_up
+
+# the header is padded so the data starts aligned
+PFS_HEADER_ALIGN = 0x20
 
 
 class InvalidHeader(Exception):
@@ -19,6 +28,15 @@ class PFSEntry(BinaryRepr, MemoryRegion):
     name: str
 
 
+class HFSEntry(PFSEntry):
+    # the hash covers the first `hashed_region_size` bytes of the entry data
+    hashed_region_size = UInt32(0x14)
+    hash = Bytes(0x20, 0x20)
+
+
+ENTRY_CLASSES = {b"PFS0": PFSEntry, b"HFS0": HFSEntry}
+
+
 class PFSItem(BinaryRepr, ReadableRegion):
     entry: PFSEntry
     data_pos: int
@@ -35,7 +53,7 @@ class PFSHeader(BinaryRepr, Readable):
     entry_count = UInt32(0x4)
     string_table_size = UInt32(0x8)
 
-    entry_table: list[PFSEntry]
+    entry_table: list[PFSEntry | HFSEntry]
     _string_table: bytes
 
     def __init__(self, source: IReadable, magic: bytes, entry_size: int):
@@ -45,6 +63,7 @@ class PFSHeader(BinaryRepr, Readable):
             raise InvalidHeader(magic, self.magic)
 
         self.entry_size = entry_size
+        self.entry_class = ENTRY_CLASSES.get(magic, PFSEntry)
 
         self.entry_table = []
         self._string_table = b""
@@ -61,13 +80,46 @@ class PFSHeader(BinaryRepr, Readable):
         self.seek(0x10)
 
         for _ in range(self.entry_count):
-            entry = PFSEntry(self.read(self.entry_size))
+            entry = self.entry_class(self.read(self.entry_size))
             entry.name = (
                 self._string_table[entry.string_offset :].split(b"\0", 1)[0].decode()
             )
             self.entry_table.append(entry)
 
 
+def build_pfs_header(entries: list[tuple[str, int]]) -> bytes:
+    """
+    Builds a PFS0 header for entries stored one after the other
+
+    Args:
+        entries (list[tuple[str, int]]): The name and size of every entry, in data order
+
+    Returns:
+        The header, including the padded string table
+    """
+    string_table = b""
+    string_offsets = []
+    for name, _ in entries:
+        string_offsets.append(len(string_table))
+        string_table += name.encode() + b"\0"
+
+    size = 0x10 + 0x18 * len(entries) + len(string_table)
+    string_table += b"\0" * (align_up(size, PFS_HEADER_ALIGN) - size)
+
+    entry_table = b""
+    offset = 0
+    for (_, size), string_offset in zip(entries, string_offsets):
+        entry_table += struct.pack("<QQII", offset, size, string_offset, 0)
+        offset += size
+
+    return (
+        b"PFS0"
+        + struct.pack("<III", len(entries), len(string_table), 0)
+        + entry_table
+        + string_table
+    )
+
+
 class PFS0(Readable):
     def __init__(self, source: IReadable, header=None):
         super().__init__(source)
@@ -89,3 +141,101 @@ class PFS0(Readable):
 
         return items
 
+
+class PFSBuilder:
+    def __init__(self):
+        """
+        Builds a PFS0 from readables and files, the data is streamed to the output when written
+        """
+        self.entries: list[tuple[str, IReadable | str | Path, int]] = []
+
+    @classmethod
+    def from_pfs(cls, pfs: PFS0):
+        """
+        Starts from the items of an existing PFS0, which are copied as they are
+        """
+        builder = cls()
+        for item in pfs.get_items():
+            builder.add(item.entry.name, item)
+
+        return builder
+
+    def add(self, name: str, source: IReadable | str | Path, size: int | None = None):
+        """
+        Adds an entry at the end, replacing the one with the same name if any
+
+        Args:
+            name (str): The entry name
+            source (IReadable | str | Path): The data, a path is opened when writing
+            size (int): The size of the data, needed for readables that don't know it
+        """
+        if size is None:
+            size = _get_size(source)
+
+        self.remove(name)
+        self.entries.append((name, source, size))
+
+    def remove(self, name: str) -> bool:
+        count = len(self.entries)
+        self.entries = [x for x in self.entries if x[0] != name]
+        return len(self.entries) != count
+
+    def get_header(self) -> bytes:
+        return build_pfs_header([(name, size) for name, _, size in self.entries])
+
+    def write(self, path: str | Path, hash: bool = False) -> dict[str, bytes]:
+        """
+        Writes the PFS0 to a temporary file and moves it to `path`. Plain file data is copied
+        with `copy_file_range`, so entries kept from another PFS0 aren't read into memory.
+
+        Args:
+            path (str | Path): The output
+            hash (bool): Compute the sha256 of every entry while copying it
+
+        Returns:
+            The digest of every entry by name, empty if `hash` is False
+        """
+        path = Path(path)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+
+        digests = {}
+        try:
+            with tmp.open("wb") as out:
+                out.write(self.get_header())
+
+                for name, source, size in self.entries:
+                    opened = None
+                    if isinstance(source, (str, Path)):
+                        source = opened = File(str(source))
+
+                    hashers = [sha256()] if hash else None
+                    try:
+                        copy_region(source, out, 0, size, hashers)
+                    finally:
+                        if opened is not None:
+                            opened.close()
+
+                    if hashers:
+                        digests[name] = hashers[0].digest()
+
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+        return digests
+
+
+def _get_size(source: IReadable | str | Path) -> int:
+    if isinstance(source, (str, Path)):
+        return os.path.getsize(source)
+    if isinstance(source, PFSItem):
+        return source.entry.size
+    if isinstance(source, ReadableRegion):
+        return source._size
+    if isinstance(source, MemoryRegion):
+        return source.source.getbuffer().nbytes
+    if isinstance(getattr(source, "size", None), int):
+        return source.size
+
+    raise ValueError("The size of the source is unknown, pass it explicitly")
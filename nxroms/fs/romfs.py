@@ -1,6 +1,10 @@
+import struct
+
 from ..binary.repr import BinaryRepr
 from ..binary.types import UInt32, UInt64
 from ..readers import MemoryRegion, ReadableRegion, Readable, IReadable
+from ..trace import traced
+from ..utils import align_up
 
 
 class RomFSHeader(BinaryRepr, MemoryRegion):
@@ -63,24 +67,71 @@ class RomFS(Readable):
     def __init__(self, source: IReadable):
         super().__init__(source)
         self.files: list[RomFSFile] = []
+        self.directories: dict[int, RomFSDirectory] | None = None
+
+        self._paths: dict[str, RomFSFile] | None = None
 
         self.header = RomFSHeader(source.peek_at(0, 0x50))
         self.populate_files()
 
+    @traced("romfs.files")
     def populate_files(self):
-        sibling = 0
-        while True:
-            d = self.source.peek_at(
-                self.header.file_meta_table_offset + sibling,
-                self.header.file_meta_table_size - sibling,
-            )
-            f = RomFSFile(d)
-            self.files.append(f)
-
-            if not f.sibling:
-                break
-
-            sibling = f.sibling
+        # the table is read once, entries are parsed from memory. they are packed
+        # one after the other, so every directory's files are found by walking it
+        table = self.source.peek_at(
+            self.header.file_meta_table_offset, self.header.file_meta_table_size
+        )
+
+        offset = 0
+        while offset + 0x20 <= len(table):
+            name_size = struct.unpack_from("<I", table, offset + 0x1C)[0]
+            size = 0x20 + name_size
+
+            self.files.append(RomFSFile(table[offset : offset + size]))
+            offset += align_up(size, 4)
+
+    def populate_directories(self):
+        table = self.source.peek_at(
+            self.header.dir_meta_table_offset, self.header.dir_meta_table_size
+        )
+
+        # keyed by their offset in the table, which is what the parent fields hold
+        self.directories = {}
+
+        offset = 0
+        while offset + 0x18 <= len(table):
+            name_size = struct.unpack_from("<I", table, offset + 0x14)[0]
+            size = 0x18 + name_size
+
+            self.directories[offset] = RomFSDirectory(table[offset : offset + size])
+            offset += align_up(size, 4)
+
+    def get_path(self, file: RomFSFile) -> str:
+        """
+        Gets the full path of a file, like `dir/file.bin`
+        """
+        if self.directories is None:
+            self.populate_directories()
+
+        parts = [file.name]
+        parent = file.parent
+
+        # the root directory is at offset 0
+        while parent:
+            directory = self.directories[parent]
+            parts.append(directory.name)
+            parent = directory.parent
+
+        return "/".join(reversed(parts))
+
+    def find_file(self, path: str) -> RomFSFile | None:
+        """
+        Looks up a file by its full path, the paths are built on the first call
+        """
+        if self._paths is None:
+            self._paths = {self.get_path(x): x for x in self.files}
+
+        return self._paths.get(path.strip("/"))
 
     def get_file(self, file: RomFSFile) -> ReadableRegion:
         return ReadableRegion(self, self.header.data_offset + file.offset, file.size)
@@ -0,0 +1,148 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
+import threading
+import zlib
+
+# the digests dat files are matched with
+HASH_ALGORITHMS = ("crc32", "md5", "sha1", "sha256")
+
+# chunks a hasher may lag behind the copy
+HASH_QUEUE_SIZE = 4
+
+# smaller files are hashed on the calling thread
+HASH_INLINE_SIZE = 0x100000
+
+# the threads shared by every feeder
+HASH_WORKERS = os.cpu_count() or 1
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+
+
+class Crc32:
+    name = "crc32"
+
+    def __init__(self):
+        self.value = 0
+
+    def update(self, data: bytes):
+        self.value = zlib.crc32(data, self.value)
+
+    def digest(self) -> bytes:
+        return self.value.to_bytes(4, "big")
+
+    def hexdigest(self) -> str:
+        return f"{self.value:08x}"
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(HASH_WORKERS, thread_name_prefix="hash")
+        return _pool
+
+
+def new_hasher(algorithm: str):
+    if algorithm == "crc32":
+        return Crc32()
+    return hashlib.new(algorithm)
+
+
+def new_hashers(algorithms) -> dict:
+    return {x: new_hasher(x) for x in algorithms}
+
+
+class _HashLane:
+    def __init__(self, hasher):
+        # feeds one hasher on the shared pool, a chunk at a time and in order
+        self.hasher = hasher
+        self.error: Exception | None = None
+
+        self._pending: deque[bytes] = deque()
+        self._slots = threading.Semaphore(HASH_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._running = False
+        self._idle = threading.Event()
+        self._idle.set()
+
+    def put(self, data: bytes):
+        self._slots.acquire()
+        with self._lock:
+            self._pending.append(data)
+            if self._running:
+                return
+
+            self._running = True
+            self._idle.clear()
+
+        # a lane only takes a pool thread while it has data, so lanes never wait on each other
+        _get_pool().submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._running = False
+                    self._idle.set()
+                    return
+                data = self._pending.popleft()
+
+            try:
+                if self.error is None:
+                    self.hasher.update(data)
+            except Exception as e:
+                self.error = e
+            finally:
+                self._slots.release()
+
+    def wait(self):
+        self._idle.wait()
+
+
+class HashFeeder:
+    def __init__(self, hashers: list, size: int | None = None):
+        """
+        Updates every hasher on a shared pool of threads, so hashing overlaps the I/O
+        and several algorithms run in parallel. hashlib and zlib release the gil on large updates.
+        Small files are hashed on the calling thread, a handoff would cost more than the hashing.
+
+        Args:
+            hashers (list): Objects with an `update` method, like `hashlib.sha256()`
+            size (int): The size of the data if known
+        """
+        self.hashers = hashers
+        self._inline = size is not None and size < HASH_INLINE_SIZE
+        self._lanes = [] if self._inline else [_HashLane(x) for x in hashers]
+
+    def _raise_error(self):
+        for lane in self._lanes:
+            if lane.error is not None:
+                raise lane.error
+
+    def update(self, data: bytes):
+        """
+        Raises:
+            Exception: The error of a hasher that failed on earlier data
+        """
+        if self._inline:
+            for hasher in self.hashers:
+                hasher.update(data)
+            return
+
+        self._raise_error()
+        for lane in self._lanes:
+            lane.put(data)
+
+    def close(self):
+        """
+        Waits until every hasher took all the data
+
+        Raises:
+            Exception: The error of a hasher that failed
+        """
+        for lane in self._lanes:
+            lane.wait()
+        self._raise_error()
@@ -0,0 +1,162 @@
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Iterable
+import json
+
+from .cache import MetadataCache
+from .cnmt import CnmtContentType
+from .readers import open_split, resolve_offset
+from .roms.nsp import Nsp
+from .scanner import find_roms, open_rom
+
+
+@dataclass
+class ContentLocation:
+    title_id: str
+    application_id: str
+    meta_type: str
+    version: int
+    content_id: str
+    content_type: str
+    size: int
+    hash: str
+    path: str
+
+    # absolute offset of the nca in the file, None if the container doesn't hold it
+    offset: int | None
+
+
+def format_title_id(title_id: int | str) -> str:
+    if isinstance(title_id, int):
+        return f"{title_id:016x}"
+    return title_id.lower()
+
+
+class ContentIndex:
+    def __init__(self):
+        """
+        Maps title ids to their contents and the file and offset that hold every content,
+        built from the cnmt of every rom
+        """
+        self.titles: dict[str, list[ContentLocation]] = {}
+        self.contents: dict[str, ContentLocation] = {}
+
+    def add(self, nsp: Nsp, path: str):
+        """
+        Adds the contents listed in every cnmt of `nsp`
+
+        Args:
+            nsp (Nsp): The nsp, or the secure partition of an xci
+            path (str): The file that holds `nsp`
+        """
+        items = {x.entry.name: x for x in nsp.get_items()}
+
+        for cnmt in nsp.get_cnmts():
+            title_id = format_title_id(cnmt.title_id)
+
+            # a newer version of the title replaces the older one
+            old = self.titles.get(title_id)
+            if old and old[0].version > cnmt.version:
+                continue
+            for x in old or []:
+                self.contents.pop(x.content_id, None)
+
+            locations = []
+            for content in cnmt.contents:
+                item = items.get(content.nca_name)
+                resolved = resolve_offset(item) if item is not None else None
+
+                location = ContentLocation(
+                    title_id,
+                    format_title_id(cnmt.application_id),
+                    cnmt.meta_type.name,
+                    cnmt.version,
+                    content.content_id,
+                    content.content_type.name,
+                    content.size,
+                    content.hash.hex() if content.hash else "",
+                    path,
+                    resolved[1] if resolved else None,
+                )
+                locations.append(location)
+                self.contents[location.content_id] = location
+
+            self.titles[title_id] = locations
+
+    def add_rom(self, path: str | Path, cache: MetadataCache | None = None):
+        path = str(path)
+        file = open_split(path)
+        try:
+            self.add(open_rom(file, path, cache), path)
+        finally:
+            file.close()
+
+    def add_roms(
+        self, paths: Iterable[str | Path], cache: MetadataCache | None = None
+    ) -> dict[str, Exception]:
+        """
+        Walks `paths` and adds every rom
+
+        Args:
+            paths (Iterable[str | Path]): Files or directories
+            cache (MetadataCache): Where parsed headers are looked up
+
+        Returns:
+            The roms that couldn't be read, with their error
+        """
+        errors = {}
+        for path in find_roms(paths):
+            try:
+                self.add_rom(path, cache)
+            except Exception as e:
+                errors[path] = e
+
+        return errors
+
+    def remove_path(self, path: str):
+        for title_id, locations in list(self.titles.items()):
+            if any(x.path == path for x in locations):
+                for x in locations:
+                    self.contents.pop(x.content_id, None)
+                del self.titles[title_id]
+
+    def find(
+        self,
+        title_id: int | str,
+        content_type: CnmtContentType | None = None,
+    ) -> list[ContentLocation]:
+        """
+        Gets the contents of a title
+
+        Args:
+            title_id (int | str): The title id
+            content_type (CnmtContentType): Only return contents of this type
+
+        Returns:
+            The locations of the contents
+        """
+        locations = self.titles.get(format_title_id(title_id), [])
+        if content_type is None:
+            return locations
+
+        return [x for x in locations if x.content_type == content_type.name]
+
+    def get(self, content_id: str) -> ContentLocation | None:
+        return self.contents.get(content_id.lower())
+
+    def save(self, path: str | Path):
+        with open(path, "w") as f:
+            json.dump(
+                {k: [asdict(x) for x in v] for k, v in self.titles.items()}, f
+            )
+
+    @classmethod
+    def load(cls, path: str | Path):
+        index = cls()
+        with open(path) as f:
+            for title_id, locations in json.load(f).items():
+                index.titles[title_id] = [ContentLocation(**x) for x in locations]
+                for x in index.titles[title_id]:
+                    index.contents[x.content_id] = x
+
+        return index
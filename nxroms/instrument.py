@@ -0,0 +1,412 @@
+from dataclasses import asdict, dataclass, fields
+from functools import wraps
+from time import perf_counter_ns
+import json
+import os
+import threading
+
+from .crypto import Crypto
+from .readers import (
+    CTRReadable,
+    File,
+    IReadable,
+    MemoryRegion,
+    MultiFile,
+    Readable,
+    ReadableRegion,
+)
+
+# the methods a readable is read through, the others end up calling one of these
+READ_METHODS = ("read", "read_at", "peek", "peek_at")
+
+# a read that doesn't start where the previous one of the same object ended
+NO_OFFSET = -1
+
+
+@dataclass(slots=True)
+class LayerStats:
+    calls: int = 0
+    bytes: int = 0
+    seeks: int = 0
+    hits: int = 0
+    misses: int = 0
+    aes_bytes: int = 0
+
+    # nanoseconds spent in the layer, with and without the layers it calls
+    time_ns: int = 0
+    self_time_ns: int = 0
+
+    def add(self, other: "LayerStats"):
+        for x in fields(self):
+            setattr(self, x.name, getattr(self, x.name) + getattr(other, x.name))
+
+
+class _Frame:
+    __slots__ = ("obj", "layer", "container", "child_ns", "misses")
+
+    def __init__(self, obj, layer: str, container: str):
+        self.obj = obj
+        self.layer = layer
+        self.container = container
+        self.child_ns = 0
+        self.misses = 0
+
+
+def get_container(readable) -> str:
+    """
+    Gets the name of the file a readable reads from, following regions and wrappers.
+    The name is kept on the object, so the chain is only walked once
+    """
+    name = readable.__dict__.get("_instrument_container")
+    if name is not None:
+        return name
+
+    current = readable
+    while True:
+        if isinstance(current, File):
+            # files opened from a descriptor are named by it
+            name = current.source.name
+            name = os.path.abspath(name) if isinstance(name, str) else str(name)
+        elif isinstance(current, MultiFile):
+            name = os.path.abspath(current.paths[0])
+        elif isinstance(current, MemoryRegion):
+            name = "memory"
+        elif getattr(current, "url", None):
+            name = current.url
+        elif isinstance(current, ReadableRegion):
+            current = current._source
+            continue
+        elif isinstance(current, Readable) and isinstance(current.source, IReadable):
+            current = current.source
+            continue
+        else:
+            name = "?"
+        break
+
+    readable.__dict__["_instrument_container"] = name
+    return name
+
+
+class Instrumentation:
+    def __init__(self):
+        """
+        Counts the calls, bytes, seeks, cache hits, AES bytes and time of every I/O and crypto
+        layer, per layer and per file. While enabled the read methods of the readables, the crypto
+        and the caches are replaced by counting wrappers. Disabled, the original methods are back
+        and nothing is counted. Counters are kept per thread, so the wrappers take no lock.
+
+            with Instrumentation() as stats:
+                nsp.verify_ncas()
+            print(stats.to_json())
+        """
+        self._local = threading.local()
+        self._all: list[dict[tuple[str, str], LayerStats]] = []
+        self._lock = threading.Lock()
+
+        self._patches: list[tuple[type, str, object, bool]] = []
+        self._started = 0
+        self._elapsed = 0
+
+    def _get_local(self) -> threading.local:
+        local = self._local
+        if not hasattr(local, "stats"):
+            local.stats = {}
+            local.stack = []
+            with self._lock:
+                self._all.append(local.stats)
+        return local
+
+    def _get_stats(self, layer: str, container: str) -> LayerStats:
+        stats = self._get_local().stats
+
+        key = (layer, container)
+        entry = stats.get(key)
+        if entry is None:
+            entry = stats[key] = LayerStats()
+        return entry
+
+    def _get_stack(self) -> list[_Frame]:
+        return self._get_local().stack
+
+    def _current_container(self) -> str:
+        stack = self._get_stack()
+        return stack[-1].container if stack else "?"
+
+    def _run(self, frame: _Frame, stack: list[_Frame], func, args) -> tuple[object, int]:
+        stack.append(frame)
+        start = perf_counter_ns()
+        try:
+            result = func(*args)
+        finally:
+            elapsed = perf_counter_ns() - start
+            stack.pop()
+            if stack:
+                stack[-1].child_ns += elapsed
+
+        return result, elapsed
+
+    def _record(self, frame: _Frame, elapsed: int, size: int) -> LayerStats:
+        stats = self._get_stats(frame.layer, frame.container)
+        stats.calls += 1
+        stats.bytes += size
+        stats.time_ns += elapsed
+        stats.self_time_ns += elapsed - frame.child_ns
+        return stats
+
+    def _wrap_read(self, layer: str, func, positional: bool):
+        @wraps(func)
+        def wrapper(obj, *args):
+            stack = self._get_stack()
+
+            # the same object reading through its own methods is one call
+            if stack and stack[-1].obj is obj and stack[-1].layer == layer:
+                return func(obj, *args)
+
+            state = obj.__dict__
+            offset = args[0] if positional else obj.tell()
+            seek = offset != state.get("_instrument_next", NO_OFFSET)
+
+            frame = _Frame(obj, layer, get_container(obj))
+            data, elapsed = self._run(frame, stack, func, (obj, *args))
+
+            size = len(data) if data else 0
+            state["_instrument_next"] = offset + size
+
+            stats = self._record(frame, elapsed, size)
+            stats.seeks += seek
+            return data
+
+        return wrapper
+
+    def _wrap_aes(self, func):
+        @wraps(func)
+        def wrapper(data, *args):
+            stack = self._get_stack()
+            frame = _Frame(None, "aes", self._current_container())
+            result, elapsed = self._run(frame, stack, func, (data, *args))
+
+            stats = self._record(frame, elapsed, len(data))
+            stats.aes_bytes += len(data)
+            return result
+
+        return wrapper
+
+    def _wrap_decrypt(self, func):
+        @wraps(func)
+        def wrapper(obj, offset, data):
+            stack = self._get_stack()
+            frame = _Frame(obj, "aes_ctr", get_container(obj))
+            result, elapsed = self._run(frame, stack, func, (obj, offset, data))
+
+            stats = self._record(frame, elapsed, len(data))
+            stats.aes_bytes += len(data)
+            return result
+
+        return wrapper
+
+    def _wrap_blocks(self, layer: str, func, get_blocks):
+        # a read of a block cache, the misses are counted by the fetch hook it calls
+        @wraps(func)
+        def wrapper(obj, *args):
+            stack = self._get_stack()
+            source = args[0] if layer == "block_cache" else obj
+
+            frame = _Frame(obj, layer, get_container(source))
+            data, elapsed = self._run(frame, stack, func, (obj, *args))
+
+            # the http cache gives back a list of blocks
+            size = sum(map(len, data)) if isinstance(data, list) else len(data or b"")
+
+            stats = self._record(frame, elapsed, size)
+            blocks = get_blocks(obj, *args)
+            stats.hits += max(blocks - frame.misses, 0)
+            stats.misses += frame.misses
+            return data
+
+        return wrapper
+
+    def _wrap_miss(self, func, get_count):
+        @wraps(func)
+        def wrapper(obj, *args):
+            stack = self._get_stack()
+            if stack:
+                stack[-1].misses += get_count(*args)
+            return func(obj, *args)
+
+        return wrapper
+
+    def _wrap_lookup(self, layer: str, func):
+        @wraps(func)
+        def wrapper(obj, identity, *args):
+            stack = self._get_stack()
+            frame = _Frame(obj, layer, identity.path)
+            data, elapsed = self._run(frame, stack, func, (obj, identity, *args))
+
+            stats = self._record(frame, elapsed, len(data) if data else 0)
+            if data is None:
+                stats.misses += 1
+            else:
+                stats.hits += 1
+            return data
+
+        return wrapper
+
+    def _patch(self, owner: type, name: str, wrapper):
+        original = owner.__dict__.get(name)
+        self._patches.append((owner, name, original, original is not None))
+        setattr(owner, name, wrapper)
+
+    def _patch_readable(self, owner: type, layer: str):
+        for name in READ_METHODS:
+            func = getattr(owner, name)
+            self._patch(owner, name, self._wrap_read(layer, func, name.endswith("_at")))
+
+    def enable(self):
+        """
+        Starts counting. Only one instrumentation may be enabled at a time
+        """
+        global _enabled
+        with _enabled_lock:
+            if _enabled is not None:
+                raise RuntimeError("Another instrumentation is already enabled")
+            _enabled = self
+
+        # imported here, the caches pull in most of the package
+        from .blockcache import CachedSection
+        from .cache import MetadataCache
+        from .remote import HttpFile
+
+        self._patch_readable(File, "file")
+        self._patch_readable(MultiFile, "split")
+        self._patch_readable(HttpFile, "http")
+        self._patch_readable(ReadableRegion, "region")
+        self._patch_readable(CTRReadable, "ctr")
+        self._patch_readable(MemoryRegion, "memory")
+
+        aes_decrypt = Crypto.__dict__["aes_decrypt"].__func__
+        self._patch(Crypto, "aes_decrypt", staticmethod(self._wrap_aes(aes_decrypt)))
+        self._patch(CTRReadable, "decrypt_at", self._wrap_decrypt(CTRReadable.decrypt_at))
+
+        self._patch(
+            CachedSection,
+            "read",
+            self._wrap_blocks(
+                "block_cache",
+                CachedSection.read,
+                lambda x, source, offset, size: _count_blocks(
+                    offset - x.base, min(offset - x.base + size, x.size), x.block_size
+                ),
+            ),
+        )
+        self._patch(
+            CachedSection,
+            "_fetch",
+            self._wrap_miss(CachedSection._fetch, lambda source, first, last: last - first + 1),
+        )
+        self._patch(
+            HttpFile,
+            "_get_blocks",
+            self._wrap_blocks(
+                "http_cache", HttpFile._get_blocks, lambda x, first, last: last - first + 1
+            ),
+        )
+        self._patch(
+            HttpFile,
+            "_fetch_run",
+            self._wrap_miss(HttpFile._fetch_run, lambda first, count, futures: count),
+        )
+        self._patch(MetadataCache, "get", self._wrap_lookup("metadata_cache", MetadataCache.get))
+
+        self._started = perf_counter_ns()
+
+    def disable(self):
+        """
+        Stops counting and puts the original methods back, the counters are kept
+        """
+        global _enabled
+        if _enabled is not self:
+            return
+
+        # the wrappers of a class are undone in reverse, so patches of the same name unwind
+        for owner, name, original, owned in reversed(self._patches):
+            if owned:
+                setattr(owner, name, original)
+            else:
+                delattr(owner, name)
+        self._patches.clear()
+
+        self._elapsed += perf_counter_ns() - self._started
+
+        with _enabled_lock:
+            _enabled = None
+
+    def reset(self):
+        """
+        Zeroes every counter
+        """
+        with self._lock:
+            for stats in self._all:
+                for x in list(stats.values()):
+                    for f in fields(x):
+                        setattr(x, f.name, 0)
+
+            self._elapsed = 0
+            if _enabled is self:
+                self._started = perf_counter_ns()
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *args):
+        self.disable()
+
+    def snapshot(self) -> dict:
+        """
+        Gets the counters, summed over the threads
+
+        Returns:
+            `elapsed` in seconds, the totals of every layer in `layers` and
+            the counters of every file by layer in `containers`. Times are in seconds
+        """
+        merged: dict[tuple[str, str], LayerStats] = {}
+        with self._lock:
+            for stats in self._all:
+                for key, value in list(stats.items()):
+                    merged.setdefault(key, LayerStats()).add(value)
+
+        layers: dict[str, LayerStats] = {}
+        containers: dict[str, dict[str, dict]] = {}
+        for (layer, container), value in sorted(merged.items()):
+            layers.setdefault(layer, LayerStats()).add(value)
+            containers.setdefault(container, {})[layer] = _to_dict(value)
+
+        elapsed = self._elapsed
+        if _enabled is self:
+            elapsed += perf_counter_ns() - self._started
+
+        return {
+            "elapsed": elapsed / 1e9,
+            "layers": {k: _to_dict(v) for k, v in layers.items()},
+            "containers": containers,
+        }
+
+    def to_json(self, indent: int | None = 2) -> str:
+        return json.dumps(self.snapshot(), indent=indent)
+
+
+def _count_blocks(start: int, end: int, block_size: int) -> int:
+    if start >= end:
+        return 0
+    return (end - 1) // block_size - start // block_size + 1
+
+
+def _to_dict(stats: LayerStats) -> dict:
+    data = asdict(stats)
+    data["time"] = data.pop("time_ns") / 1e9
+    data["self_time"] = data.pop("self_time_ns") / 1e9
+    return data
+
+
+_enabled: Instrumentation | None = None
+_enabled_lock = threading.Lock()
@@ -44,6 +44,10 @@ class Keyring:
             cls._instance = cls()
         return cls._instance
 
+    @classmethod
+    def set_default(cls, keyring: "Keyring"):
+        cls._instance = keyring
+
     def parse(self, file: TextIOWrapper):
         res = {}
 
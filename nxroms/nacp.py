@@ -2,7 +2,15 @@ from nxroms.readers import Readable, MemoryRegion
 from nxroms.fs.pfs0 import IReadable
 from .binary.repr import BinaryRepr
 from .binary.types import Bytes
+from .trace import traced
 from enum import Enum
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .nca.nca import Nca
+
+NACP_SIZE = 0x4000
+NACP_NAME = "control.nacp"
 
 
 def strip(string: bytes) -> str:
@@ -40,6 +48,7 @@ class Title(BinaryRepr, MemoryRegion):
 class Nacp(Readable):
     version = Bytes(0x3060, 0x10, lambda x: strip(x))
 
+    @traced("nacp.parse")
     def __init__(self, source: IReadable):
         super().__init__(source)
 
@@ -54,3 +63,22 @@ class Nacp(Readable):
                 continue
             self.titles.append(t)
         self.seek(orig)
+
+    @classmethod
+    def read_from_nca(cls, nca: "Nca") -> bytes:
+        """
+        Reads the raw control.nacp of a control nca
+
+        Args:
+            nca (Nca): The control nca
+
+        Returns:
+            The nacp bytes
+        """
+        fs = nca.open_romfs(nca.header.fs_headers[0])
+        file = next((x for x in fs.files if x.name == NACP_NAME), fs.files[0])
+        return fs.get_file(file).peek_at(0, NACP_SIZE)
+
+    @classmethod
+    def from_nca(cls, nca: "Nca"):
+        return cls(MemoryRegion(cls.read_from_nca(nca)))
@@ -6,12 +6,16 @@ from ..crypto import Crypto, modes
 from ..binary.repr import BinaryRepr
 from ..fs.fs import FsEntry, FsHeader
 from ..readers import MemoryRegion
+from ..trace import span, traced
 from ..binary.types import Enumeration, Bytes, UInt32, UInt64
 
 NCA_HEADER_SIZE = 0x400
 NCA_ENCRYPTED_SIZE = 0xC00
 NCA_HEADER_SECTION_SIZE = 0x200
 
+# the key area of a lazy header that wasn't decrypted yet
+_NOT_LOADED = object()
+
 
 class KeyArea(BinaryRepr, MemoryRegion):
     aes_xts_key = Bytes(0, 0x20, _class=lambda x: x.hex())
@@ -63,29 +67,94 @@ class NcaHeader(BinaryRepr, MemoryRegion):
 
     rights_id = Bytes(0x230, 0x10)
 
-    def __init__(self, source: bytes):
+    def __init__(
+        self,
+        source: bytes,
+        decrypted: bool = False,
+        key_area: bytes | None = None,
+        lazy: bool = False,
+    ):
+        """
+        Args:
+            source (bytes): The 0xC00 bytes of the header
+            decrypted (bool): `source` is already decrypted, for example when it comes from a cache
+            key_area (bytes): The decrypted key area, skips its decryption
+            lazy (bool): Decrypts only the main header, the fs headers and the key area are parsed when first used
+        """
         self.keyring = Keyring.get_default()
 
-        dec = Crypto.aes_xts_decrypt(
-            self.keyring.prod["header_key"],
-            source,
-            NCA_ENCRYPTED_SIZE,
-            0,
-            NCA_HEADER_SECTION_SIZE,
-        )
+        # the fs header sectors, decrypted on the first access past the main header
+        self._encrypted_rest: bytes | None = None
+
+        self._key_area: KeyArea | None | object = _NOT_LOADED
+        self._fs_entries: list[FsEntry] | None = None
+        self._fs_headers: list[FsHeader] | None = None
+
+        if decrypted:
+            dec = source
+        elif lazy:
+            dec = self._decrypt_sectors(source[:NCA_HEADER_SIZE], 0)
+            self._encrypted_rest = source[NCA_HEADER_SIZE:NCA_ENCRYPTED_SIZE]
+        else:
+            dec = self._decrypt_sectors(source, 0)
 
         self.magic = dec[0x200:0x204]
         if self.magic != b"NCA3":
             raise InvalidNCA(f"Invalid magic: {self.magic}")
 
-        self.fs_entries: list[FsEntry] = []
-        self.fs_headers: list[FsHeader] = []
-
         super().__init__(dec)
 
-        self.decrypt_key_area()
-        self.populate_fs_entries()
-        self.populate_fs_headers()
+        if key_area is not None:
+            self._key_area = KeyArea(key_area)
+
+        if not lazy:
+            if key_area is None:
+                self.decrypt_key_area()
+            self.populate_fs_entries()
+            self.populate_fs_headers()
+
+    def _decrypt_sectors(self, data: bytes, first: int) -> bytes:
+        with span("nca.header.decrypt", sectors=len(data) // NCA_HEADER_SECTION_SIZE):
+            return Crypto.aes_xts_decrypt(
+                self.keyring.prod["header_key"],
+                data,
+                len(data),
+                first,
+                NCA_HEADER_SECTION_SIZE,
+            )
+
+    def peek_at(self, offset, size) -> bytes | None:
+        if self._encrypted_rest is not None and offset + size > NCA_HEADER_SIZE:
+            rest = self._decrypt_sectors(
+                self._encrypted_rest, NCA_HEADER_SIZE // NCA_HEADER_SECTION_SIZE
+            )
+
+            # two threads may both get here, they decrypt the same bytes
+            MemoryRegion.__init__(self, self._data[:NCA_HEADER_SIZE] + rest)
+            self._encrypted_rest = None
+
+        return super().peek_at(offset, size)
+
+    @property
+    def key_area(self) -> KeyArea | None:
+        """
+        The decrypted key area, None if the nca uses a rights id
+        """
+        if self._key_area is _NOT_LOADED:
+            self.decrypt_key_area()
+        return self._key_area
+
+    @property
+    def fs_entries(self) -> list[FsEntry]:
+        if self._fs_entries is None:
+            self.populate_fs_entries()
+        return self._fs_entries
+
+    @property
+    def fs_headers(self) -> list[FsHeader]:
+        if self._fs_headers is None:
+            self.populate_fs_headers()
+        return self._fs_headers
 
     def get_key_generation(self) -> int:
         old = self.key_generation_old.value
@@ -108,24 +177,24 @@ class NcaHeader(BinaryRepr, MemoryRegion):
 
         return keys[gen]
 
+    @traced("nca.key_area.decrypt")
     def decrypt_key_area(self):
         encrypted_key_area = self.peek_at(0x300, 0x40)
 
         if not self.rights_id:
             key = self.get_key_area_key()
 
-            self.key_area = KeyArea(
+            self._key_area = KeyArea(
                 Crypto.aes_decrypt(encrypted_key_area, bytes.fromhex(key), modes.ECB())
             )
         else:
             # TODO: implement decryption of rights id
-            ...
+            self._key_area = None
 
     def populate_fs_entries(self):
         raw_entries = MemoryRegion(self.peek_at(0x240, 0x40))
 
-        self.fs_entries = []
-
+        entries = []
         for x in range(4):
             entry = FsEntry(raw_entries.read(0x10))
 
@@ -133,8 +202,11 @@ class NcaHeader(BinaryRepr, MemoryRegion):
                 continue
 
             entry.index = x
-            self.fs_entries.append(entry)
+            entries.append(entry)
+
+        self._fs_entries = entries
 
+    @traced("nca.fs_headers")
     def populate_fs_headers(self):
         headers = []
         for section in range(4):
@@ -150,4 +222,4 @@ class NcaHeader(BinaryRepr, MemoryRegion):
 
             headers.append(FsHeader(data, section))
 
-        self.fs_headers = headers
+        self._fs_headers = headers
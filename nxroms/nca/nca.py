@@ -1,11 +1,27 @@
+from concurrent.futures import Executor
 from dataclasses import dataclass
-
-from nxroms.fs.fs import EncryptionType, FsHeader, FsType, HashType, InvalidFs
+from typing import TYPE_CHECKING
+
+from nxroms.fs.fs import (
+    EncryptionType,
+    FsHeader,
+    FsType,
+    HashType,
+    InvalidFs,
+    UnsupportedEncryption,
+    UnsupportedHashType,
+)
 from nxroms.fs.pfs0 import PFS0, PFSEntry, PFSItem, Readable
 from nxroms.fs.romfs import RomFS
 from nxroms.keyring import Keyring
 from nxroms.nca.header import NcaHeader
+from nxroms.nca.verify import VerifiedReadable, VerifyResult, verify_section
 from nxroms.readers import CTRReadable, IReadable, ReadableRegion
+from nxroms.trace import span
+
+if TYPE_CHECKING:
+    from nxroms.blockcache import BlockCache
+    from nxroms.cache import MetadataCache
 
 
 @dataclass
@@ -13,63 +29,123 @@ class Nca(Readable):
     header: NcaHeader
     entry: PFSEntry | None = None
 
-    def __init__(self, source: IReadable):
+    def __init__(
+        self,
+        source: IReadable,
+        header: NcaHeader | None = None,
+        block_cache: "BlockCache | None" = None,
+    ):
+        """
+        Args:
+            source (IReadable): The nca
+            header (NcaHeader): An already parsed header
+            block_cache (BlockCache): Where decrypted blocks of the sections are kept, needs `entry` for the content id
+        """
         super().__init__(source)
 
         self.keyring = Keyring.get_default()
-        header = source.peek_at(0, 0xC00)
-        self.header = NcaHeader(header)
+        if header is None:
+            # most callers only look at the content type, the fs headers are parsed when opened
+            header = NcaHeader(source.peek_at(0, 0xC00), lazy=True)
+        self.header = header
+        self.block_cache = block_cache
 
     @classmethod
-    def from_item(self, item: PFSItem):
-        self.entry = item.entry
-        return Nca(item)
+    def from_item(
+        cls,
+        item: PFSItem,
+        cache: "MetadataCache | None" = None,
+        block_cache: "BlockCache | None" = None,
+    ):
+        header = cache.get_nca_header(item) if cache is not None else None
+
+        nca = cls(item, header, block_cache)
+        nca.entry = item.entry
+        return nca
 
     def get_entry_for_header(self, header: FsHeader):
         return [x for x in self.header.fs_entries if x.index == header.index][0]
 
-    def open_fs(self, header: FsHeader):
-        def get_enc_region(offset, end_offset):
-            key = bytes.fromhex(self.header.key_area.aes_ctr_key)
-            return CTRReadable(self, offset, end_offset, key, header.ctr)
+    def open_section(self, header: FsHeader, offset: int = 0) -> CTRReadable:
+        """
+        Opens the decrypted section described by `header`, including its hash levels
 
+        Args:
+            header (FsHeader): The filesystem header
+            offset (int): Where the region starts, relative to the section start
+        """
         entry = self.get_entry_for_header(header)
 
         if header.encryption_type != EncryptionType.AES_CTR:
-            raise Exception(
-                "Only aes ctr encryption is supported", header.encryption_type
+            raise UnsupportedEncryption(header.encryption_type)
+
+        section_cache = None
+        if self.block_cache is not None and self.entry is not None:
+            section_cache = self.block_cache.get_section(
+                self.entry.name.split(".", 1)[0],
+                header.index,
+                entry.start_offset,
+                entry.end_offset - entry.start_offset,
             )
 
-        fs_offset = 0
-        match header.hash_type:
-            case HashType.HIERARCHICAL_INTEGRITY_HASH:
-                fs_offset = (
-                    entry.start_offset
-                    + header.hash_data.info_level_hash.levels[-1].logical_offset
-                )
-
-            # not working
-            case HashType.HIERARCHICAL_SHA256_HASH:
-                fs_offset = (
-                    entry.start_offset + header.hash_data.layer_regions[1].offset
-                )
-            case _:
-                raise Exception("invalid hash type")
-
-        return get_enc_region(fs_offset, entry.end_offset)
-
-    def open_pfs(self, header: FsHeader):
+        key = bytes.fromhex(self.header.key_area.aes_ctr_key)
+        return CTRReadable(
+            self,
+            entry.start_offset + offset,
+            entry.end_offset,
+            key,
+            header.ctr,
+            section_cache,
+        )
+
+    def open_fs(self, header: FsHeader, verify: bool = False):
         """
-        currently not working
+        Opens the filesystem data of a section
+
+        Args:
+            header (FsHeader): The filesystem header
+            verify (bool): Check every block against the hash levels the first time it is read. A mismatch raises `IntegrityError`
         """
+        with span("nca.open_fs", section=header.index, verify=verify):
+            if verify:
+                return VerifiedReadable(self.open_section(header), header)
+
+            fs_offset = 0
+            match header.hash_type:
+                case HashType.HIERARCHICAL_INTEGRITY_HASH:
+                    fs_offset = header.hash_data.info_level_hash.levels[-1].logical_offset
+
+                case HashType.HIERARCHICAL_SHA256_HASH:
+                    fs_offset = header.hash_data.layer_regions[1].offset
+                case _:
+                    raise UnsupportedHashType(header.hash_type)
+
+            return self.open_section(header, fs_offset)
+
+    def open_pfs(self, header: FsHeader, verify: bool = False):
         if header.fs_type != FsType.PARTITION_FS:
             raise InvalidFs(FsType.PARTITION_FS, header.fs_type)
 
-        fs = self.open_fs(header)
+        fs = self.open_fs(header, verify)
         return PFS0(fs)
 
-    def open_romfs(self, header: FsHeader):
+    def verify(
+        self, header: FsHeader, executor: Executor | None = None
+    ) -> VerifyResult:
+        """
+        Checks every hash level of the section described by `header`, from the master hash down to the data
+
+        Args:
+            header (FsHeader): The filesystem header
+            executor (Executor): Pool used to decrypt and hash blocks. A thread pool sized to the cpu count is used if not given
+
+        Returns:
+            The result of every level, with the first bad block of each one
+        """
+        return verify_section(self.open_section(header), header, executor)
+
+    def open_romfs(self, header: FsHeader, verify: bool = False):
         if header.fs_type != FsType.ROM_FS:
             raise InvalidFs(FsType.ROM_FS, header.fs_type)
 
-        return RomFS(self.open_fs(header))
+        return RomFS(self.open_fs(header, verify))
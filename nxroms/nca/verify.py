@@ -0,0 +1,341 @@
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from hashlib import sha256
+import os
+import threading
+
+from ..fs.fs import FsHeader, HashType, UnsupportedHashType
+from ..readers import CTRReadable, Readable
+from ..utils import Bitmap
+
+HASH_SIZE = 0x20
+
+# how much encrypted data is read before handing it to a worker
+VERIFY_CHUNK_SIZE = 0x400000
+
+# how many blocks of each hash level are kept by a VerifiedReadable
+HASH_BLOCK_CACHE_SIZE = 64
+
+
+class IntegrityError(Exception):
+    def __init__(self, level: int, block: int):
+        self.level = level
+        self.block = block
+
+        super().__init__(f"Hash mismatch in level {level}, block {block}")
+
+
+@dataclass
+class HashLevel:
+    offset: int
+    size: int
+    block_size: int
+
+    # ivfc pads the last block with zeros before hashing it, sha256 layers don't
+    padded: bool
+
+    @property
+    def block_count(self) -> int:
+        return -(-self.size // self.block_size)
+
+
+@dataclass
+class LevelResult:
+    index: int
+    block_count: int
+    first_bad_block: int | None = None
+
+    @property
+    def valid(self) -> bool:
+        return self.first_bad_block is None
+
+
+@dataclass
+class VerifyResult:
+    levels: list[LevelResult] = field(default_factory=list)
+
+    @property
+    def valid(self) -> bool:
+        return all(x.valid for x in self.levels)
+
+
+def get_hash_levels(header: FsHeader) -> list[HashLevel]:
+    """
+    Gets every hash level of a section, the last one being the filesystem data
+
+    Args:
+        header (FsHeader): The filesystem header
+
+    Returns:
+        The levels, with offsets relative to the section start
+    """
+    match header.hash_type:
+        case HashType.HIERARCHICAL_INTEGRITY_HASH:
+            info = header.hash_data.info_level_hash
+
+            # block_size is stored as a power of two
+            return [
+                HashLevel(x.logical_offset, x.hash_data_size, 1 << x.block_size, True)
+                for x in info.levels[: info.max_layer - 1]
+            ]
+
+        case HashType.HIERARCHICAL_SHA256_HASH:
+            data = header.hash_data
+            first, *rest = data.layer_regions
+
+            # the master hash covers the whole first layer at once
+            return [HashLevel(first.offset, first.size, first.size, False)] + [
+                HashLevel(x.offset, x.size, data.block_size, False) for x in rest
+            ]
+
+        case _:
+            raise UnsupportedHashType(header.hash_type)
+
+
+def get_master_hash(header: FsHeader) -> bytes:
+    return header.hash_data.master_hash or bytes(HASH_SIZE)
+
+
+def hash_block(level: HashLevel, block) -> bytes:
+    if level.padded and len(block) < level.block_size:
+        block = bytes(block) + bytes(level.block_size - len(block))
+
+    return sha256(block).digest()
+
+
+def _check_chunk(
+    section: CTRReadable,
+    level: HashLevel,
+    table: bytes,
+    first_block: int,
+    offset: int,
+    size: int,
+    data: bytes,
+    plain: bytearray | None,
+) -> int | None:
+    data = memoryview(section.decrypt_at(offset, data))[:size]
+
+    if plain is not None:
+        start = offset - level.offset
+        plain[start : start + len(data)] = data
+
+    for pos in range(0, size, level.block_size):
+        index = first_block + pos // level.block_size
+        expected = table[index * HASH_SIZE : (index + 1) * HASH_SIZE]
+
+        if hash_block(level, data[pos : pos + level.block_size]) != expected:
+            return index
+
+
+def _verify_level(
+    section: CTRReadable,
+    executor: Executor,
+    level: HashLevel,
+    table: bytes,
+    keep: bool,
+    max_in_flight: int,
+) -> tuple[int | None, bytearray | None]:
+    # hash levels are kept in memory, they are the table of the next level
+    plain = bytearray(level.size) if keep else None
+    chunk_blocks = max(1, VERIFY_CHUNK_SIZE // level.block_size)
+    chunk_size = chunk_blocks * level.block_size
+
+    slots = threading.BoundedSemaphore(max_in_flight)
+    futures = []
+
+    for first in range(0, level.block_count, chunk_blocks):
+        offset = level.offset + first * level.block_size
+        size = min(chunk_size, level.size - first * level.block_size)
+
+        # reads stay sequential in this thread while the workers decrypt and
+        # hash the previous chunks, the semaphore bounds the memory in use
+        slots.acquire()
+        data = section.peek_encrypted_at(offset, section.align_up(size, 0x10))
+
+        future = executor.submit(
+            _check_chunk, section, level, table, first, offset, size, data, plain
+        )
+        future.add_done_callback(lambda _: slots.release())
+        futures.append(future)
+
+    bad = [x.result() for x in futures]
+    bad = [x for x in bad if x is not None]
+
+    return min(bad) if bad else None, plain
+
+
+def verify_section(
+    section: CTRReadable, header: FsHeader, executor: Executor | None = None
+) -> VerifyResult:
+    """
+    Verifies every hash level of a section, from the master hash down to the data
+
+    Args:
+        section (CTRReadable): The whole decrypted section, see `Nca.open_section`
+        header (FsHeader): The filesystem header
+        executor (Executor): Pool used to decrypt and hash blocks
+
+    Returns:
+        The result of every level
+    """
+    owned = executor is None
+    workers = os.cpu_count() or 1
+    if owned:
+        executor = ThreadPoolExecutor(workers)
+
+    levels = get_hash_levels(header)
+    result = VerifyResult()
+    table = get_master_hash(header)
+
+    try:
+        for index, level in enumerate(levels):
+            keep = index < len(levels) - 1
+            bad, plain = _verify_level(
+                section, executor, level, table, keep, workers * 2
+            )
+
+            result.levels.append(LevelResult(index, level.block_count, bad))
+            table = plain
+    finally:
+        if owned:
+            executor.shutdown()
+
+    return result
+
+
+class VerifiedLevel:
+    def __init__(
+        self,
+        section: CTRReadable,
+        level: HashLevel,
+        index: int,
+        parent: "VerifiedLevel | None",
+        master_hash: bytes,
+        cache_size: int = 0,
+    ):
+        """
+        A hash level whose blocks are checked against the level above the first time they are read
+
+        Args:
+            section (CTRReadable): The whole decrypted section
+            level (HashLevel): The level
+            index (int): The level index, used in errors
+            parent (VerifiedLevel): The level holding the hashes of this one, None for the first level
+            master_hash (bytes): The hash of the first level
+            cache_size (int): How many decrypted blocks are kept, for levels read by other levels
+        """
+        self.section = section
+        self.level = level
+        self.index = index
+        self.parent = parent
+        self.master_hash = master_hash
+
+        self.verified = Bitmap(level.block_count)
+
+        self._cache_size = cache_size
+        self._cache: OrderedDict[int, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_expected_hash(self, block: int) -> bytes:
+        if self.parent is None:
+            return self.master_hash[block * HASH_SIZE : (block + 1) * HASH_SIZE]
+
+        return self.parent.peek_at(block * HASH_SIZE, HASH_SIZE)
+
+    def read_block(self, block: int) -> bytes:
+        with self._lock:
+            data = self._cache.get(block)
+            if data is not None:
+                self._cache.move_to_end(block)
+                return data
+
+        offset = block * self.level.block_size
+        size = min(self.level.block_size, self.level.size - offset)
+        data = self.section.peek_at(self.level.offset + offset, size)
+
+        if block not in self.verified:
+            if hash_block(self.level, data) != self.get_expected_hash(block):
+                raise IntegrityError(self.index, block)
+
+            with self._lock:
+                self.verified.add(block)
+
+        if self._cache_size:
+            with self._lock:
+                self._cache[block] = data
+                if len(self._cache) > self._cache_size:
+                    self._cache.popitem(last=False)
+
+        return data
+
+    def peek_at(self, offset: int, size: int) -> bytes:
+        size = max(0, min(size, self.level.size - offset))
+        if size == 0:
+            return b""
+
+        first = offset // self.level.block_size
+        last = (offset + size - 1) // self.level.block_size
+
+        blocks = range(first, last + 1)
+        if self._cache_size == 0 and all(x in self.verified for x in blocks):
+            # everything was hashed already, only the requested bytes are needed
+            return self.section.peek_at(self.level.offset + offset, size)
+
+        data = b"".join(self.read_block(x) for x in blocks)
+        start = offset - first * self.level.block_size
+        return data[start : start + size]
+
+
+class VerifiedReadable(Readable):
+    def __init__(self, section: CTRReadable, header: FsHeader):
+        """
+        The filesystem data of a section, checked against the hash levels as it is read.
+        Verified blocks are remembered, so every block is hashed only once.
+
+        Args:
+            section (CTRReadable): The whole decrypted section, see `Nca.open_section`
+            header (FsHeader): The filesystem header
+        """
+        super().__init__(section)
+
+        self._pos = 0
+
+        levels = get_hash_levels(header)
+        master_hash = get_master_hash(header)
+
+        self.levels: list[VerifiedLevel] = []
+        parent = None
+        for index, level in enumerate(levels):
+            is_data = index == len(levels) - 1
+            parent = VerifiedLevel(
+                section,
+                level,
+                index,
+                parent,
+                master_hash,
+                0 if is_data else HASH_BLOCK_CACHE_SIZE,
+            )
+            self.levels.append(parent)
+
+        self.data = self.levels[-1]
+
+    @property
+    def size(self) -> int:
+        return self.data.level.size
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset):
+        if not (0 <= offset <= self.size):
+            raise ValueError("Out of bounds")
+        self._pos = offset
+
+    def peek_at(self, offset, size):
+        return self.data.peek_at(offset, size)
+
+    def read(self, size):
+        data = self.peek_at(self._pos, size)
+        self._pos += len(data)
+        return data
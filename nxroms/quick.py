@@ -0,0 +1,146 @@
+from dataclasses import dataclass
+from pathlib import Path
+from urllib.parse import urlsplit
+import struct
+
+from .crypto import Crypto
+from .fs.pfs0 import PFSHeader
+from .keyring import Keyring
+from .nacp import NACP_NAME, Nacp
+from .nca.header import (
+    NCA_ENCRYPTED_SIZE,
+    NCA_HEADER_SECTION_SIZE,
+    ContentType,
+    NcaHeader,
+)
+from .nca.nca import Nca
+from .readers import CountingReadable, IReadable, MemoryRegion, is_xci, open_split
+from .remote import HttpFile, is_url
+from .roms.nsp import Nsp
+from .roms.xci import Xci
+from .trace import span
+
+QUICK_INFO_BUDGET = 0x10000
+
+# the titles and the version, the rest of the nacp isn't needed
+NACP_QUICK_SIZE = 0x3070
+
+
+@dataclass
+class QuickInfo:
+    title_id: str
+    name: str | None
+    publisher: str | None
+    version: str
+    bytes_read: int
+    reads: int
+    seeks: int
+
+
+class NoControlNca(Exception):
+    pass
+
+
+def read_pfs_header(source: IReadable, magic: bytes, entry_size: int) -> PFSHeader:
+    """
+    Reads a PFS0/HFS0 header with two reads, the fixed part and then the tables
+    """
+    head = source.peek_at(0, 0x10)
+    count, string_table_size = struct.unpack_from("<II", head, 4)
+    tables = source.peek_at(0x10, count * entry_size + string_table_size)
+
+    return PFSHeader(MemoryRegion(head + tables), magic, entry_size)
+
+
+def decrypt_header_sectors(source: IReadable, first: int, count: int) -> bytes:
+    """
+    Decrypts only some sectors of an nca header
+
+    Args:
+        source (IReadable): The nca
+        first (int): The first sector
+        count (int): The count of sectors
+
+    Returns:
+        The decrypted sectors
+    """
+    key = Keyring.get_default().prod["header_key"]
+    size = count * NCA_HEADER_SECTION_SIZE
+    data = source.peek_at(first * NCA_HEADER_SECTION_SIZE, size)
+
+    return Crypto.aes_xts_decrypt(key, data, size, first, NCA_HEADER_SECTION_SIZE)
+
+
+def find_control_nca(nsp: Nsp) -> Nca:
+    for item in nsp.get_items():
+        if not item.entry.name.endswith(".nca") or item.entry.name.endswith(".cnmt.nca"):
+            continue
+
+        # the main header is the second sector, nothing else is needed to get the type
+        main = decrypt_header_sectors(item, 1, 1)
+        if main[0x5] != ContentType.CONTROL.value:
+            continue
+
+        # the romfs of a control nca is always the first section
+        fs_header = decrypt_header_sectors(item, 2, 1)
+
+        data = bytearray(NCA_ENCRYPTED_SIZE)
+        data[0x200:0x400] = main
+        data[0x400:0x600] = fs_header
+
+        nca = Nca(item, NcaHeader(bytes(data), decrypted=True))
+        nca.entry = item.entry
+        return nca
+
+    raise NoControlNca("No control nca found")
+
+
+def quick_info(path: str | Path, budget: int | None = QUICK_INFO_BUDGET) -> QuickInfo:
+    """
+    Gets the title id, name and version of a rom reading as little as possible.
+    Only the partition tables, the main header of every nca and the control nca
+    filesystem header, romfs tables and nacp titles are read.
+
+    Args:
+        path (str | Path): The nsp or xci, split dumps are joined. An http url is read with range requests
+        budget (int): Raise `ReadBudgetExceeded` if more than this many bytes are read, None to disable
+
+    Returns:
+        The title information and the I/O it took
+    """
+    if is_url(path):
+        file = HttpFile(path)
+        name = urlsplit(path).path
+    else:
+        file = open_split(path)
+        name = str(path)
+
+    reader = CountingReadable(file, budget)
+
+    try:
+        with span("quick_info", container=str(path)):
+            if is_xci(name):
+                xci = Xci(reader)
+                partition = xci.open_partition("secure")
+                nsp = Nsp(partition, read_pfs_header(partition, b"HFS0", 0x40))
+            else:
+                nsp = Nsp(reader, read_pfs_header(reader, b"PFS0", 0x18))
+
+            nca = find_control_nca(nsp)
+            fs = nca.open_romfs(nca.header.fs_headers[0])
+
+            nacp_file = next((x for x in fs.files if x.name == NACP_NAME), fs.files[0])
+            nacp = Nacp(MemoryRegion(fs.get_file(nacp_file).peek_at(0, NACP_QUICK_SIZE)))
+    finally:
+        file.close()
+
+    title = nacp.titles[0] if nacp.titles else None
+    return QuickInfo(
+        f"{nca.header.program_id:016x}",
+        title.name if title else None,
+        title.publisher if title else None,
+        nacp.version,
+        reader.bytes_read,
+        reader.reads,
+        reader.seeks,
+    )
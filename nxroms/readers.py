@@ -1,10 +1,21 @@
 from io import BufferedReader, BytesIO
 from abc import ABC, abstractmethod
+from bisect import bisect_right
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any
+from typing import Any, TYPE_CHECKING
 import struct
+import os
+import threading
 
 from nxroms.crypto import Crypto, modes
+from nxroms.hashes import HashFeeder, new_hashers
+
+if TYPE_CHECKING:
+    from nxroms.blockcache import CachedSection
+
+DUMP_CHUNK_SIZE = 0x100000
 
 
 class IReadable(ABC):
@@ -195,7 +206,16 @@ class Readable(IReadable):
         return self.__read_unpack(self.peek, size, format_str)
 
     def peek_at(self, offset, size) -> bytes | None:
-        return self.__read_at(self.peek, offset, size)
+        # wrappers forward positional reads, so nothing in the chain moves a
+        # cursor and concurrent readers don't step on each other
+        if isinstance(self.source, IReadable):
+            return self.source.peek_at(offset, size)
+
+        orig = self.tell()
+        self.seek(offset)
+        data = self.read(size)
+        self.seek(orig)
+        return data
 
     def peek_unpack_at(self, offset, size, format_str) -> Any | None:
         return self.__read_unpack_at(self.peek_at, offset, size, format_str)
@@ -209,13 +229,41 @@ class Readable(IReadable):
     def skip(self, count: int):
         self.seek(self.tell() + count)
 
-    def dump(self, name: str = "out.bin"):
+    def dump(
+        self, name: str = "out.bin", hashes: tuple[str, ...] = ()
+    ) -> dict[str, str]:
+        """
+        Writes everything from the current position to a file
+
+        Args:
+            name (str): The output
+            hashes (tuple[str, ...]): Algorithms to hash the data with in the same pass, like `crc32` or `sha1`
+
+        Returns:
+            The hex digest of every algorithm
+        """
+        return _dump(self, name, hashes)
+
+
+def _dump(readable: IReadable, name: str, hashes: tuple[str, ...]) -> dict[str, str]:
+    hashers = new_hashers(hashes)
+    feeder = HashFeeder(list(hashers.values())) if hashers else None
+
+    try:
         with open(name, "wb") as f:
             while True:
-                chunk = self.read(1024)
+                chunk = readable.read(DUMP_CHUNK_SIZE)
                 if not chunk:
                     break
+
                 f.write(chunk)
+                if feeder is not None:
+                    feeder.update(chunk)
+    finally:
+        if feeder is not None:
+            feeder.close()
+
+    return {k: v.hexdigest() for k, v in hashers.items()}
 
 
 class ReadableRegion(IReadable):
@@ -296,13 +344,20 @@ class ReadableRegion(IReadable):
             return None
         return struct.unpack(format_str, data)[0]
 
-    def dump(self, name: str = "out.bin"):
-        with open(name, "wb") as f:
-            while True:
-                chunk = self.read(1024)
-                if not chunk:
-                    break
-                f.write(chunk)
+    def dump(
+        self, name: str = "out.bin", hashes: tuple[str, ...] = ()
+    ) -> dict[str, str]:
+        """
+        Writes everything from the current position to a file
+
+        Args:
+            name (str): The output
+            hashes (tuple[str, ...]): Algorithms to hash the data with in the same pass, like `crc32` or `sha1`
+
+        Returns:
+            The hex digest of every algorithm
+        """
+        return _dump(self, name, hashes)
 
 
 class File(Readable):
@@ -326,16 +381,221 @@ class File(Readable):
     def fileno(self):
         return self.source.fileno()
 
+    def peek_at(self, offset, size) -> bytes | None:
+        return os.pread(self.fileno(), size, offset)
+
+
+class FdPool:
+    def __init__(self, max_open: int = 64):
+        """
+        Keeps at most `max_open` file descriptors open, closing the least recently used ones
+
+        Args:
+            max_open (int): The maximum count of open descriptors
+        """
+        self.max_open = max_open
+
+        self._fds: OrderedDict[str, int] = OrderedDict()
+        self._users: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def open(self, path: str):
+        """
+        Borrows a descriptor for `path`, it won't be closed until it's given back
+        """
+        with self._lock:
+            fd = self._fds.get(path)
+            if fd is None:
+                fd = os.open(path, os.O_RDONLY)
+                self._fds[path] = fd
+            self._fds.move_to_end(path)
+            self._users[path] = self._users.get(path, 0) + 1
+
+            self._evict()
+
+        try:
+            yield fd
+        finally:
+            with self._lock:
+                self._users[path] -= 1
+                self._evict()
+
+    def _evict(self):
+        # descriptors in use are skipped, the pool may go over the limit while they are
+        for path in list(self._fds):
+            if len(self._fds) <= self.max_open:
+                break
+            if self._users.get(path):
+                continue
+
+            os.close(self._fds.pop(path))
+
+    def close(self):
+        with self._lock:
+            for fd in self._fds.values():
+                os.close(fd)
+            self._fds.clear()
+
+
+DEFAULT_FD_POOL = FdPool()
+
+
+class MultiFile(Readable):
+    def __init__(self, paths: list[str | Path], pool: FdPool | None = None):
+        """
+        Presents the parts of a split dump as a single file
+
+        Args:
+            paths (list[str | Path]): The parts, in order
+            pool (FdPool): Where descriptors are borrowed from, shared by default
+        """
+        super().__init__(None)
+
+        self.paths = [str(x) for x in paths]
+        self.pool = pool or DEFAULT_FD_POOL
+
+        # start offset of every part, plus the total size at the end
+        self.offsets = [0]
+        for path in self.paths:
+            self.offsets.append(self.offsets[-1] + os.path.getsize(path))
+
+        self._pos = 0
+
+    @property
+    def size(self) -> int:
+        return self.offsets[-1]
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset):
+        if not (0 <= offset <= self.size):
+            raise ValueError("Offset out of bounds")
+        self._pos = offset
+
+    def peek_at(self, offset, size):
+        chunks = []
+        end = min(offset + size, self.size)
+
+        while offset < end:
+            index = bisect_right(self.offsets, offset) - 1
+            part_end = self.offsets[index + 1]
+            count = min(end, part_end) - offset
+
+            with self.pool.open(self.paths[index]) as fd:
+                data = os.pread(fd, count, offset - self.offsets[index])
+
+            chunks.append(data)
+            offset += len(data)
+
+            if len(data) < count:
+                break
+
+        return b"".join(chunks)
+
+    def read(self, size):
+        data = self.peek_at(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+def find_split_parts(path: str | Path) -> list[str] | None:
+    """
+    Finds the parts of a split dump, either a directory with `00`, `01`... files
+    or files with a numbered extension like `.xc0`, `.xc1`...
+
+    Args:
+        path (str | Path): The directory or the first part
+
+    Returns:
+        The parts in order, or None if `path` isn't split
+    Raises:
+        ValueError: If a numbered extension part is missing
+    """
+    path = str(path)
+
+    if os.path.isdir(path):
+        parts = sorted(
+            x
+            for x in os.listdir(path)
+            if x.isdigit() and os.path.isfile(os.path.join(path, x))
+        )
+
+        # the parts are numbered from 00 without gaps, other folders like years aren't dumps
+        width = max(len(parts[0]), 2) if parts else 2
+        if not parts or parts != [f"{x:0{width}d}" for x in range(len(parts))]:
+            return None
+        return [os.path.join(path, x) for x in parts]
+
+    directory, name = os.path.split(path)
+    stem = name.rstrip("0123456789")
+    if stem == name or not stem.endswith((".xc", ".ns")):
+        return None
+
+    parts = {
+        int(x[len(stem) :]): x
+        for x in os.listdir(directory or ".")
+        if x.startswith(stem) and x[len(stem) :].isdigit()
+    }
+
+    count = 0
+    while count in parts:
+        count += 1
+
+    # joining the parts around a missing one would shift all the data after it
+    if count != len(parts):
+        raise ValueError(f"Missing part {stem}{count} of {path}")
+    return [os.path.join(directory, parts[x]) for x in range(count)]
+
+
+def is_xci(path: str | Path) -> bool:
+    """
+    Checks the extension of a rom, the first part of a split xci counts too
+    """
+    return os.path.splitext(str(path))[1].lower() in (".xci", ".xc0")
+
+
+def open_split(path: str | Path, pool: FdPool | None = None) -> "File | MultiFile":
+    """
+    Opens a dump, joining its parts if it's split
+
+    Args:
+        path (str | Path): The file, the directory with the parts or the first part
+        pool (FdPool): Where the parts borrow descriptors from
+    """
+    parts = find_split_parts(path)
+    if parts is None:
+        return File(str(path))
+
+    return MultiFile(parts, pool)
+
 
 class MemoryRegion(Readable):
     def __init__(self, source: bytes):
         super().__init__(BytesIO(source))
 
+        self._data = source
+
+    def peek_at(self, offset, size) -> bytes | None:
+        return self._data[offset : offset + size]
+
 
 # idk how this works but it works
 # ported from https://github.com/XorTroll/cntx/blob/main/src/util.rs
 class CTRReadable(Readable):
-    def __init__(self, source: IReadable, start: int, end: int, key: bytes, ctr: int):
+    def __init__(
+        self,
+        source: IReadable,
+        start: int,
+        end: int,
+        key: bytes,
+        ctr: int,
+        cache: "CachedSection | None" = None,
+    ):
         """
         A bounded CTR-encrypted readable region.
 
@@ -345,6 +605,7 @@ class CTRReadable(Readable):
             end (int): Absolute end offset in parent
             key (bytes): AES CTR key
             ctr (int): Initial CTR high value
+            cache (CachedSection): Where decrypted blocks are looked up before decrypting them
         """
         super().__init__(source)
 
@@ -354,6 +615,7 @@ class CTRReadable(Readable):
 
         self.key = key
         self.ctr = ctr
+        self.cache = cache
 
     def align_down(self, value: int, align: int):
         return value & ~(align - 1)
@@ -361,9 +623,6 @@ class CTRReadable(Readable):
     def align_up(self, value: int, align: int):
         return (value + (align - 1)) & ~(align - 1)
 
-    def _absolute(self):
-        return self._start + self._pos
-
     def tell(self):
         return self._pos
 
@@ -372,8 +631,36 @@ class CTRReadable(Readable):
             raise ValueError("Out of bounds")
         self._pos = offset
 
-    def read(self, size):
-        absolute_offset = self._absolute()
+    def peek_encrypted_at(self, offset, size) -> bytes:
+        """
+        Reads the raw (still encrypted) bytes at `offset`. This method does not move the cursor
+
+        Args:
+            offset (int): The offset, relative to the region start. Must be aligned to 0x10
+            size (int): The count of bytes to read
+        Returns:
+            The encrypted data
+        """
+        return self.source.peek_at(self._start + offset, size) or b""
+
+    def decrypt_at(self, offset, data: bytes) -> bytes:
+        """
+        Decrypts `data` that was read at `offset`
+
+        Args:
+            offset (int): The offset the data was read at, relative to the region start. Must be aligned to 0x10
+            data (bytes): The encrypted data
+        Returns:
+            The decrypted data
+        """
+        sector_index = ((self._start + offset) >> 4) | (self.ctr << 64)
+        iv = Crypto.get_tweak(sector_index)
+
+        decryptor = Crypto.get_decryptor(self.key, modes.CTR(iv))
+        return decryptor.update(data)
+
+    def peek_at(self, offset, size):
+        absolute_offset = self._start + offset
 
         if absolute_offset >= self._end:
             return b""
@@ -381,27 +668,27 @@ class CTRReadable(Readable):
         remaining = self._end - absolute_offset
         size = min(size, remaining)
 
-        aligned_offset = self.align_down(absolute_offset, 0x10)
-        diff = absolute_offset - aligned_offset
+        if self.cache is not None:
+            return self.cache.read(self, absolute_offset, size)
+
+        aligned_offset = self.align_down(absolute_offset, 0x10) - self._start
+        diff = offset - aligned_offset
 
         size_raw = size + diff
         buf_size = self.align_up(size_raw, 0x10)
 
-        # read encrypted data from parent without disturbing its cursor
-        data = self.source.peek_at(aligned_offset, buf_size)
+        data = self.peek_encrypted_at(aligned_offset, buf_size)
         if not data:
             return b""
 
-        sector_index = (aligned_offset >> 4) | (self.ctr << 64)
-        iv = Crypto.get_tweak(sector_index)
-
-        decryptor = Crypto.get_decryptor(self.key, modes.CTR(iv))
-        decrypted = decryptor.update(data)
+        decrypted = self.decrypt_at(aligned_offset, data)
 
         start = diff
         end = min(start + size, len(decrypted))
-        result = decrypted[start:end]
+        return decrypted[start:end]
 
+    def read(self, size):
+        result = self.peek_at(self._pos, size)
         self._pos += len(result)
 
         return result
@@ -415,3 +702,73 @@ class CTRReadable(Readable):
         if not data or len(data) < size:
             return None
         return struct.unpack(format_string, data)[0]
+
+
+def resolve_offset(readable: IReadable) -> tuple[IReadable, int] | None:
+    """
+    Follows plain regions and wrappers down to the readable that holds the data
+
+    Args:
+        readable (IReadable): The readable
+
+    Returns:
+        The root readable and the absolute offset of `readable` in it, or None if the data is encrypted on the way
+    """
+    offset = 0
+    while True:
+        if isinstance(readable, CTRReadable):
+            return None
+
+        if isinstance(readable, ReadableRegion):
+            offset += readable._start
+            readable = readable._source
+        elif isinstance(readable, Readable) and isinstance(readable.source, IReadable):
+            readable = readable.source
+        else:
+            return readable, offset
+
+
+class ReadBudgetExceeded(Exception):
+    def __init__(self, budget: int):
+        super().__init__(f"Read more than {budget} bytes")
+
+
+class CountingReadable(Readable):
+    def __init__(self, source: IReadable, budget: int | None = None):
+        """
+        Counts the bytes, reads and seeks that go through it
+
+        Args:
+            source (IReadable): The readable to count
+            budget (int): If set, reading more than this many bytes raises `ReadBudgetExceeded`
+        """
+        super().__init__(source)
+
+        self.budget = budget
+        self.bytes_read = 0
+        self.reads = 0
+        self.seeks = 0
+
+        self._next_offset = 0
+
+    def peek_at(self, offset, size):
+        # a read that doesn't continue the previous one needs a seek
+        if offset != self._next_offset:
+            self.seeks += 1
+
+        data = self.source.peek_at(offset, size) or b""
+
+        self.reads += 1
+        self.bytes_read += len(data)
+        self._next_offset = offset + len(data)
+
+        if self.budget is not None and self.bytes_read > self.budget:
+            raise ReadBudgetExceeded(self.budget)
+
+        return data
+
+    def read(self, size):
+        pos = self.tell()
+        data = self.peek_at(pos, size)
+        self.seek(pos + len(data))
+        return data
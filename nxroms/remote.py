@@ -0,0 +1,285 @@
+from collections import OrderedDict
+from concurrent.futures import Future
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from queue import Empty, LifoQueue
+from urllib.parse import urlsplit
+import re
+import threading
+
+from .readers import Readable
+
+# small enough that a header read doesn't pull much extra, large enough that
+# the tables after a header usually come with it
+HTTP_BLOCK_SIZE = 0x10000
+HTTP_CACHE_BLOCKS = 256
+
+# the most blocks fetched by a single request
+HTTP_MAX_REQUEST_BLOCKS = 64
+
+HTTP_MAX_CONNECTIONS = 8
+HTTP_TIMEOUT = 30
+
+CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class HttpError(Exception):
+    def __init__(self, url: str, status: int, reason: str):
+        super().__init__(f"{url}: {status} {reason}")
+        self.status = status
+
+
+def is_url(path) -> bool:
+    return isinstance(path, str) and path.startswith(("http://", "https://"))
+
+
+class ConnectionPool:
+    def __init__(
+        self,
+        url: str,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        timeout: float = HTTP_TIMEOUT,
+    ):
+        """
+        Keeps persistent connections to the host of `url` and hands them out to the threads that request ranges
+
+        Args:
+            url (str): The resource
+            max_connections (int): The most connections open at once, more requests wait for one
+            timeout (float): The socket timeout
+        """
+        parts = urlsplit(url)
+        self.url = url
+        self.path = parts.path + (f"?{parts.query}" if parts.query else "")
+        self.timeout = timeout
+
+        self._connection_class = (
+            HTTPSConnection if parts.scheme == "https" else HTTPConnection
+        )
+        self._netloc = parts.netloc
+
+        self._idle: LifoQueue = LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _connect(self):
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            return self._connection_class(self._netloc, timeout=self.timeout)
+
+    def request(
+        self, method: str, headers: dict[str, str] | None = None
+    ) -> tuple[int, dict[str, str], bytes]:
+        """
+        Sends a request on a pooled connection, retrying once on a fresh one if the server closed the idle connection
+
+        Returns:
+            The status, the headers with lowercase names and the body
+        """
+        with self._slots:
+            for attempt in range(2):
+                connection = self._connect()
+                try:
+                    connection.request(method, self.path, headers=headers or {})
+                    response = connection.getresponse()
+                    body = response.read()
+                except (HTTPException, ConnectionError, TimeoutError):
+                    connection.close()
+                    if attempt:
+                        raise
+                    continue
+
+                if response.will_close:
+                    connection.close()
+                else:
+                    self._idle.put(connection)
+
+                return (
+                    response.status,
+                    {k.lower(): v for k, v in response.getheaders()},
+                    body,
+                )
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                break
+
+
+class HttpFile(Readable):
+    def __init__(
+        self,
+        url: str,
+        block_size: int = HTTP_BLOCK_SIZE,
+        cache_blocks: int = HTTP_CACHE_BLOCKS,
+        pool: ConnectionPool | None = None,
+    ):
+        """
+        A remote file read with HTTP range requests. Reads are rounded to aligned
+        blocks kept in an LRU cache, the missing blocks of a read are fetched with a single request
+        and threads that need a block already being fetched wait for it instead of requesting it again.
+
+        Args:
+            url (str): The file, the server must support range requests
+            block_size (int): The size of every cached block
+            cache_blocks (int): How many blocks are kept
+            pool (ConnectionPool): The connections to use, a new pool for `url` by default
+        """
+        super().__init__(None)
+
+        self.url = url
+        self.block_size = block_size
+        self.cache_blocks = cache_blocks
+        self.pool = pool or ConnectionPool(url)
+
+        self.requests = 0
+        self.bytes_fetched = 0
+
+        self._blocks: OrderedDict[int, bytes] = OrderedDict()
+        self._pending: dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._pos = 0
+
+        self.size = self._fetch_size()
+
+    def _fetch_size(self) -> int:
+        # the first block is needed by every parser, so it's fetched along with the size
+        status, headers, body = self._get_range(0, self.block_size)
+
+        total = CONTENT_RANGE.match(headers["content-range"]).group(3)
+        if total == "*":
+            raise HttpError(self.url, status, "missing content length")
+
+        size = int(total)
+        self._store(0, body)
+        return size
+
+    def _get_range(self, start: int, end: int) -> tuple[int, dict[str, str], bytes]:
+        status, headers, body = self.pool.request(
+            "GET", {"Range": f"bytes={start}-{end - 1}"}
+        )
+        if status == 200:
+            raise HttpError(self.url, status, "range requests not supported")
+        if status != 206:
+            raise HttpError(self.url, status, "range request failed")
+
+        # anything but the requested bytes would be cached under the wrong blocks
+        match = CONTENT_RANGE.match(headers.get("content-range", ""))
+        if match is None:
+            raise HttpError(self.url, status, "missing content range")
+
+        first, last, total = match.groups()
+        expected_end = end if total == "*" else min(end, int(total))
+        if (
+            int(first) != start
+            or int(last) + 1 != expected_end
+            or len(body) != expected_end - start
+        ):
+            raise HttpError(
+                self.url, status, f"got bytes {first}-{last} for {start}-{end - 1}"
+            )
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_fetched += len(body)
+
+        return status, headers, body
+
+    def _store(self, offset: int, data: bytes):
+        # data starts on a block boundary, every full or final block is cached
+        with self._lock:
+            for i in range(0, len(data), self.block_size):
+                self._blocks[(offset + i) // self.block_size] = data[
+                    i : i + self.block_size
+                ]
+
+            while len(self._blocks) > self.cache_blocks:
+                self._blocks.popitem(last=False)
+
+    def _fetch_run(self, first: int, count: int, futures: dict[int, Future]):
+        try:
+            start = first * self.block_size
+            _, _, body = self._get_range(
+                start, min(start + count * self.block_size, self.size)
+            )
+            self._store(start, body)
+
+            for i in range(count):
+                block = first + i
+                futures[block].set_result(
+                    body[i * self.block_size : (i + 1) * self.block_size]
+                )
+        except BaseException as e:
+            # the waiters get the error from their future
+            for i in range(count):
+                if not futures[first + i].done():
+                    futures[first + i].set_exception(e)
+        finally:
+            with self._lock:
+                for i in range(count):
+                    self._pending.pop(first + i, None)
+
+    def _get_blocks(self, first: int, last: int) -> list[bytes]:
+        found: dict[int, bytes] = {}
+        waiting: dict[int, Future] = {}
+        owned: dict[int, Future] = {}
+
+        with self._lock:
+            for block in range(first, last + 1):
+                data = self._blocks.get(block)
+                if data is not None:
+                    self._blocks.move_to_end(block)
+                    found[block] = data
+                elif block in self._pending:
+                    waiting[block] = self._pending[block]
+                else:
+                    owned[block] = self._pending[block] = Future()
+
+        # contiguous missing blocks are coalesced into one request
+        runs = []
+        for block in sorted(owned):
+            if (
+                runs
+                and runs[-1][0] + runs[-1][1] == block
+                and runs[-1][1] < HTTP_MAX_REQUEST_BLOCKS
+            ):
+                runs[-1][1] += 1
+            else:
+                runs.append([block, 1])
+
+        for start, count in runs:
+            self._fetch_run(start, count, owned)
+
+        for block, future in {**owned, **waiting}.items():
+            found[block] = future.result()
+
+        return [found[x] for x in range(first, last + 1)]
+
+    def peek_at(self, offset, size):
+        end = min(offset + size, self.size)
+        if offset >= end:
+            return b""
+
+        first = offset // self.block_size
+        last = (end - 1) // self.block_size
+
+        data = b"".join(self._get_blocks(first, last))
+        start = offset - first * self.block_size
+        return data[start : start + end - offset]
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset):
+        if not (0 <= offset <= self.size):
+            raise ValueError("Offset out of bounds")
+        self._pos = offset
+
+    def read(self, size):
+        data = self.peek_at(self._pos, size)
+        self._pos += len(data)
+        return data
+
+    def close(self):
+        self.pool.close()
@@ -0,0 +1,66 @@
+from pathlib import Path
+from typing import Callable, TYPE_CHECKING
+
+from ..fs.pfs0 import PFSBuilder, PFSItem
+from .verify import NcaHashResult, get_name_hash
+
+if TYPE_CHECKING:
+    from .xci import Xci
+
+
+def write_pfs(
+    items: list[PFSItem], path: str | Path, hash: bool = True
+) -> list[NcaHashResult]:
+    """
+    Writes `items` as a new PFS0 in a single pass, the items are read in the order they are given
+
+    Args:
+        items (list[PFSItem]): The items to copy
+        path (str | Path): The output, written to a temporary file first
+        hash (bool): Compute the sha256 of every nca while copying it
+
+    Returns:
+        The hash result of every nca, empty if `hash` is False
+    """
+    builder = PFSBuilder()
+    for item in items:
+        builder.add(item.entry.name, item)
+
+    digests = builder.write(path, hash)
+    return [
+        NcaHashResult(
+            item.entry.name,
+            item.entry.size,
+            digests[item.entry.name],
+            get_name_hash(item.entry.name),
+        )
+        for item in items
+        if item.entry.name in digests and item.entry.name.endswith(".nca")
+    ]
+
+
+def xci_to_nsp(
+    xci: "Xci",
+    path: str | Path,
+    include: Callable[[str], bool] | None = None,
+    hash: bool = True,
+) -> list[NcaHashResult]:
+    """
+    Converts the secure partition of an xci to a standalone nsp without extracting it.
+    The entries are copied in the order they are stored, so the card is read once sequentially.
+
+    Args:
+        xci (Xci): The card
+        path (str | Path): The nsp to write
+        include (Callable[[str], bool]): Only copy the entries whose name passes, everything by default
+        hash (bool): Compute the sha256 of every nca in the same pass. Without it plain files are copied with `copy_file_range`
+
+    Returns:
+        The hash result of every nca, compared to the hash in its name
+    """
+    items = xci.open_nsp().get_items()
+    if include is not None:
+        items = [x for x in items if include(x.entry.name)]
+
+    items.sort(key=lambda x: x.entry.offset)
+    return write_pfs(items, path, hash)
@@ -1,11 +1,39 @@
-from ..fs.pfs0 import PFSHeader, PFS0
+from ..fs.pfs0 import PFSBuilder, PFSHeader, PFS0
 from ..readers import IReadable
+from ..cnmt import Cnmt
+from ..nca.header import ContentType
 from ..nca.nca import Nca
+from .verify import NcaHashResult, verify_items
+from pathlib import Path
+from typing import TYPE_CHECKING
 import os
 
+if TYPE_CHECKING:
+    from ..blockcache import BlockCache
+    from ..cache import MetadataCache
+
 
 class Nsp(PFS0):
-    def __init__(self, source: IReadable, header: PFSHeader = None):
+    def __init__(
+        self,
+        source: IReadable,
+        header: PFSHeader = None,
+        cache: "MetadataCache | None" = None,
+        block_cache: "BlockCache | None" = None,
+    ):
+        """
+        Args:
+            source (IReadable): The nsp
+            header (PFSHeader): An already parsed header
+            cache (MetadataCache): Where parsed headers are looked up before decrypting them
+            block_cache (BlockCache): Where decrypted blocks of the ncas are kept
+        """
+        self.cache = cache
+        self.block_cache = block_cache
+
+        if header is None and cache is not None:
+            header = cache.get_pfs_header(source, b"PFS0", 0x18)
+
         super().__init__(source, header)
 
     def get_nca(self, index: int):
@@ -13,11 +41,82 @@ class Nsp(PFS0):
         if os.path.splitext(item.entry.name)[1] != ".nca":
             return None
 
-        return Nca.from_item(item)
+        return Nca.from_item(item, self.cache, self.block_cache)
 
     def get_ncas(self) -> list[Nca]:
         return [
-            Nca.from_item(x)
+            Nca.from_item(x, self.cache, self.block_cache)
             for x in self.get_items()
             if os.path.splitext(x.entry.name)[1] == ".nca"
         ]
+
+    def get_cnmts(self) -> list[Cnmt]:
+        """
+        Parses the content meta of every META nca
+        """
+        cnmts = []
+        for x in self.get_items():
+            if not x.entry.name.endswith(".cnmt.nca"):
+                continue
+
+            nca = Nca.from_item(x, self.cache, self.block_cache)
+            if nca.header.content_type != ContentType.META:
+                continue
+
+            pfs = nca.open_pfs(nca.header.fs_headers[0])
+            for item in pfs.get_items():
+                if item.entry.name.endswith(".cnmt"):
+                    cnmts.append(Cnmt(item))
+
+        return cnmts
+
+    def verify_ncas(
+        self,
+        expected: dict[str, bytes] | None = None,
+        workers: int | None = None,
+        use_cnmt: bool = True,
+    ) -> list[NcaHashResult]:
+        """
+        Hashes every nca with sha256 and compares it to the full hash in the cnmt, or to the hash prefix in its name
+
+        Args:
+            expected (dict[str, bytes]): Full hashes by nca name, these take precedence over the cnmt and the name
+            workers (int): The count of ncas hashed at once, defaults to the cpu count
+            use_cnmt (bool): Compare against the hashes listed in the cnmt
+
+        Returns:
+            The result of every nca
+        """
+        hashes = {}
+        if use_cnmt:
+            for cnmt in self.get_cnmts():
+                hashes.update(cnmt.get_content_hashes())
+        hashes.update(expected or {})
+
+        items = [
+            x for x in self.get_items() if os.path.splitext(x.entry.name)[1] == ".nca"
+        ]
+        return verify_items(items, hashes, workers)
+
+    def repack(
+        self,
+        path: str | Path,
+        add: dict[str, IReadable | str | Path] | None = None,
+        remove: list[str] | None = None,
+    ):
+        """
+        Writes a copy of the nsp with entries added, replaced or removed. The kept
+        entries are copied range by range from this nsp, nothing is extracted
+
+        Args:
+            path (str | Path): The new nsp, it can't be the file this nsp is read from
+            add (dict[str, IReadable | str | Path]): Entries to add by name, an existing entry with the same name is replaced
+            remove (list[str]): Names of the entries to drop
+        """
+        builder = PFSBuilder.from_pfs(self)
+        for name in remove or []:
+            builder.remove(name)
+        for name, source in (add or {}).items():
+            builder.add(name, source)
+
+        builder.write(path)
@@ -0,0 +1,187 @@
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterator
+import os
+
+from ..readers import File, IReadable, find_split_parts, open_split, resolve_offset
+from ..transfer import COPY_CHUNK_SIZE, copy_region
+from .xci import CARD_RESERVE_PER_GB, Xci
+
+PADDING = b"\xff" * COPY_CHUNK_SIZE
+
+
+class PaddingError(Exception):
+    def __init__(self, offset: int):
+        super().__init__(f"Found data after the used size, at {offset:#x}")
+        self.offset = offset
+
+
+def _data_ranges(source: IReadable, start: int, end: int) -> Iterator[tuple[int, int]]:
+    # holes of sparse files read as zeros and hold no data, only the data ranges are read
+    resolved = resolve_offset(source)
+    if resolved is None or not isinstance(resolved[0], File) or not hasattr(os, "SEEK_DATA"):
+        yield start, end
+        return
+
+    fd = resolved[0].fileno()
+    base = resolved[1]
+
+    pos = start
+    while pos < end:
+        try:
+            data = os.lseek(fd, base + pos, os.SEEK_DATA) - base
+        except OSError:
+            # ENXIO, there is no data until the end of the file
+            return
+
+        if data >= end:
+            return
+
+        hole = min(os.lseek(fd, base + data, os.SEEK_HOLE) - base, end)
+        yield data, hole
+        pos = hole
+
+
+def find_data(source: IReadable, start: int, end: int) -> int | None:
+    """
+    Looks for bytes other than padding between `start` and `end`. Sparse holes are skipped without reading them
+
+    Returns:
+        The offset of the first chunk that isn't padding, or None if there is only padding
+    """
+    for range_start, range_end in _data_ranges(source, start, end):
+        for offset in range(range_start, range_end, COPY_CHUNK_SIZE):
+            data = source.peek_at(offset, min(COPY_CHUNK_SIZE, range_end - offset))
+
+            # some dumpers pad with zeros
+            if data != PADDING[: len(data)] and data.count(0) != len(data):
+                return offset
+
+    return None
+
+
+def _get_size(file: File | IReadable) -> int:
+    if isinstance(file, File):
+        return os.fstat(file.fileno()).st_size
+    return file.size
+
+
+def _write_padding(out, size: int):
+    while size > 0:
+        count = min(size, len(PADDING))
+        out.write(PADDING[:count])
+        size -= count
+
+
+def _write_atomic(out: str | Path, write: Callable[[BinaryIO], None]):
+    # an interrupted copy never leaves a half written image at `out`
+    tmp = f"{out}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            write(f)
+        os.replace(tmp, out)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def _is_source(path: str | Path, out: str | Path) -> bool:
+    # true if writing to `out` would overwrite the image or one of its parts
+    if not os.path.exists(out):
+        return False
+
+    parts = find_split_parts(path) or [path]
+    return any(os.path.samefile(x, out) for x in parts)
+
+
+def _check_out(path: str | Path, out: str | Path | None) -> str | Path | None:
+    # the image is modified in place when `out` is the image itself
+    if out is None or not _is_source(path, out):
+        return out
+
+    if find_split_parts(path) is not None:
+        raise ValueError("The output can't be a part of the split dump")
+    return None
+
+
+def trim_xci(path: str | Path, out: str | Path | None = None, check: bool = True) -> int:
+    """
+    Drops the padding after the used size of an xci
+
+    Args:
+        path (str | Path): The xci, split dumps are joined
+        out (str | Path): Where to write the trimmed image, the file is truncated in place if None or the xci itself
+        check (bool): Make sure only padding is dropped
+
+    Returns:
+        The trimmed size
+    Raises:
+        PaddingError: If `check` and something other than padding would be dropped
+    """
+    out = _check_out(path, out)
+    file = open_split(path)
+    try:
+        xci = Xci(file)
+        used = xci.used_size()
+        size = _get_size(file)
+
+        if check and size > used:
+            offset = find_data(file, used, size)
+            if offset is not None:
+                raise PaddingError(offset)
+
+        if out is None:
+            if not isinstance(file, File):
+                raise ValueError("Split dumps can't be trimmed in place")
+            if size > used:
+                os.truncate(path, used)
+            return used
+
+        # plain files are copied by the kernel
+        _write_atomic(out, lambda f: copy_region(file, f, 0, min(used, size)))
+    finally:
+        file.close()
+
+    return used
+
+
+def untrim_xci(
+    path: str | Path, out: str | Path | None = None, reserve: int = CARD_RESERVE_PER_GB
+) -> int:
+    """
+    Pads a trimmed xci with 0xFF up to the capacity of its card
+
+    Args:
+        path (str | Path): The xci, split dumps are joined
+        out (str | Path): Where to write the full image, the padding is appended in place if None or the xci itself
+        reserve (int): The bytes of every gigabyte that aren't in the image, see `card_capacity`
+
+    Returns:
+        The full size
+    """
+    out = _check_out(path, out)
+    file = open_split(path)
+    try:
+        xci = Xci(file)
+        capacity = xci.capacity(reserve)
+        size = _get_size(file)
+
+        if size > capacity:
+            raise ValueError(f"The image is larger than its card: {size} > {capacity}")
+
+        if out is None:
+            if not isinstance(file, File):
+                raise ValueError("Split dumps can't be untrimmed in place")
+            with open(path, "r+b") as f:
+                f.seek(size)
+                _write_padding(f, capacity - size)
+            return capacity
+
+        def write(f):
+            copy_region(file, f, 0, size)
+            _write_padding(f, capacity - size)
+
+        _write_atomic(out, write)
+    finally:
+        file.close()
+
+    return capacity
@@ -0,0 +1,140 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from hashlib import sha256
+from queue import Queue
+import os
+import threading
+
+from ..fs.pfs0 import PFSItem
+
+# reads are large so the disk streams instead of seeking between ncas
+HASH_CHUNK_SIZE = 0x800000
+
+# chunks read ahead of every hasher, at most workers * this many chunks are in memory
+HASH_QUEUE_CHUNKS = 2
+
+
+@dataclass
+class NcaHashResult:
+    name: str
+    size: int
+    digest: bytes
+
+    # first 16 bytes from the name, or the full hash from a cnmt
+    expected: bytes | None
+
+    @property
+    def valid(self) -> bool:
+        if self.expected is None:
+            return True
+        return self.digest.startswith(self.expected)
+
+
+def get_name_hash(name: str) -> bytes | None:
+    """
+    Gets the hash prefix encoded in an nca filename, like `<32 hex chars>.nca` or `<32 hex chars>.cnmt.nca`
+
+    Args:
+        name (str): The filename
+
+    Returns:
+        The first 16 bytes of the nca sha256, or None if the name doesn't hold one
+    """
+    stem = name.split(".", 1)[0]
+    if len(stem) != 32:
+        return None
+
+    try:
+        return bytes.fromhex(stem)
+    except ValueError:
+        return None
+
+
+def _hash_worker(queue: Queue) -> bytes:
+    h = sha256()
+    while (chunk := queue.get()) is not None:
+        h.update(chunk)
+    return h.digest()
+
+
+def _read_chunks(item: PFSItem, chunk_size: int):
+    for offset in range(0, item.entry.size, chunk_size):
+        chunk = item.peek_at(offset, chunk_size)
+        if not chunk or len(chunk) < min(chunk_size, item.entry.size - offset):
+            raise EOFError(f"{item.entry.name} is truncated at {offset:#x}")
+        yield chunk
+
+
+def hash_items(
+    items: list[PFSItem],
+    workers: int | None = None,
+    chunk_size: int = HASH_CHUNK_SIZE,
+) -> list[bytes]:
+    """
+    Computes the sha256 of every item. The calling thread reads the items one after the other
+    with large reads, so the disk streams, and hands the chunks to a hasher per item. Every hasher
+    has its own short queue, so the reader moves on to the next item while the previous ones are
+    still being hashed.
+
+    Args:
+        items (list[PFSItem]): The items
+        workers (int): The count of items hashed at once, defaults to the cpu count
+        chunk_size (int): The size of every read
+
+    Returns:
+        The digests, in the same order as `items`
+    """
+    workers = workers or os.cpu_count() or 1
+    hashers = threading.Semaphore(workers)
+
+    def hash_queue(queue: Queue) -> bytes:
+        try:
+            return _hash_worker(queue)
+        finally:
+            hashers.release()
+
+    futures = []
+    with ThreadPoolExecutor(workers) as executor:
+        for item in items:
+            # a queue is only fed once its hasher runs, so a slow hasher holds back no other
+            hashers.acquire()
+            queue = Queue(HASH_QUEUE_CHUNKS)
+            futures.append(executor.submit(hash_queue, queue))
+
+            try:
+                for chunk in _read_chunks(item, chunk_size):
+                    queue.put(chunk)
+            finally:
+                queue.put(None)
+
+    return [x.result() for x in futures]
+
+
+def verify_items(
+    items: list[PFSItem],
+    expected: dict[str, bytes] | None = None,
+    workers: int | None = None,
+) -> list[NcaHashResult]:
+    """
+    Hashes every item and compares it to the hash in its name, or to `expected` if it has one for the item
+
+    Args:
+        items (list[PFSItem]): The nca items
+        expected (dict[str, bytes]): Full hashes by item name, for example from a cnmt
+        workers (int): The count of items hashed at once
+
+    Returns:
+        The result of every item
+    """
+    expected = expected or {}
+    digests = hash_items(items, workers)
+
+    return [
+        NcaHashResult(
+            item.entry.name,
+            item.entry.size,
+            digest,
+            expected.get(item.entry.name, get_name_hash(item.entry.name)),
+        )
+        for item, digest in zip(items, digests)
+    ]
@@ -1,13 +1,24 @@
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from dataclasses import dataclass
-from typing import Literal
+from hashlib import sha256
+from pathlib import Path
+from typing import Callable, Literal, TYPE_CHECKING
+import os
 
+from .convert import xci_to_nsp
 from .nsp import Nsp
-from nxroms.fs.pfs0 import PFSHeader, PFSItem, PFS0
-from ..utils import media_to_bytes
+from .verify import NcaHashResult
+from nxroms.fs.pfs0 import HFSEntry, PFSHeader, PFSItem, PFS0
+from ..utils import align_up, media_to_bytes
 from ..binary.repr import BinaryRepr
 from ..binary.types import UInt32, UInt64, Bytes, Enumeration
 from ..readers import MemoryRegion, IReadable, Readable, ReadableRegion
+from ..trace import traced
+
+if TYPE_CHECKING:
+    from ..blockcache import BlockCache
+    from ..cache import MetadataCache
 
 
 class NotXci(Exception):
@@ -23,6 +34,34 @@ class CardSize(Enum):
     _32GB = 0xE2
 
 
+# the gigabytes of every card size
+CARD_GIGABYTES = {
+    CardSize._1GB: 1,
+    CardSize._2GB: 2,
+    CardSize._4GB: 4,
+    CardSize._8GB: 8,
+    CardSize._16GB: 16,
+    CardSize._32GB: 32,
+}
+
+# space of every gigabyte that isn't part of the image
+CARD_RESERVE_PER_GB = 0x48 * 0x100000
+
+MEDIA_SIZE = 0x200
+
+
+def card_capacity(size: CardSize, reserve: int = CARD_RESERVE_PER_GB) -> int:
+    """
+    Gets the size of an untrimmed image for a card size
+
+    Args:
+        size (CardSize): The card size
+        reserve (int): The bytes of every gigabyte that aren't in the image
+    """
+    gigabytes = CARD_GIGABYTES[size]
+    return gigabytes * 0x40000000 - gigabytes * reserve
+
+
 class XciHeader(BinaryRepr, MemoryRegion):
     magic = Bytes(0x100, 0x4)
     rom_area_start_page_address = UInt32(0x104, media_to_bytes)
@@ -32,6 +71,7 @@ class XciHeader(BinaryRepr, MemoryRegion):
 
     hfs_header_offset = UInt64(0x130)
     hfs_header_size = UInt64(0x138)
+    hfs_header_hash = Bytes(0x140, 0x20)
 
     def __init__(self, source: bytes):
         super().__init__(source)
@@ -40,17 +80,50 @@ class XciHeader(BinaryRepr, MemoryRegion):
             raise NotXci(f"Invalid magic: {self.magic}")
 
 
+@dataclass
+class HashCheck:
+    name: str
+    valid: bool
+
+
 class Xci(Readable):
     header: XciHeader = Bytes(0x0, 0x200, XciHeader)
 
-    def __init__(self, source: IReadable | str):
+    def __init__(
+        self,
+        source: IReadable | str,
+        cache: "MetadataCache | None" = None,
+        block_cache: "BlockCache | None" = None,
+    ):
+        """
+        Args:
+            source (IReadable): The xci
+            cache (MetadataCache): Where parsed headers are looked up before decrypting them
+            block_cache (BlockCache): Where decrypted blocks of the ncas are kept
+        """
         super().__init__(source)
-        
-        self.hfs_header = self.construct_hfs_header_with_bytes(
-            self.peek_at(self.header.hfs_header_offset, self.header.hfs_header_size)
-        )
 
+        self.cache = cache
+        self.block_cache = block_cache
+
+        if cache is not None:
+            self.hfs_header = self.construct_hfs_header(
+                ReadableRegion(
+                    self, self.header.hfs_header_offset, self.header.hfs_header_size
+                )
+            )
+        else:
+            self.hfs_header = self.construct_hfs_header_with_bytes(
+                self.peek_at(
+                    self.header.hfs_header_offset, self.header.hfs_header_size
+                )
+            )
+
+    @traced("xci.hfs0")
     def construct_hfs_header(self, source: IReadable):
+        if self.cache is not None:
+            return self.cache.get_pfs_header(source, b"HFS0", 0x40)
+
         return PFSHeader(source, b"HFS0", 0x40)
 
     def construct_hfs_header_with_bytes(self, _bytes: bytes):
@@ -63,7 +136,22 @@ class Xci(Readable):
     
     def open_nsp(self):
         r = self.open_partition("secure")
-        return Nsp(r, self.construct_hfs_header(r))
+        return Nsp(r, self.construct_hfs_header(r), self.cache, self.block_cache)
+
+    def used_size(self) -> int:
+        """
+        Gets where the data ends, from the partition table. Everything after it is padding
+        """
+        end = self.header.hfs_header_offset + self.header.hfs_header_size
+        partition_pos = self.header.hfs_header_offset + self.hfs_header.raw_data_pos
+
+        for x in self.hfs_header.entry_table:
+            end = max(end, partition_pos + x.offset + x.size)
+
+        return align_up(end, MEDIA_SIZE)
+
+    def capacity(self, reserve: int = CARD_RESERVE_PER_GB) -> int:
+        return card_capacity(self.header.rom_size, reserve)
 
     def open_partition(self, part: Literal["update", "normal", "secure"]):
         for x in self.hfs_header.entry_table:
@@ -77,3 +165,78 @@ class Xci(Readable):
                 + x.offset,
                 x.size
             )
+
+    def verify_partitions(
+        self, deep: bool = False, workers: int | None = None
+    ) -> list[HashCheck]:
+        """
+        Checks the root HFS0 header hash and the hashed region of every partition concurrently
+
+        Args:
+            deep (bool): Also check the hashed region of every entry inside the partitions
+            workers (int): The count of threads, defaults to the cpu count
+
+        Returns:
+            A check named `root` for the root header, then one per partition, and one per entry named `<partition>/<entry>` if `deep`
+        """
+
+        def check_root():
+            data = self.peek_at(
+                self.header.hfs_header_offset, self.header.hfs_header_size
+            )
+            return HashCheck("root", sha256(data).digest() == self.header.hfs_header_hash)
+
+        def check_entry(name: str, source: IReadable, entry: HFSEntry):
+            data = source.peek_at(entry.offset, entry.hashed_region_size) or b""
+            return HashCheck(name, sha256(data).digest() == entry.hash)
+
+        partition_pos = self.header.hfs_header_offset + self.hfs_header.raw_data_pos
+
+        with ThreadPoolExecutor(workers or os.cpu_count()) as executor:
+            futures = [executor.submit(check_root)]
+
+            for entry in self.hfs_header.entry_table:
+                futures.append(
+                    executor.submit(
+                        check_entry,
+                        entry.name,
+                        ReadableRegion(self, partition_pos, entry.offset + entry.size),
+                        entry,
+                    )
+                )
+
+            if deep:
+                for entry in self.hfs_header.entry_table:
+                    try:
+                        partition = self.open_hfs(entry.name)
+                    except Exception:
+                        # a partition whose header can't be parsed fails, the others are still checked
+                        futures.append(executor.submit(HashCheck, entry.name, False))
+                        continue
+
+                    for item in partition.header.entry_table:
+                        futures.append(
+                            executor.submit(
+                                check_entry,
+                                f"{entry.name}/{item.name}",
+                                ReadableRegion(
+                                    partition,
+                                    partition.header.raw_data_pos,
+                                    item.offset + item.size,
+                                ),
+                                item,
+                            )
+                        )
+
+            return [x.result() for x in futures]
+
+    def to_nsp(
+        self,
+        path: str | Path,
+        include: Callable[[str], bool] | None = None,
+        hash: bool = True,
+    ) -> list[NcaHashResult]:
+        """
+        Writes the secure partition as a standalone nsp, see `xci_to_nsp`
+        """
+        return xci_to_nsp(self, path, include, hash)
@@ -0,0 +1,604 @@
+from concurrent.futures import (
+    ALL_COMPLETED,
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+from dataclasses import asdict, dataclass, field
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+import json
+import os
+import sqlite3
+import time
+
+from .cache import MetadataCache
+from .keyring import Keyring
+from .nacp import Nacp
+from .nca.header import ContentType
+from .readers import File, MultiFile, find_split_parts, is_xci, open_split
+from .roms.nsp import Nsp
+from .roms.xci import Xci
+from .trace import Span, add_sink, emit, is_tracing, span
+
+ROM_EXTENSIONS = (".nsp", ".xci")
+
+# the first part of a split dump, the other parts are found from it
+SPLIT_EXTENSIONS = (".ns0", ".xc0")
+
+# files submitted to the pool per worker, bounds the memory of queued work
+SCAN_IN_FLIGHT_PER_JOB = 4
+
+# a jsonl catalog is rewritten when it has more stale lines than this and than live records
+JSONL_COMPACT_MIN_STALE = 1024
+
+
+@dataclass
+class ContentRecord:
+    name: str
+    content_type: str
+    size: int
+
+
+@dataclass
+class ScanRecord:
+    path: str
+    size: int
+    mtime: int = 0
+    inode: int = 0
+    title_id: str | None = None
+    name: str | None = None
+    publisher: str | None = None
+    version: str | None = None
+    contents: list[ContentRecord] = field(default_factory=list)
+    error: str | None = None
+
+    @property
+    def content_types(self) -> list[str]:
+        return sorted({x.content_type for x in self.contents})
+
+    def to_dict(self) -> dict:
+        d = asdict(self)
+        d["content_types"] = self.content_types
+        return d
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        d = dict(d)
+        d.pop("content_types", None)
+        d["contents"] = [ContentRecord(**x) for x in d.get("contents", [])]
+        return cls(**d)
+
+    def matches(self, st: "RomStat") -> bool:
+        """
+        Checks if the record was made from the file described by `st`
+        """
+        return (self.size, self.mtime, self.inode) == (
+            st.st_size,
+            st.st_mtime_ns,
+            st.st_ino,
+        )
+
+
+@dataclass
+class ScanChanges:
+    added: list[ScanRecord] = field(default_factory=list)
+    changed: list[ScanRecord] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+
+@dataclass
+class RomStat:
+    st_size: int
+    st_mtime_ns: int
+    st_ino: int
+
+
+def stat_rom(path: str) -> RomStat:
+    """
+    Stats a rom, for split dumps the size is the sum of the parts and the mtime the newest one
+    """
+    parts = find_split_parts(path) or [path]
+    stats = [os.stat(x) for x in parts]
+
+    return RomStat(
+        sum(x.st_size for x in stats),
+        max(x.st_mtime_ns for x in stats),
+        stats[0].st_ino,
+    )
+
+
+def _walk(path: str, visited: set[tuple[int, int]]) -> Iterator[tuple[str, RomStat]]:
+    # symlinked folders are followed, `visited` stops loops like `a/up -> ..`
+    try:
+        st = os.stat(path)
+    except OSError:
+        return
+
+    if (st.st_dev, st.st_ino) in visited:
+        return
+    visited.add((st.st_dev, st.st_ino))
+
+    # scandir reuses the directory listing, so only the roms are stat'ed
+    try:
+        entries = sorted(os.scandir(path), key=lambda x: x.name)
+    except OSError:
+        return
+
+    for entry in entries:
+        ext = os.path.splitext(entry.name)[1].lower()
+
+        try:
+            is_dir = entry.is_dir(follow_symlinks=True)
+        except OSError:
+            continue
+
+        if is_dir:
+            # split dumps may be a directory named like the rom with the parts inside
+            if ext not in ROM_EXTENSIONS or find_split_parts(entry.path) is None:
+                yield from _walk(entry.path, visited)
+                continue
+        elif ext not in ROM_EXTENSIONS + SPLIT_EXTENSIONS:
+            continue
+
+        try:
+            yield entry.path, stat_rom(entry.path)
+        except (OSError, ValueError):
+            # a split dump missing a part is picked up once the part shows up
+            continue
+
+
+def walk_roms(paths: Iterable[str | Path]) -> Iterator[tuple[str, RomStat]]:
+    """
+    Walks `paths` looking for nsp and xci files
+
+    Args:
+        paths (Iterable[str | Path]): Files or directories
+
+    Returns:
+        The absolute path and stat of every rom, in a stable order
+    """
+    for path in paths:
+        path = os.path.abspath(path)
+
+        if os.path.isfile(path) or (
+            os.path.splitext(path)[1].lower() in ROM_EXTENSIONS
+            and find_split_parts(path) is not None
+        ):
+            yield path, stat_rom(path)
+        else:
+            yield from _walk(path, set())
+
+
+def find_roms(paths: Iterable[str | Path]) -> Iterator[str]:
+    """
+    Walks `paths` looking for nsp and xci files
+
+    Args:
+        paths (Iterable[str | Path]): Files or directories
+
+    Returns:
+        The absolute path of every rom, in a stable order
+    """
+    for path, _ in walk_roms(paths):
+        yield path
+
+
+def open_rom(
+    file: File | MultiFile, path: str, cache: MetadataCache | None = None
+) -> Nsp:
+    if is_xci(path):
+        return Xci(file, cache).open_nsp()
+    return Nsp(file, cache=cache)
+
+
+def scan_file(path: str, cache: MetadataCache | None = None) -> ScanRecord:
+    """
+    Reads the title id, name, version and contents of a rom. Errors are stored in the record instead of raised
+
+    Args:
+        path (str): The nsp or xci, or the first part or directory of a split dump
+        cache (MetadataCache): Where parsed headers are looked up
+    """
+    try:
+        st = stat_rom(path)
+        record = ScanRecord(path, st.st_size, st.st_mtime_ns, st.st_ino)
+        file = open_split(path)
+    except (OSError, ValueError) as e:
+        record = ScanRecord(path, 0)
+        record.error = f"{type(e).__name__}: {e}"
+        return record
+
+    try:
+        with span("scan", container=path):
+            nsp = open_rom(file, path, cache)
+
+            for nca in nsp.get_ncas():
+                header = nca.header
+                record.contents.append(
+                    ContentRecord(nca.entry.name, header.content_type.name, nca.entry.size)
+                )
+
+                if header.content_type != ContentType.CONTROL or record.name:
+                    continue
+
+                nacp = cache.get_nacp(nca) if cache is not None else Nacp.from_nca(nca)
+
+                record.title_id = f"{header.program_id:016x}"
+                record.version = nacp.version
+                if nacp.titles:
+                    record.name = nacp.titles[0].name
+                    record.publisher = nacp.titles[0].publisher
+    except Exception as e:
+        record.error = f"{type(e).__name__}: {e}"
+    finally:
+        file.close()
+
+    return record
+
+
+class JsonlCatalog:
+    def __init__(self, path: str | Path):
+        """
+        A catalog with one json record per line. Records are flushed as they are written,
+        so an interrupted scan keeps everything written so far
+
+        Args:
+            path (str | Path): The output file
+        """
+        self.path = Path(path)
+
+    def load(self) -> dict[str, ScanRecord]:
+        """
+        Reads the latest record of every rom. A file with mostly replaced and removed records is compacted
+        """
+        records = {}
+        if not self.path.exists():
+            return records
+
+        lines = 0
+        with self.path.open() as f:
+            for line in f:
+                lines += 1
+                try:
+                    d = json.loads(line)
+                    if d.get("removed"):
+                        records.pop(d["path"], None)
+                        continue
+
+                    record = ScanRecord.from_dict(d)
+                except (ValueError, TypeError, KeyError):
+                    # the last line may be cut if the scan was killed
+                    continue
+                records[record.path] = record
+
+        # every update appends, so a watched library would grow the file forever
+        if lines - len(records) > max(JSONL_COMPACT_MIN_STALE, len(records)):
+            self._rewrite(records)
+
+        return records
+
+    def _append(self, d: dict):
+        if not hasattr(self, "_file"):
+            self._file = self.path.open("a")
+
+        self._file.write(json.dumps(d) + "\n")
+        self._file.flush()
+
+    def write(self, record: ScanRecord):
+        self._append(record.to_dict())
+
+    def remove(self, path: str):
+        # later lines win, so a tombstone hides the older record
+        self._append({"path": path, "removed": True})
+
+    def compact(self):
+        """
+        Rewrites the file keeping only the latest record of every rom
+        """
+        self._rewrite(self.load())
+
+    def _rewrite(self, records: dict[str, ScanRecord]):
+        self.close()
+
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        with tmp.open("w") as f:
+            for record in records.values():
+                f.write(json.dumps(record.to_dict()) + "\n")
+
+        os.replace(tmp, self.path)
+
+    def close(self):
+        if hasattr(self, "_file"):
+            self._file.close()
+            del self._file
+
+
+class SqliteCatalog:
+    def __init__(self, path: str | Path):
+        """
+        A catalog stored in a sqlite table, one row per file
+
+        Args:
+            path (str | Path): The database
+        """
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS roms (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime INTEGER,
+                inode INTEGER,
+                title_id TEXT,
+                name TEXT,
+                publisher TEXT,
+                version TEXT,
+                content_types TEXT,
+                contents TEXT,
+                error TEXT
+            )
+            """
+        )
+        self._db.commit()
+
+    def load(self) -> dict[str, ScanRecord]:
+        records = {}
+        rows = self._db.execute(
+            "SELECT path, size, mtime, inode, title_id, name, publisher, version, contents, error FROM roms"
+        )
+
+        for (
+            path,
+            size,
+            mtime,
+            inode,
+            title_id,
+            name,
+            publisher,
+            version,
+            contents,
+            error,
+        ) in rows:
+            records[path] = ScanRecord(
+                path,
+                size,
+                mtime,
+                inode,
+                title_id,
+                name,
+                publisher,
+                version,
+                [ContentRecord(**x) for x in json.loads(contents)],
+                error,
+            )
+
+        return records
+
+    def write(self, record: ScanRecord):
+        self._db.execute(
+            """
+            INSERT OR REPLACE INTO roms (
+                path, size, mtime, inode, title_id, name, publisher, version,
+                content_types, contents, error
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                record.path,
+                record.size,
+                record.mtime,
+                record.inode,
+                record.title_id,
+                record.name,
+                record.publisher,
+                record.version,
+                json.dumps(record.content_types),
+                json.dumps([asdict(x) for x in record.contents]),
+                record.error,
+            ),
+        )
+        self._db.commit()
+
+    def remove(self, path: str):
+        self._db.execute("DELETE FROM roms WHERE path = ?", (path,))
+        self._db.commit()
+
+    def compact(self):
+        self._db.execute("VACUUM")
+
+    def close(self):
+        self._db.close()
+
+
+def open_catalog(path: str | Path) -> JsonlCatalog | SqliteCatalog:
+    if os.path.splitext(path)[1].lower() in (".db", ".sqlite", ".sqlite3"):
+        return SqliteCatalog(path)
+    return JsonlCatalog(path)
+
+
+_worker_cache: MetadataCache | None = None
+
+# spans of the file being scanned, returned with its record when the parent is tracing
+_worker_spans: list[Span] | None = None
+
+
+def _init_worker(key_path: str | None, cache_path: str | None, trace: bool = False):
+    # every worker parses the keys and opens the cache once, not once per file
+    global _worker_cache, _worker_spans
+
+    Keyring.set_default(Keyring(key_path) if key_path else Keyring())
+    if cache_path is not None:
+        _worker_cache = MetadataCache(cache_path)
+
+        # pool workers skip atexit, this writes the access times of the hits when they exit
+        Finalize(_worker_cache, _worker_cache.close, exitpriority=10)
+
+    if trace:
+        _worker_spans = []
+        add_sink(_worker_spans.append)
+
+
+def _scan_in_worker(path: str) -> tuple[ScanRecord, list[Span]]:
+    record = scan_file(path, _worker_cache)
+
+    spans = []
+    if _worker_spans is not None:
+        spans = _worker_spans[:]
+        _worker_spans.clear()
+    return record, spans
+
+
+class LibraryScanner:
+    def __init__(
+        self,
+        output: str | Path | None,
+        jobs: int | None = None,
+        key_path: str | None = None,
+        cache_path: str | None = None,
+        resume: bool = True,
+    ):
+        """
+        Scans roms in a process pool and streams the records to a catalog
+
+        Args:
+            output (str | Path): The catalog, sqlite if it ends in .db/.sqlite, jsonl otherwise. None to only yield the records
+            jobs (int): The count of worker processes, defaults to the cpu count
+            key_path (str): The prod.keys file, defaults to ~/.switch/prod.keys
+            cache_path (str): A `MetadataCache` database shared by the workers
+            resume (bool): Skip files that are already in the catalog
+        """
+        self.catalog = open_catalog(output) if output is not None else None
+        self.jobs = jobs or os.cpu_count() or 1
+        self.key_path = key_path
+        self.cache_path = cache_path
+        self.resume = resume
+
+    def scan_paths(self, paths: Iterable[str]) -> Iterator[ScanRecord]:
+        """
+        Scans the given rom files and writes every record to the catalog as soon as it's ready.
+        If tracing, the spans of the workers are sent to the sinks of this process
+
+        Args:
+            paths (Iterable[str]): The roms
+
+        Returns:
+            The records, in completion order
+        """
+        max_in_flight = self.jobs * SCAN_IN_FLIGHT_PER_JOB
+
+        with ProcessPoolExecutor(
+            self.jobs,
+            initializer=_init_worker,
+            initargs=(self.key_path, self.cache_path, is_tracing()),
+        ) as executor:
+            in_flight = set()
+
+            def drain(block):
+                nonlocal in_flight
+                done, in_flight = wait(
+                    in_flight, return_when=FIRST_COMPLETED if block else ALL_COMPLETED
+                )
+                for future in done:
+                    record, spans = future.result()
+                    for x in spans:
+                        emit(x)
+
+                    if self.catalog is not None:
+                        self.catalog.write(record)
+                    yield record
+
+            for path in paths:
+                if len(in_flight) >= max_in_flight:
+                    yield from drain(True)
+
+                in_flight.add(executor.submit(_scan_in_worker, path))
+
+            yield from drain(False)
+
+    def scan(self, paths: Iterable[str | Path]) -> Iterator[ScanRecord]:
+        """
+        Walks `paths` and scans every rom that is not in the catalog yet
+
+        Args:
+            paths (Iterable[str | Path]): Files or directories
+
+        Returns:
+            The new records, in completion order
+        """
+        done = set(self.catalog.load()) if self.resume and self.catalog else set()
+        yield from self.scan_paths(x for x in find_roms(paths) if x not in done)
+
+    def update(self, paths: Iterable[str | Path]) -> ScanChanges:
+        """
+        Brings the catalog up to date with `paths`. Only new files and files whose
+        size, mtime or inode changed are parsed, records of deleted files are dropped
+
+        Args:
+            paths (Iterable[str | Path]): Files or directories
+
+        Returns:
+            What changed
+        Raises:
+            ValueError: If the scanner has no catalog
+        """
+        if self.catalog is None:
+            raise ValueError("Updating needs a catalog, the scanner has no output")
+
+        paths = [os.path.abspath(x) for x in paths]
+        known = self.catalog.load()
+        current = dict(walk_roms(paths))
+
+        changes = ScanChanges()
+        todo = [
+            path
+            for path, st in current.items()
+            if path not in known or not known[path].matches(st)
+        ]
+
+        # no pool is started when nothing changed, polls stay cheap
+        for record in self.scan_paths(todo) if todo else []:
+            if record.path in known:
+                changes.changed.append(record)
+            else:
+                changes.added.append(record)
+
+        def is_under_roots(path):
+            return any(path == x or path.startswith(x + os.sep) for x in paths)
+
+        for path in known:
+            if path not in current and is_under_roots(path):
+                self.catalog.remove(path)
+                changes.removed.append(path)
+
+        return changes
+
+    def watch(
+        self,
+        paths: Iterable[str | Path],
+        interval: float = 60.0,
+        callback: Callable[[ScanChanges], None] | None = None,
+    ):
+        """
+        Polls `paths` forever, updating the catalog every `interval` seconds.
+        A poll with no changes only lists the directories and stats the roms
+
+        Args:
+            paths (Iterable[str | Path]): Files or directories
+            interval (float): Seconds between polls
+            callback (Callable[[ScanChanges], None]): Called after every poll that changed something
+        """
+        paths = list(paths)
+        while True:
+            changes = self.update(paths)
+            if changes and callback is not None:
+                callback(changes)
+
+            time.sleep(interval)
+
+    def close(self):
+        if self.catalog is not None:
+            self.catalog.close()
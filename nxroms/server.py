@@ -0,0 +1,417 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Any, Callable
+from urllib.parse import quote, unquote, urlsplit
+import json
+import os
+import re
+import threading
+
+from .blockcache import BlockCache
+from .cache import MetadataCache
+from .fs.fs import FsType, InvalidFs
+from .fs.pfs0 import PFS0, InvalidHeader, PFSItem
+from .fs.romfs import RomFS
+from .nca.header import InvalidNCA
+from .nca.nca import Nca
+from .readers import IReadable, find_split_parts, is_xci, open_split
+from .roms.nsp import Nsp
+from .roms.xci import NotXci, Xci
+from .scanner import ROM_EXTENSIONS, SPLIT_EXTENSIONS, stat_rom
+
+# the most data held in memory per response
+SERVE_CHUNK_SIZE = 0x40000
+
+SERVE_WORKERS = 16
+SERVE_MAX_ROMS = 32
+
+# an idle keep-alive connection holds a worker, so it's dropped quickly
+SERVE_IDLE_TIMEOUT = 5
+
+RANGE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# raised when parsing a corrupt rom or something that isn't a rom
+INVALID_ROM_ERRORS = (InvalidHeader, InvalidNCA, InvalidFs, NotXci)
+
+
+class NotFound(Exception):
+    pass
+
+
+@dataclass
+class Leaf:
+    source: IReadable
+    size: int
+
+
+class OpenRom:
+    def __init__(
+        self,
+        path: str,
+        cache: MetadataCache | None = None,
+        block_cache: BlockCache | None = None,
+    ):
+        """
+        A parsed container shared by every request for it. The containers, ncas
+        and filesystems opened while resolving paths are kept, so later requests skip the parsing.
+
+        Args:
+            path (str): The nsp or xci
+            cache (MetadataCache): Where parsed headers are looked up
+            block_cache (BlockCache): Where decrypted blocks are kept
+        """
+        self.path = path
+        self.stat = stat_rom(path)
+        self.file = open_split(path)
+
+        if is_xci(path):
+            self.root = Xci(self.file, cache, block_cache)
+        else:
+            self.root = Nsp(self.file, cache=cache, block_cache=block_cache)
+
+        self.cache = cache
+        self.block_cache = block_cache
+
+        self._nodes: dict[tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def get_node(self, key: tuple[str, ...], load: Callable[[], Any]):
+        with self._lock:
+            node = self._nodes.get(key)
+        if node is not None:
+            return node
+
+        # two requests may parse the same node, the first one stored wins
+        node = load()
+        with self._lock:
+            return self._nodes.setdefault(key, node)
+
+
+def _open_nca_fs(nca: Nca, name: str) -> PFS0 | RomFS:
+    headers = nca.header.fs_headers
+
+    if name == "romfs":
+        header = next((x for x in headers if x.fs_type == FsType.ROM_FS), None)
+    elif name == "exefs":
+        header = next((x for x in headers if x.fs_type == FsType.PARTITION_FS), None)
+    elif name.startswith("fs") and name[2:].isdigit():
+        header = next((x for x in headers if x.index == int(name[2:])), None)
+    else:
+        header = None
+
+    if header is None:
+        raise NotFound(name)
+
+    if header.fs_type == FsType.ROM_FS:
+        return nca.open_romfs(header)
+    return nca.open_pfs(header)
+
+
+def _get_child(rom: OpenRom, node, name: str):
+    if isinstance(node, Xci):
+        if name not in [x.name for x in node.hfs_header.entry_table]:
+            raise NotFound(name)
+        return node.open_hfs(name)
+
+    if isinstance(node, PFS0):
+        item = next((x for x in node.get_items() if x.entry.name == name), None)
+        if item is None:
+            raise NotFound(name)
+        if name.endswith(".nca"):
+            return Nca.from_item(item, rom.cache, rom.block_cache)
+        return item
+
+    if isinstance(node, Nca):
+        return _open_nca_fs(node, name)
+
+    raise NotFound(name)
+
+
+def _list_node(node) -> list[str]:
+    if isinstance(node, Xci):
+        return [x.name for x in node.hfs_header.entry_table]
+    if isinstance(node, PFS0):
+        return [x.entry.name for x in node.get_items()]
+    if isinstance(node, RomFS):
+        return [node.get_path(x) for x in node.files]
+    if isinstance(node, Nca):
+        return [f"fs{x.index}" for x in node.header.fs_headers]
+    return []
+
+
+def walk(rom: OpenRom, parts: list[str]) -> tuple[Any, str]:
+    """
+    Walks `parts` down from the container, like `secure/<nca>/romfs/<path>`
+
+    Returns:
+        The last node reached, and the rest of the path when the walk stopped at a romfs
+    Raises:
+        NotFound: If a part doesn't exist
+    """
+    node = rom.root
+    for i, name in enumerate(parts):
+        # a romfs consumes the rest of the path
+        if isinstance(node, RomFS):
+            return node, "/".join(parts[i:])
+
+        parent = node
+        node = rom.get_node(tuple(parts[: i + 1]), lambda: _get_child(rom, parent, name))
+
+    return node, ""
+
+
+def resolve(rom: OpenRom, parts: list[str], listing: bool = False) -> Leaf | list[str]:
+    """
+    Finds what `parts` points to, see `walk`
+
+    Args:
+        rom (OpenRom): The container
+        parts (list[str]): The path inside it
+        listing (bool): List the entries of the container or nca instead of serving its data
+
+    Returns:
+        The data to serve, or the names inside a container
+    """
+    if not parts and not listing:
+        return Leaf(rom.file, rom.stat.st_size)
+
+    node, rest = walk(rom, parts)
+    if rest:
+        file = node.find_file(rest)
+        if file is None:
+            raise NotFound(rest)
+        return Leaf(node.get_file(file), file.size)
+
+    if isinstance(node, PFSItem):
+        return Leaf(node, node.entry.size)
+    if isinstance(node, Nca) and node.entry is not None and not listing:
+        # the raw nca, still encrypted
+        return Leaf(node, node.entry.size)
+
+    return _list_node(node)
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single range `Range` header
+
+    Returns:
+        The start and end, exclusive. None to serve everything
+    Raises:
+        ValueError: If the range can't be satisfied
+    """
+    match = RANGE.match(header or "")
+    if match is None:
+        # missing, multiple ranges or another unit, the whole file is sent
+        return None
+
+    start, end = match.groups()
+    if not start:
+        if not end:
+            return None
+        # the last `end` bytes
+        start, end = max(size - int(end), 0), size
+    else:
+        if end and int(end) < int(start):
+            # a last byte before the first is an invalid range, which is ignored
+            return None
+        start, end = int(start), min(int(end) + 1, size) if end else size
+
+    if start >= size:
+        raise ValueError(f"Unsatisfiable range: {header}")
+
+    return start, end
+
+
+class RomServer(HTTPServer):
+    def __init__(
+        self,
+        root: str | Path,
+        address: tuple[str, int] = ("127.0.0.1", 8000),
+        workers: int = SERVE_WORKERS,
+        max_roms: int = SERVE_MAX_ROMS,
+        cache: MetadataCache | None = None,
+        block_cache: BlockCache | None = None,
+    ):
+        """
+        Serves the contents of the roms under `root` over HTTP, decrypting on the fly.
+        Paths look like `/<rom>/secure/<nca>/romfs/<path>` for xci and `/<rom>/<nca>/romfs/<path>` for nsp.
+        The rom and its ncas are served raw, with a trailing slash they and the other containers
+        answer with a json list of their entries. Requests are handled by a thread pool.
+
+        Args:
+            root (str | Path): The directory with the roms
+            address (tuple[str, int]): Where to listen
+            workers (int): The count of threads handling requests
+            max_roms (int): How many parsed roms are kept between requests
+            cache (MetadataCache): Where parsed headers are looked up
+            block_cache (BlockCache): Where decrypted blocks are kept, so hot files skip the decryption
+        """
+        self.root = os.path.realpath(root)
+        self.max_roms = max_roms
+        self.cache = cache
+        self.block_cache = block_cache
+
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="nxroms-serve")
+        self._roms: OrderedDict[str, OpenRom] = OrderedDict()
+        self._lock = threading.Lock()
+
+        super().__init__(address, RomRequestHandler)
+
+    def process_request(self, request, client_address):
+        self._executor.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self._executor.shutdown(wait=True)
+
+    def get_rom(self, path: str) -> OpenRom:
+        with self._lock:
+            rom = self._roms.get(path)
+            if rom is not None:
+                self._roms.move_to_end(path)
+
+        # a rom that changed on disk is parsed again
+        if rom is not None and stat_rom(path) == rom.stat:
+            return rom
+
+        rom = OpenRom(path, self.cache, self.block_cache)
+        with self._lock:
+            self._roms[path] = rom
+            self._roms.move_to_end(path)
+
+            # evicted roms are closed by the gc once the requests using them finish
+            while len(self._roms) > self.max_roms:
+                self._roms.popitem(last=False)
+
+        return rom
+
+    def split_path(self, url_path: str) -> tuple[str, list[str]]:
+        """
+        Splits a request path into the rom on disk and the path inside it
+
+        Raises:
+            NotFound: If no rom is found in the path
+        """
+        parts = [x for x in unquote(url_path).split("/") if x not in ("", ".")]
+        if ".." in parts:
+            raise NotFound(url_path)
+
+        for i in range(1, len(parts) + 1):
+            path = os.path.join(self.root, *parts[:i])
+            ext = os.path.splitext(path)[1].lower()
+
+            if os.path.isfile(path) and ext in ROM_EXTENSIONS + SPLIT_EXTENSIONS:
+                return path, parts[i:]
+            if (
+                os.path.isdir(path)
+                and ext in ROM_EXTENSIONS
+                and find_split_parts(path) is not None
+            ):
+                return path, parts[i:]
+
+        raise NotFound(url_path)
+
+
+class RomRequestHandler(BaseHTTPRequestHandler):
+    server: RomServer
+    protocol_version = "HTTP/1.1"
+
+    timeout = SERVE_IDLE_TIMEOUT
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body: bool):
+        try:
+            url_path = urlsplit(self.path).path
+            path, parts = self.server.split_path(url_path)
+            result = resolve(self.server.get_rom(path), parts, url_path.endswith("/"))
+        except (NotFound, FileNotFoundError):
+            self.send_error(404)
+            return
+        except INVALID_ROM_ERRORS as e:
+            self.send_error(422, explain=str(e))
+            return
+        except Exception as e:
+            # missing keys show up as an IndexError or KeyError when looking up the key generation,
+            # anything else still gets a response instead of a dropped connection
+            self.log_error("%s: %s", type(e).__name__, e)
+            self.send_error(500, explain=str(e))
+            return
+
+        if isinstance(result, list):
+            body = json.dumps([quote(x) for x in result]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if send_body:
+                self.wfile.write(body)
+            return
+
+        try:
+            byte_range = parse_range(self.headers.get("Range"), result.size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{result.size}")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        start, end = byte_range or (0, result.size)
+        if byte_range is None:
+            self.send_response(200)
+        else:
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{result.size}")
+
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+
+        if not send_body:
+            return
+
+        # streamed in bounded chunks, nothing is materialised
+        while start < end:
+            data = result.source.peek_at(start, min(SERVE_CHUNK_SIZE, end - start))
+            if not data:
+                break
+            self.wfile.write(data)
+            start += len(data)
+
+
+def serve(
+    root: str | Path,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    workers: int = SERVE_WORKERS,
+    cache: MetadataCache | None = None,
+    block_cache: BlockCache | None = None,
+):
+    """
+    Serves the roms under `root` until interrupted
+    """
+    server = RomServer(root, (host, port), workers, cache=cache, block_cache=block_cache)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
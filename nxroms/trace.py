@@ -0,0 +1,225 @@
+from dataclasses import dataclass, field
+from functools import wraps
+from pathlib import Path
+from time import perf_counter_ns
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger("nxroms.trace")
+
+
+@dataclass
+class Span:
+    name: str
+
+    # the rom the span belongs to, inherited from the enclosing span
+    container: str | None
+
+    # perf_counter_ns at the start, and the duration in nanoseconds
+    start: int
+    duration: int = 0
+
+    # how many spans enclose it
+    depth: int = 0
+    thread: int = 0
+    args: dict = field(default_factory=dict)
+
+    # spans of pool workers are sent back to the parent, this keeps where they ran
+    process: int = field(default_factory=os.getpid)
+
+
+class _NoSpan:
+    # given out when there is no sink, so a span costs a function call
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *args):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+_sinks: list = []
+_sinks_lock = threading.Lock()
+_local = threading.local()
+
+
+class _ActiveSpan:
+    __slots__ = ("span",)
+
+    def __init__(self, name: str, container: str | None, args: dict):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+
+        if container is None and stack:
+            container = stack[-1].container
+
+        self.span = Span(name, container, 0, 0, len(stack), threading.get_ident(), args)
+
+    def __enter__(self) -> Span:
+        _local.stack.append(self.span)
+        self.span.start = perf_counter_ns()
+        return self.span
+
+    def __exit__(self, *args):
+        self.span.duration = perf_counter_ns() - self.span.start
+        _local.stack.pop()
+
+        for sink in _sinks:
+            sink(self.span)
+        return False
+
+
+def span(name: str, container: str | None = None, **args):
+    """
+    Times a phase, for use in a `with` block. Spans nest, an inner span
+    belongs to the container of the one around it unless given its own.
+    With no sink added nothing is timed
+
+    Args:
+        name (str): The phase, like `nca.header.decrypt`
+        container (str): The rom being parsed
+        args: Extra values given to the sinks
+    """
+    if not _sinks:
+        return _NO_SPAN
+    return _ActiveSpan(name, container, args)
+
+
+def traced(name: str):
+    """
+    Decorator version of `span`, the whole call is one span
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _sinks:
+                return func(*args, **kwargs)
+
+            with _ActiveSpan(name, None, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def is_tracing() -> bool:
+    return bool(_sinks)
+
+
+def emit(span: Span):
+    """
+    Sends a finished span to the sinks, for spans recorded somewhere else like a worker process
+    """
+    for sink in _sinks:
+        sink(span)
+
+
+def add_sink(sink):
+    """
+    Sends every finished span to `sink`, any callable that takes a `Span`.
+    Sinks are called on the thread that ran the span
+    """
+    global _sinks
+    with _sinks_lock:
+        # replaced instead of appended, so spans finishing meanwhile iterate a stable list
+        _sinks = [*_sinks, sink]
+
+
+def remove_sink(sink):
+    global _sinks
+    with _sinks_lock:
+        _sinks = [x for x in _sinks if x is not sink]
+
+
+class tracing:
+    def __init__(self, sink):
+        """
+        Adds `sink` for the duration of a `with` block, closing it afterwards if it can be
+
+            with tracing(ChromeTraceSink("trace.json")):
+                scan_file(path)
+        """
+        self.sink = sink
+
+    def __enter__(self):
+        add_sink(self.sink)
+        return self.sink
+
+    def __exit__(self, *args):
+        remove_sink(self.sink)
+
+        close = getattr(self.sink, "close", None)
+        if close is not None:
+            close()
+
+
+class ChromeTraceSink:
+    def __init__(self, path: str | Path):
+        """
+        Collects the spans and writes them in the Chrome trace event format on `close`,
+        they can be opened with `chrome://tracing` or Perfetto. The container is the category
+
+        Args:
+            path (str | Path): The JSON file
+        """
+        self.path = Path(path)
+        self.events: list[dict] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span: Span):
+        event = {
+            "name": span.name,
+            "cat": span.container or "",
+            "ph": "X",
+            "ts": span.start / 1000,
+            "dur": span.duration / 1000,
+            "pid": span.process,
+            "tid": span.thread,
+        }
+        if span.args:
+            event["args"] = {k: str(v) for k, v in span.args.items()}
+
+        with self._lock:
+            self.events.append(event)
+
+    def close(self):
+        with self._lock:
+            events = sorted(self.events, key=lambda x: x["ts"])
+
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+        os.replace(tmp, self.path)
+
+
+class LoggingSink:
+    def __init__(self, log: logging.Logger = logger, level: int = logging.DEBUG):
+        """
+        Logs every span with its duration, indented by depth
+
+        Args:
+            log (logging.Logger): Where to log, `nxroms.trace` by default
+            level (int): The level of the records
+        """
+        self.log = log
+        self.level = level
+
+    def __call__(self, span: Span):
+        if not self.log.isEnabledFor(self.level):
+            return
+
+        args = " ".join(f"{k}={v}" for k, v in span.args.items())
+        self.log.log(
+            self.level,
+            "%s%s %.3fms [%s] %s",
+            "  " * span.depth,
+            span.name,
+            span.duration / 1e6,
+            span.container or "",
+            args,
+        )
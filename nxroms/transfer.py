@@ -0,0 +1,108 @@
+from io import UnsupportedOperation
+from typing import BinaryIO
+import os
+
+from .hashes import HashFeeder
+from .readers import File, IReadable, resolve_offset
+
+# large copies keep the disk streaming
+COPY_CHUNK_SIZE = 0x800000
+
+
+def _get_fileno(file) -> int | None:
+    try:
+        return file.fileno()
+    except (AttributeError, UnsupportedOperation):
+        return None
+
+
+def _copy_file_range(source: IReadable, out: BinaryIO, offset: int, size: int) -> int | None:
+    # only plain files can be copied by the kernel, anything encrypted or in memory goes through python
+    if not hasattr(os, "copy_file_range"):
+        return None
+
+    resolved = resolve_offset(source)
+    out_fd = _get_fileno(out)
+    if resolved is None or not isinstance(resolved[0], File) or out_fd is None:
+        return None
+
+    root, start = resolved
+    out.flush()
+    out_pos = out.tell()
+
+    done = 0
+    try:
+        while done < size:
+            copied = os.copy_file_range(
+                root.fileno(),
+                out_fd,
+                min(size - done, COPY_CHUNK_SIZE * 8),
+                start + offset + done,
+                out_pos + done,
+            )
+            if copied == 0:
+                break
+            done += copied
+    except OSError:
+        # not supported between these files, nothing was copied yet so python takes over
+        if done == 0:
+            return None
+        raise
+
+    out.seek(out_pos + done)
+    return done
+
+
+def copy_region(
+    source: IReadable,
+    out: BinaryIO,
+    offset: int,
+    size: int,
+    hashers: list | None = None,
+    chunk_size: int = COPY_CHUNK_SIZE,
+) -> int:
+    """
+    Copies `size` bytes of `source` into `out`, at its current position. Without hashers
+    plain file data is copied with `copy_file_range`, otherwise large reads go through the hashers
+    in the same pass.
+
+    Args:
+        source (IReadable): The data
+        out (BinaryIO): The output
+        offset (int): Where to start in `source`
+        size (int): How much to copy
+        hashers (list): Updated with the copied data
+        chunk_size (int): The size of every read
+
+    Returns:
+        The copied size
+    Raises:
+        EOFError: If `source` ends before `size` bytes
+    """
+    if not hashers:
+        done = _copy_file_range(source, out, offset, size)
+        if done is not None:
+            if done < size:
+                raise EOFError(f"expected {size} bytes, got {done}")
+            return done
+
+    feeder = HashFeeder(hashers, size) if hashers else None
+    done = 0
+    try:
+        while done < size:
+            data = source.peek_at(offset + done, min(chunk_size, size - done))
+            if not data:
+                break
+
+            out.write(data)
+            if feeder is not None:
+                feeder.update(data)
+            done += len(data)
+    finally:
+        if feeder is not None:
+            feeder.close()
+
+    if done < size:
+        raise EOFError(f"expected {size} bytes, got {done}")
+
+    return done
@@ -4,3 +4,31 @@ def is_all_zero(_bytes: bytes):
 
 def media_to_bytes(media):
     return media * 0x200
+
+
+def align_up(value: int, align: int) -> int:
+    return (value + align - 1) // align * align
+
+
+class Bitmap:
+    def __init__(self, size: int):
+        """
+        A fixed size set of integers stored as one bit each
+
+        Args:
+            size (int): The count of bits
+        """
+        self.size = size
+        self.data = bytearray(-(-size // 8))
+
+    def __contains__(self, index: int) -> bool:
+        return bool(self.data[index >> 3] & (1 << (index & 7)))
+
+    def add(self, index: int):
+        self.data[index >> 3] |= 1 << (index & 7)
+
+    def discard(self, index: int):
+        self.data[index >> 3] &= ~(1 << (index & 7)) & 0xFF
+
+    def count(self) -> int:
+        return sum(x.bit_count() for x in self.data)
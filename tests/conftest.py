@@ -0,0 +1,65 @@
+import shutil
+from pathlib import Path
+
+import pytest
+
+from benchmarks.fixtures import (
+    FixtureSpec,
+    build_nsp_entries,
+    build_pfs0,
+    build_xci,
+    install_keys,
+)
+from nxroms.server import RomRequestHandler, RomServer
+from tests.helpers import serve_files, serving
+
+# small roms, every test parses them many times
+SPEC = FixtureSpec(file_count=6, file_size=0x3000, romfs_depth=2)
+
+
+@pytest.fixture(scope="session", autouse=True)
+def keys(tmp_path_factory) -> Path:
+    path = tmp_path_factory.mktemp("keys") / "test.keys"
+    install_keys(path)
+    return path
+
+
+@pytest.fixture(scope="session")
+def entries() -> list[tuple[str, bytes]]:
+    return build_nsp_entries(SPEC)
+
+
+@pytest.fixture(scope="session")
+def rom_dir(tmp_path_factory, entries) -> Path:
+    path = tmp_path_factory.mktemp("roms")
+    (path / "game.nsp").write_bytes(build_pfs0(entries))
+    (path / "game.xci").write_bytes(build_xci(entries))
+    return path
+
+
+@pytest.fixture
+def nsp_path(rom_dir, tmp_path) -> Path:
+    # a copy, so tests can modify it
+    return Path(shutil.copy(rom_dir / "game.nsp", tmp_path / "game.nsp"))
+
+
+@pytest.fixture
+def xci_path(rom_dir, tmp_path) -> Path:
+    return Path(shutil.copy(rom_dir / "game.xci", tmp_path / "game.xci"))
+
+
+@pytest.fixture(autouse=True)
+def quiet_server(monkeypatch):
+    monkeypatch.setattr(RomRequestHandler, "log_message", lambda *args: None)
+
+
+@pytest.fixture
+def file_server(rom_dir):
+    with serve_files(rom_dir) as url:
+        yield url
+
+
+@pytest.fixture
+def rom_server(rom_dir):
+    with serving(RomServer(rom_dir, ("127.0.0.1", 0))) as url:
+        yield url
@@ -0,0 +1,100 @@
+import re
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from pathlib import Path
+
+from nxroms.fs.fs import FsType
+from nxroms.nca.nca import Nca
+from nxroms.readers import File, MemoryRegion
+from nxroms.roms.nsp import Nsp
+
+
+def get_program_romfs(nsp: Nsp):
+    for nca in nsp.get_ncas():
+        if nca.header.content_type.name != "PROGRAM":
+            continue
+        for header in nca.header.fs_headers:
+            if header.fs_type == FsType.ROM_FS:
+                return nca, header
+    raise ValueError("No program romfs")
+
+
+def romfs_data_offset(path: str | Path) -> int:
+    """
+    Gets where the romfs data of the program nca starts in an nsp
+    """
+    file = File(str(path))
+    try:
+        nsp = Nsp(file)
+        nca, header = get_program_romfs(nsp)
+        fs_offset = header.hash_data.info_level_hash.levels[-1].logical_offset
+        entry = nca.get_entry_for_header(header)
+        item_offset = nsp.header.raw_data_pos + nca.source.entry.offset
+        return item_offset + entry.start_offset + fs_offset
+    finally:
+        file.close()
+
+
+def flip_byte(path: str | Path, offset: int):
+    # ctr is a stream cipher, a flipped encrypted bit flips the same decrypted bit
+    with open(path, "r+b") as f:
+        f.seek(offset)
+        value = f.read(1)[0]
+        f.seek(offset)
+        f.write(bytes([value ^ 1]))
+
+
+def open_nca(data: bytes) -> Nca:
+    return Nca(MemoryRegion(data))
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    # serves the files under `server.root` with single byte ranges, like a plain web server
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.server.root / self.path.lstrip("/")
+        if not path.is_file():
+            self.send_error(404)
+            return
+
+        data = path.read_bytes()
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match is None:
+            self.send_response(200)
+        else:
+            start = int(match.group(1))
+            end = min(int(match.group(2) or len(data) - 1) + 1, len(data))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{len(data)}")
+            data = data[start:end]
+
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serving(server: HTTPServer):
+    """
+    Runs `server` on a thread, gives its base url
+    """
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def serve_files(root: Path, handler: type[BaseHTTPRequestHandler] = RangeHandler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.root = root
+    return serving(server)
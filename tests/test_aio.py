@@ -0,0 +1,56 @@
+import asyncio
+
+from nxroms.aio import AsyncNsp, AsyncRunner
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from tests.helpers import get_program_romfs
+
+
+def test_async_romfs_matches_sync_reads(rom_dir):
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        nca, header = get_program_romfs(Nsp(file))
+        romfs = nca.open_romfs(header)
+        expected = [romfs.get_file(x).peek_at(0, x.size) for x in romfs.files]
+    finally:
+        file.close()
+
+    async def read_all():
+        runner = AsyncRunner(max_workers=4, max_pending=2)
+        try:
+            async with await AsyncNsp.open(rom_dir / "game.xci", runner=runner) as nsp:
+                ncas = await nsp.get_ncas()
+                program = next(x for x in ncas if x.header.content_type.name == "PROGRAM")
+                romfs = await program.open_romfs()
+
+                async def read(x):
+                    return b"".join([c async for c in romfs.stream_file(x, chunk_size=0x1000)])
+
+                return await asyncio.gather(*(read(x) for x in romfs.files))
+        finally:
+            runner.close()
+
+    assert asyncio.run(read_all()) == expected
+
+
+def test_async_verify(rom_dir):
+    async def verify():
+        async with await AsyncNsp.open(rom_dir / "game.nsp") as nsp:
+            return await nsp.verify_ncas(workers=2)
+
+    assert all(x.valid for x in asyncio.run(verify()))
+
+
+def test_runner_drops_closed_loops():
+    runner = AsyncRunner(max_workers=1, max_pending=1)
+
+    async def contend():
+        # the second call waits on the semaphore, which then references the loop
+        await asyncio.gather(runner.run(sum, [1]), runner.run(sum, [2]))
+
+    try:
+        for _ in range(4):
+            asyncio.run(contend())
+        assert len(runner._slots) == 1
+    finally:
+        runner.close()
@@ -0,0 +1,30 @@
+from benchmarks.run import BenchResult, find_regressions, main
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+
+
+def test_fixtures_are_valid(rom_dir):
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        assert all(x.valid for x in Nsp(file).verify_ncas())
+    finally:
+        file.close()
+
+
+def test_run(tmp_path, capsys):
+    argv = ["--file-count", "4", "--file-size", "0x1000", "--depth", "1", "--roms", "1"]
+    results = tmp_path / "results.jsonl"
+    assert main([*argv, "--repeat", "1", "--only", "header_parse", "--results", str(results)]) == 0
+    assert "header_parse" in capsys.readouterr().out
+    assert len(results.read_text().splitlines()) == 1
+
+
+def test_find_regressions():
+    history = [{"results": {"scan": {"seconds": x}}} for x in (1.0, 1.1, 0.9, 5.0, 1.0)]
+
+    assert find_regressions([BenchResult("scan", 1.1)], history, 0.2, 5) == []
+    assert find_regressions([BenchResult("scan", 1.3)], history, 0.2, 5) == [("scan", 1.0, 1.3)]
+
+    # only the last runs count
+    assert find_regressions([BenchResult("scan", 1.3)], history, 0.2, 2) == []
+    assert find_regressions([BenchResult("new", 9.0)], history, 0.2, 5) == []
@@ -0,0 +1,52 @@
+from nxroms.blockcache import BlockCache
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from tests.helpers import get_program_romfs
+
+
+def _read_romfs(path, block_cache=None) -> list[bytes]:
+    file = File(str(path))
+    try:
+        nca, header = get_program_romfs(Nsp(file, block_cache=block_cache))
+        romfs = nca.open_romfs(header)
+        return [romfs.get_file(x).peek_at(0, x.size) for x in romfs.files]
+    finally:
+        file.close()
+
+
+def test_cached_reads_match(rom_dir, tmp_path):
+    expected = _read_romfs(rom_dir / "game.nsp")
+
+    cache = BlockCache(tmp_path / "blocks", block_size=0x1000)
+    try:
+        assert _read_romfs(rom_dir / "game.nsp", cache) == expected
+        assert cache.size > 0
+        assert _read_romfs(rom_dir / "game.nsp", cache) == expected
+    finally:
+        cache.close()
+
+    # the blocks stay on disk for the next run
+    cache = BlockCache(tmp_path / "blocks", block_size=0x1000)
+    try:
+        size = cache.size
+        assert size > 0
+        assert _read_romfs(rom_dir / "game.nsp", cache) == expected
+        assert cache.size == size
+    finally:
+        cache.close()
+
+
+def test_size_stays_under_the_cap(rom_dir, tmp_path):
+    expected = _read_romfs(rom_dir / "game.nsp")
+
+    # the romfs alone is bigger than the cache
+    cache = BlockCache(tmp_path / "blocks", max_size=0x8000, block_size=0x1000)
+    try:
+        for _ in range(2):
+            assert _read_romfs(rom_dir / "game.nsp", cache) == expected
+            assert 0 < cache.size <= 0x8000
+    finally:
+        cache.close()
+
+    stored = sum(x.stat().st_blocks * 512 for x in (tmp_path / "blocks").glob("*.data"))
+    assert stored <= 0x8000 + 0x1000
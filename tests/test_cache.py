@@ -0,0 +1,156 @@
+import os
+import time
+
+import pytest
+
+from nxroms.cache import FileIdentity, MetadataCache
+from nxroms.crypto import Crypto
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from nxroms.roms.xci import Xci
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = MetadataCache(tmp_path / "cache.sqlite")
+    yield cache
+    cache.close()
+
+
+def _count_xts(monkeypatch) -> list[int]:
+    calls = [0]
+    decrypt = Crypto.aes_xts_decrypt
+
+    def counting(*args, **kwargs):
+        calls[0] += 1
+        return decrypt(*args, **kwargs)
+
+    monkeypatch.setattr(Crypto, "aes_xts_decrypt", staticmethod(counting))
+    return calls
+
+
+def _parse(path, cache) -> list[tuple]:
+    file = File(str(path))
+    try:
+        if path.suffix == ".xci":
+            nsp = Xci(file, cache).open_nsp()
+        else:
+            nsp = Nsp(file, cache=cache)
+
+        return [
+            (x.entry.name, x.header.content_type, x.header.program_id, len(x.header.fs_headers))
+            for x in nsp.get_ncas()
+        ]
+    finally:
+        file.close()
+
+
+@pytest.mark.parametrize("name", ["game.nsp", "game.xci"])
+def test_hits_skip_decryption(rom_dir, cache, monkeypatch, name):
+    calls = _count_xts(monkeypatch)
+
+    first = _parse(rom_dir / name, cache)
+    decrypted = calls[0]
+    assert decrypted > 0
+
+    assert _parse(rom_dir / name, cache) == first
+    assert calls[0] == decrypted
+
+
+def test_changed_file_is_parsed_again(nsp_path, cache, monkeypatch):
+    _parse(nsp_path, cache)
+
+    # same size, new mtime
+    st = os.stat(nsp_path)
+    os.utime(nsp_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+
+    calls = _count_xts(monkeypatch)
+    _parse(nsp_path, cache)
+    assert calls[0] > 0
+
+
+def test_key_areas_are_not_stored(tmp_path, nsp_path, cache):
+    _parse(nsp_path, cache)
+
+    file = File(str(nsp_path))
+    try:
+        key_areas = [
+            x.header.key_area.peek_at(0, 0x40)
+            for x in Nsp(file).get_ncas()
+            if x.header.key_area is not None
+        ]
+    finally:
+        file.close()
+
+    assert key_areas
+    blobs = b"".join(x for (x,) in cache._db.execute("SELECT data FROM entries"))
+    assert not any(x in blobs for x in key_areas)
+
+    assert (tmp_path / "cache.sqlite").stat().st_mode & 0o777 == 0o600
+
+
+def test_nacp_is_cached(rom_dir, cache):
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        control = next(
+            x for x in Nsp(file, cache=cache).get_ncas() if x.header.content_type.name == "CONTROL"
+        )
+        assert cache.get_nacp(control).titles[0].name == "Test Game"
+        assert cache.get_nacp(control).titles[0].name == "Test Game"
+    finally:
+        file.close()
+
+
+def test_eviction_keeps_the_size(tmp_path):
+    cache = MetadataCache(tmp_path / "cache.sqlite", max_size=0x1000)
+    identity = FileIdentity("/rom", 1, 1)
+    try:
+        for offset in range(16):
+            cache.put(identity, offset, "blob", bytes(0x200))
+
+        assert cache.size <= 0x1000
+        assert cache.get(identity, 15, "blob") == bytes(0x200)
+        assert cache.get(identity, 0, "blob") is None
+    finally:
+        cache.close()
+
+
+def test_size_is_shared_between_processes(tmp_path):
+    # two connections stand in for two scanner workers
+    first = MetadataCache(tmp_path / "cache.sqlite", max_size=0x1000)
+    second = MetadataCache(tmp_path / "cache.sqlite", max_size=0x1000)
+    try:
+        for offset in range(8):
+            first.put(FileIdentity("/first", 1, 1), offset, "blob", bytes(0x200))
+            second.put(FileIdentity("/second", 1, 1), offset, "blob", bytes(0x200))
+
+        stored = first._db.execute("SELECT SUM(LENGTH(data)) FROM entries").fetchone()[0]
+        assert first.size == second.size == stored <= 0x1000
+    finally:
+        first.close()
+        second.close()
+
+
+def test_hits_dont_write(tmp_path, monkeypatch):
+    path = tmp_path / "cache.sqlite"
+    identity = FileIdentity("/rom", 1, 1)
+
+    cache = MetadataCache(path)
+    cache.put(identity, 0, "blob", b"data")
+
+    # an old entry gets its access time refreshed, but not until the cache flushes
+    monkeypatch.setattr(time, "time", lambda: 10**10)
+    assert cache.get(identity, 0, "blob") == b"data"
+    assert not cache._db.in_transaction
+
+    def accessed():
+        return cache._db.execute("SELECT accessed FROM entries").fetchone()[0]
+
+    assert accessed() < 10**10
+    cache.close()
+
+    cache = MetadataCache(path)
+    try:
+        assert accessed() == 10**10
+    finally:
+        cache.close()
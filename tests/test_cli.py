@@ -0,0 +1,136 @@
+import json
+
+import pytest
+
+from nxroms.cli import EXIT_FAILED, EXIT_KEYS, EXIT_OK, EXIT_USAGE, Progress, main
+from tests.helpers import flip_byte, romfs_data_offset
+
+
+@pytest.fixture
+def run(keys, capsys):
+    def run(*argv: str) -> tuple[int, str, str]:
+        code = main(["--keys", str(keys), "-q", *argv])
+        out, err = capsys.readouterr()
+        return code, out, err
+
+    return run
+
+
+def test_info(run, rom_dir):
+    code, out, _ = run("info", "--json", str(rom_dir / "game.nsp"), str(rom_dir / "game.xci"))
+    assert code == EXIT_OK
+    records = json.loads(out)
+    assert len(records) == 2
+    assert all(x["title_id"] == "0100000000001000" for x in records)
+
+
+def test_verify(run, rom_dir, nsp_path):
+    assert run("verify", str(rom_dir / "game.nsp"), str(rom_dir / "game.xci"))[0] == EXIT_OK
+
+    flip_byte(nsp_path, romfs_data_offset(nsp_path) + 0x10)
+    code, out, _ = run("verify", str(nsp_path))
+    assert code == EXIT_FAILED
+    assert out.startswith("BAD")
+
+
+def test_ls_and_extract(run, rom_dir, tmp_path):
+    code, out, _ = run("ls", str(rom_dir / "game.xci"), "secure")
+    assert code == EXIT_OK
+    names = [x.split()[-1] for x in out.splitlines()]
+    assert "ticket.tik" in names
+
+    code, _, _ = run("extract", str(rom_dir / "game.xci"), "secure/ticket.tik", "-o", str(tmp_path))
+    assert code == EXIT_OK
+    assert (tmp_path / "ticket.tik").read_bytes() == bytes(0x2C0)
+
+    code, _, err = run("ls", str(rom_dir / "game.nsp"), "missing.nca")
+    assert code == EXIT_FAILED
+    assert err.startswith("nxroms: not found")
+
+
+def test_convert_and_scan(run, rom_dir, tmp_path):
+    out = tmp_path / "game.nsp"
+    assert run("convert", str(rom_dir / "game.xci"), "-o", str(out))[0] == EXIT_OK
+    assert run("verify", str(out))[0] == EXIT_OK
+
+    code, out, _ = run("scan", "--jsonl", str(tmp_path))
+    assert code == EXIT_OK
+    assert json.loads(out)["name"] == "Test Game"
+
+
+def test_convert_rejects_outputs_with_the_same_name(run, rom_dir, tmp_path):
+    (tmp_path / "other").mkdir()
+    other = tmp_path / "other" / "game.xci"
+    other.write_bytes((rom_dir / "game.xci").read_bytes())
+
+    code, _, err = run("convert", str(rom_dir / "game.xci"), str(other), "-o", str(tmp_path / "out"))
+    assert code == EXIT_USAGE
+    assert "would both be written" in err
+    assert not (tmp_path / "out").exists()
+
+
+def test_scan_progress_counts_changed_roms(run, rom_dir, tmp_path, monkeypatch):
+    progress = []
+
+    class RecordingProgress(Progress):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            progress.append(self)
+
+    monkeypatch.setattr("nxroms.cli.Progress", RecordingProgress)
+    catalog = str(tmp_path / "catalog.jsonl")
+
+    assert run("scan", "--catalog", catalog, str(rom_dir))[0] == EXIT_OK
+    assert (progress[-1].total, progress[-1].done) == (2, 2)
+
+    # nothing changed, so nothing is left to do
+    assert run("scan", "--catalog", catalog, str(rom_dir))[0] == EXIT_OK
+    assert (progress[-1].total, progress[-1].done) == (0, 0)
+
+
+@pytest.mark.parametrize("command", [["ls"], ["extract", "-o", "out"]])
+def test_junk_rom_is_a_one_line_error(run, tmp_path, command):
+    path = tmp_path / "junk.nsp"
+    path.write_bytes(b"junk" * 0x100)
+
+    code, _, err = run(*command, str(path))
+    assert code == EXIT_FAILED
+    assert err.startswith("nxroms: invalid rom")
+    assert len(err.splitlines()) == 1
+
+
+def test_extract_reports_failed_files(run, nsp_path, tmp_path, entries):
+    with open(nsp_path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 0x100)
+
+    code, out, err = run("extract", "--jsonl", str(nsp_path), "-o", str(tmp_path / "out"))
+    assert code == EXIT_FAILED
+    assert not err
+
+    records = [json.loads(x) for x in out.splitlines()]
+    failed = [x for x in records if "error" in x]
+    assert len(failed) == 1
+    assert failed[0]["error"].startswith("EOFError")
+    assert len(records) == len(entries)
+
+
+def test_ls_reports_unreadable_containers(run, rom_dir, monkeypatch):
+    def fail(*args):
+        raise EOFError("truncated")
+
+    monkeypatch.setattr("nxroms.cli._node_entries", fail)
+    code, out, err = run("ls", str(rom_dir / "game.xci"), "secure")
+    assert code == EXIT_FAILED
+    assert out.strip().endswith("EOFError: truncated")
+    assert not err
+
+
+def test_missing_keys(rom_dir, tmp_path, capsys):
+    assert main(["--keys", str(tmp_path / "missing.keys"), "info", str(rom_dir)]) == EXIT_KEYS
+    assert capsys.readouterr().err.startswith("nxroms:")
+
+
+def test_usage_error(capsys):
+    with pytest.raises(SystemExit) as e:
+        main(["frobnicate"])
+    assert e.value.code == EXIT_USAGE
@@ -0,0 +1,41 @@
+from nxroms.cnmt import CnmtContentType, ContentMetaType
+from nxroms.index import ContentIndex
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+
+
+def test_cnmt_lists_the_ncas(rom_dir):
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        nsp = Nsp(file)
+        (cnmt,) = nsp.get_cnmts()
+        names = {x.entry.name for x in nsp.get_items()}
+
+        assert cnmt.title_id == 0x0100000000001000
+        assert cnmt.meta_type == ContentMetaType.APPLICATION
+        assert [x.content_type for x in cnmt.contents] == [
+            CnmtContentType.PROGRAM,
+            CnmtContentType.CONTROL,
+        ]
+        assert all(x.nca_name in names for x in cnmt.contents)
+    finally:
+        file.close()
+
+
+def test_content_index(rom_dir, tmp_path):
+    index = ContentIndex()
+    assert index.add_roms([rom_dir]) == {}
+
+    program = index.find(0x0100000000001000, CnmtContentType.PROGRAM)
+    assert len(program) == 1
+    assert program[0].offset is not None
+
+    location = index.get(program[0].content_id)
+    with open(location.path, "rb") as f:
+        f.seek(location.offset)
+        data = f.read(location.size)
+    assert len(data) == location.size
+
+    index.save(tmp_path / "index.json")
+    loaded = ContentIndex.load(tmp_path / "index.json")
+    assert loaded.find("0100000000001000") == index.find("0100000000001000")
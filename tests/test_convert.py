@@ -0,0 +1,73 @@
+from hashlib import sha256
+
+from nxroms.fs.pfs0 import PFSBuilder
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from nxroms.roms.xci import Xci
+
+
+def _read_entries(path) -> dict[str, bytes]:
+    file = File(str(path))
+    try:
+        # an empty entry reads as None
+        return {x.entry.name: x.peek_at(0, x.entry.size) or b"" for x in Nsp(file).get_items()}
+    finally:
+        file.close()
+
+
+def test_xci_to_nsp(rom_dir, tmp_path, entries):
+    file = File(str(rom_dir / "game.xci"))
+    try:
+        results = Xci(file).to_nsp(tmp_path / "out.nsp")
+    finally:
+        file.close()
+
+    assert len(results) == 3
+    assert all(x.valid for x in results)
+    assert _read_entries(tmp_path / "out.nsp") == dict(entries)
+    assert not (tmp_path / "out.nsp.tmp").exists()
+
+
+def test_xci_to_nsp_filter(rom_dir, tmp_path):
+    file = File(str(rom_dir / "game.xci"))
+    try:
+        Xci(file).to_nsp(tmp_path / "out.nsp", include=lambda x: x.endswith(".nca"), hash=False)
+    finally:
+        file.close()
+
+    assert "ticket.tik" not in _read_entries(tmp_path / "out.nsp")
+
+
+def test_repack(rom_dir, tmp_path, entries):
+    (tmp_path / "extra.bin").write_bytes(b"extra" * 100)
+
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        Nsp(file).repack(
+            tmp_path / "out.nsp",
+            add={"extra.bin": tmp_path / "extra.bin", "ticket.tik": tmp_path / "extra.bin"},
+            remove=[entries[1][0]],
+        )
+    finally:
+        file.close()
+
+    expected = dict(entries)
+    del expected[entries[1][0]]
+    expected["ticket.tik"] = expected["extra.bin"] = b"extra" * 100
+
+    written = _read_entries(tmp_path / "out.nsp")
+    assert written == expected
+    assert list(written)[-2:] == ["extra.bin", "ticket.tik"]
+
+
+def test_builder_digests(tmp_path):
+    (tmp_path / "a").write_bytes(b"a" * 10)
+    (tmp_path / "b").write_bytes(b"")
+
+    builder = PFSBuilder()
+    builder.add("a", tmp_path / "a")
+    builder.add("b", tmp_path / "b")
+    digests = builder.write(tmp_path / "out.pfs0", hash=True)
+
+    assert digests == {"a": sha256(b"a" * 10).digest(), "b": sha256().digest()}
+    assert _read_entries(tmp_path / "out.pfs0") == {"a": b"a" * 10, "b": b""}
@@ -0,0 +1,36 @@
+import pytest
+
+from nxroms.dedup import DedupIndex
+
+
+@pytest.fixture
+def index(rom_dir, tmp_path):
+    index = DedupIndex(tmp_path / "dedup.db")
+    assert index.add_roms([rom_dir]) == {}
+    yield index
+    index.close()
+
+
+def test_shared_blocks_are_duplicates(index):
+    # the nsp and the xci hold the same ncas
+    stats = index.get_stats()
+    assert stats.total_bytes > 0
+    assert stats.duplicate_bytes == stats.total_bytes - stats.unique_bytes
+    assert stats.unique_bytes * 2 <= stats.total_bytes
+
+    files = index.get_stats("files")
+    assert files.unique_bytes * 2 <= files.total_bytes
+
+
+def test_candidates_and_uniqueness(index, rom_dir):
+    candidates = index.get_candidates()
+    assert candidates
+    assert all(x.count >= 2 and x.wasted_bytes > 0 for x in candidates)
+
+    uniqueness = {x.path: x for x in index.get_uniqueness()}
+    assert set(uniqueness) == {str(rom_dir / "game.nsp"), str(rom_dir / "game.xci")}
+    assert all(x.title_id == "0100000000001000" and x.ratio == 0.0 for x in uniqueness.values())
+
+
+def test_unchanged_roms_are_skipped(index, rom_dir):
+    assert not index.add_rom(rom_dir / "game.nsp")
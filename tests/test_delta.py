@@ -0,0 +1,49 @@
+from random import Random
+
+from benchmarks.fixtures import build_nca, build_romfs
+from nxroms.delta import _find_mismatch, diff_ncas
+from tests.helpers import open_nca
+
+BLOCK_LOG2 = 12
+
+
+def _romfs_nca(files: dict[str, bytes]):
+    return open_nca(build_nca([("romfs", build_romfs(files))], ivfc_block_log2=BLOCK_LOG2))
+
+
+def test_find_mismatch():
+    old = bytes(1000)
+    new = bytearray(old)
+    new[100] = 1
+    new[400] = 1
+    assert _find_mismatch(memoryview(old), memoryview(bytes(new))) == (100, 401)
+
+
+def test_diff_ncas():
+    rng = Random(0)
+    files = {f"dir/file{x}.bin": rng.randbytes(0x4000) for x in range(6)}
+
+    changed = bytearray(files["dir/file2.bin"])
+    changed[0x2100:0x2110] = bytes(0x10)
+
+    new_files = dict(files)
+    new_files["dir/file2.bin"] = bytes(changed)
+    del new_files["dir/file5.bin"]
+    new_files["dir/file6.bin"] = rng.randbytes(0x100)
+
+    result = diff_ncas(_romfs_nca(files), _romfs_nca(new_files))
+
+    status = {x.path.lstrip("/"): x.status for x in result.files}
+    assert status == {
+        "dir/file2.bin": "changed",
+        "dir/file5.bin": "removed",
+        "dir/file6.bin": "added",
+    }
+    assert result.unchanged == 4
+
+    (delta,) = result.get_status("changed")
+    assert delta.ranges == [(0x2100, 0x2110)]
+
+    # besides the changed block, only the blocks shared with the romfs header and
+    # the replaced file differ, every other block is skipped by its hash
+    assert result.bytes_read <= 3 * 2 * (1 << BLOCK_LOG2)
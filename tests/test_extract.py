@@ -0,0 +1,59 @@
+import zlib
+from hashlib import md5, sha1, sha256
+
+import pytest
+
+from nxroms.extract import (
+    extract,
+    extract_pfs,
+    extract_romfs,
+    read_manifest,
+    write_manifest,
+)
+from nxroms.readers import File, MemoryRegion
+from nxroms.roms.nsp import Nsp
+from tests.helpers import get_program_romfs
+
+
+def test_extract_romfs_with_hashes(rom_dir, tmp_path):
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        nca, header = get_program_romfs(Nsp(file))
+        romfs = nca.open_romfs(header)
+        manifest = extract_romfs(romfs, tmp_path / "out")
+        expected = {romfs.get_path(x).lstrip("/"): romfs.get_file(x).peek_at(0, x.size) for x in romfs.files}
+    finally:
+        file.close()
+
+    assert {x.name.lstrip("/") for x in manifest} == set(expected)
+    for x in manifest:
+        data = expected[x.name.lstrip("/")]
+        assert (tmp_path / "out" / x.name.lstrip("/")).read_bytes() == data
+        assert x.size == len(data)
+        assert x.digests == {
+            "crc32": f"{zlib.crc32(data):08x}",
+            "md5": md5(data).hexdigest(),
+            "sha1": sha1(data).hexdigest(),
+            "sha256": sha256(data).hexdigest(),
+        }
+
+
+def test_extract_pfs_and_manifest(rom_dir, tmp_path, entries):
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        manifest = extract_pfs(Nsp(file), tmp_path / "out", ("sha256",))
+    finally:
+        file.close()
+
+    assert [(x.name, x.digests["sha256"]) for x in manifest] == [
+        (name, sha256(data).hexdigest()) for name, data in entries
+    ]
+
+    write_manifest(manifest, tmp_path / "manifest.json")
+    assert read_manifest(tmp_path / "manifest.json") == manifest
+
+
+def test_extract_rejects_escaping_names(tmp_path):
+    with pytest.raises(ValueError):
+        extract([("../evil", MemoryRegion(b"x"), 1)], tmp_path / "out")
+    assert not (tmp_path / "evil").exists()
@@ -0,0 +1,52 @@
+import hashlib
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nxroms.hashes import HASH_ALGORITHMS, HASH_INLINE_SIZE, HashFeeder, new_hashers
+
+
+class FailingHasher:
+    def update(self, data: bytes):
+        raise ValueError("broken hasher")
+
+
+def _feed(data: bytes, size: int | None) -> dict[str, str]:
+    hashers = new_hashers(HASH_ALGORITHMS)
+    feeder = HashFeeder(list(hashers.values()), size)
+    for i in range(0, len(data), 0x10000):
+        feeder.update(data[i : i + 0x10000])
+    feeder.close()
+    return {k: v.hexdigest() for k, v in hashers.items()}
+
+
+@pytest.mark.parametrize("size", [0x1000, HASH_INLINE_SIZE * 2])
+def test_feeder_digests(size):
+    data = bytes(range(256)) * (size // 256)
+    expected = {x: hashlib.new(x, data).hexdigest() for x in HASH_ALGORITHMS if x != "crc32"}
+    expected["crc32"] = f"{zlib.crc32(data):08x}"
+
+    assert _feed(data, size) == expected
+    assert _feed(data, None) == expected
+
+
+def test_many_feeders_share_the_pool():
+    data = bytes(0x100000)
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(lambda _: _feed(data, None), range(32)))
+    assert all(x == results[0] for x in results)
+
+
+def test_hasher_errors_are_raised():
+    feeder = HashFeeder([hashlib.sha256(), FailingHasher()])
+
+    # the error shows up on a later update or on close, never as a hang
+    with pytest.raises(ValueError, match="broken hasher"):
+        for _ in range(16):
+            feeder.update(bytes(0x1000))
+        feeder.close()
+
+    inline = HashFeeder([FailingHasher()], size=0x10)
+    with pytest.raises(ValueError, match="broken hasher"):
+        inline.update(bytes(0x10))
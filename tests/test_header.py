@@ -0,0 +1,46 @@
+import pytest
+
+from nxroms.nca.header import NcaHeader
+
+NCA_HEADER_LEN = 0xC00
+
+
+def _fs_headers(header: NcaHeader) -> list[bytes]:
+    return [x.peek_at(0, 0x200) for x in header.fs_headers]
+
+
+@pytest.fixture(params=range(3), ids=["program", "control", "meta"])
+def raw(request, entries) -> bytes:
+    return entries[request.param][1][:NCA_HEADER_LEN]
+
+
+def test_lazy_matches_eager(raw):
+    eager = NcaHeader(raw)
+    lazy = NcaHeader(raw, lazy=True)
+
+    assert lazy.content_type == eager.content_type
+    assert lazy.program_id == eager.program_id
+    assert lazy.content_size == eager.content_size
+
+    # nothing past the main header was decrypted yet
+    assert lazy._fs_headers is None
+    assert lazy._encrypted_rest is not None
+
+    assert lazy.key_area.peek_at(0, 0x40) == eager.key_area.peek_at(0, 0x40)
+    assert [(x.start_offset, x.end_offset) for x in lazy.fs_entries] == [
+        (x.start_offset, x.end_offset) for x in eager.fs_entries
+    ]
+    assert _fs_headers(lazy) == _fs_headers(eager)
+    assert lazy.peek_at(0, NCA_HEADER_LEN) == eager.peek_at(0, NCA_HEADER_LEN)
+
+
+def test_decrypted_header_skips_decryption(raw):
+    eager = NcaHeader(raw)
+    copy = NcaHeader(
+        eager.peek_at(0, NCA_HEADER_LEN),
+        decrypted=True,
+        key_area=eager.key_area.peek_at(0, 0x40),
+    )
+
+    assert copy.key_area.peek_at(0, 0x40) == eager.key_area.peek_at(0, 0x40)
+    assert _fs_headers(copy) == _fs_headers(eager)
@@ -0,0 +1,48 @@
+import pytest
+
+from nxroms.crypto import Crypto
+from nxroms.instrument import Instrumentation
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from tests.helpers import get_program_romfs
+
+
+def test_counts_layers(rom_dir):
+    with Instrumentation() as stats:
+        file = File(str(rom_dir / "game.nsp"))
+        try:
+            nca, header = get_program_romfs(Nsp(file))
+            romfs = nca.open_romfs(header)
+            for x in romfs.files:
+                romfs.get_file(x).peek_at(0, x.size)
+        finally:
+            file.close()
+
+    snapshot = stats.snapshot()
+    layers = snapshot["layers"]
+    assert layers["file"]["calls"] > 0
+    assert layers["file"]["bytes"] > 0
+    assert layers["aes_ctr"]["aes_bytes"] >= layers["ctr"]["bytes"] > 0
+    assert layers["aes"]["aes_bytes"] > 0
+    assert snapshot["elapsed"] > 0
+
+    stats.reset()
+    assert all(x["calls"] == 0 for x in stats.snapshot()["layers"].values())
+
+
+def test_disable_restores_methods():
+    peek_at = File.__dict__["peek_at"]
+    aes_decrypt = Crypto.__dict__["aes_decrypt"]
+
+    stats = Instrumentation()
+    stats.enable()
+    try:
+        assert File.__dict__["peek_at"] is not peek_at
+        with pytest.raises(RuntimeError):
+            Instrumentation().enable()
+    finally:
+        stats.disable()
+
+    assert File.__dict__["peek_at"] is peek_at
+    assert "read" not in File.__dict__
+    assert Crypto.__dict__["aes_decrypt"] is aes_decrypt
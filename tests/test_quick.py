@@ -0,0 +1,23 @@
+import pytest
+
+from nxroms.quick import quick_info
+from nxroms.readers import ReadBudgetExceeded
+
+
+@pytest.mark.parametrize("name", ["game.nsp", "game.xci"])
+def test_quick_info(rom_dir, name):
+    info = quick_info(rom_dir / name)
+
+    assert info.title_id == "0100000000001000"
+    assert info.name == "Test Game"
+    assert info.publisher == "nxroms"
+    assert info.version == "1.0.0"
+
+    # only the tables, headers and nacp titles are read, not the roms
+    assert info.bytes_read < 0x8000
+    assert info.bytes_read < (rom_dir / name).stat().st_size // 4
+
+
+def test_quick_info_budget(rom_dir):
+    with pytest.raises(ReadBudgetExceeded):
+        quick_info(rom_dir / "game.nsp", budget=0x100)
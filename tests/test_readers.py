@@ -0,0 +1,119 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nxroms.readers import (
+    FdPool,
+    File,
+    MultiFile,
+    find_split_parts,
+    is_xci,
+    open_split,
+)
+from nxroms.roms.nsp import Nsp
+
+
+def _split(data: bytes, sizes: list[int]) -> list[bytes]:
+    parts = []
+    for size in sizes:
+        parts.append(data[:size])
+        data = data[size:]
+    return parts + [data]
+
+
+@pytest.fixture
+def split_dir(rom_dir, tmp_path):
+    data = (rom_dir / "game.nsp").read_bytes()
+    path = tmp_path / "game.nsp"
+    path.mkdir()
+    for index, part in enumerate(_split(data, [0x1234, 0x8000])):
+        (path / f"{index:02d}").write_bytes(part)
+    return path
+
+
+def test_multifile_reads_across_parts(tmp_path):
+    data = os.urandom(0x3000)
+    paths = []
+    for index, part in enumerate(_split(data, [0x1000, 0x10, 0x7F0])):
+        paths.append(tmp_path / f"{index:02d}")
+        paths[-1].write_bytes(part)
+
+    file = MultiFile(paths, FdPool(max_open=1))
+    assert file.size == len(data)
+
+    for offset, size in [(0, 0x3000), (0xFF0, 0x20), (0x1008, 0x10), (0x17F0, 0x100), (0x2FF0, 0x100)]:
+        assert file.peek_at(offset, size) == data[offset : offset + size]
+
+    file.seek(0xFFE)
+    assert file.read(4) == data[0xFFE:0x1002]
+    assert file.tell() == 0x1002
+
+
+def test_multifile_concurrent_reads(tmp_path):
+    data = os.urandom(0x10000)
+    paths = []
+    for index, part in enumerate(_split(data, [0x3000] * 4)):
+        paths.append(tmp_path / f"{index:02d}")
+        paths[-1].write_bytes(part)
+
+    file = MultiFile(paths, FdPool(max_open=2))
+    offsets = range(0, 0x10000 - 0x500, 0x333)
+    with ThreadPoolExecutor(8) as executor:
+        chunks = list(executor.map(lambda x: file.peek_at(x, 0x500), offsets))
+
+    assert chunks == [data[x : x + 0x500] for x in offsets]
+
+
+def test_split_directory_opens_as_one_rom(split_dir, rom_dir):
+    assert find_split_parts(split_dir) == [str(split_dir / "00"), str(split_dir / "01"), str(split_dir / "02")]
+
+    split = open_split(split_dir)
+    plain = File(str(rom_dir / "game.nsp"))
+    try:
+        assert [x.entry.name for x in Nsp(split).get_items()] == [
+            x.entry.name for x in Nsp(plain).get_items()
+        ]
+    finally:
+        plain.close()
+
+
+def test_split_extension_parts(rom_dir, tmp_path):
+    data = (rom_dir / "game.xci").read_bytes()
+    for index, part in enumerate(_split(data, [0x10000])):
+        (tmp_path / f"game.xc{index}").write_bytes(part)
+
+    parts = find_split_parts(tmp_path / "game.xc0")
+    assert parts == [str(tmp_path / "game.xc0"), str(tmp_path / "game.xc1")]
+    assert open_split(tmp_path / "game.xc0").peek_at(0, len(data)) == data
+
+
+def test_split_extension_gap_is_an_error(tmp_path):
+    for name in ["game.xc0", "game.xc1", "game.xc3"]:
+        (tmp_path / name).write_bytes(b"data")
+
+    with pytest.raises(ValueError, match="game.xc2"):
+        find_split_parts(tmp_path / "game.xc0")
+
+
+def test_find_split_parts_ignores_other_folders(tmp_path):
+    (tmp_path / "2024").mkdir()
+    (tmp_path / "0100000000001000").mkdir()
+    assert find_split_parts(tmp_path) is None
+
+    # gaps and folders aren't parts
+    (tmp_path / "00").write_bytes(b"a")
+    (tmp_path / "02").write_bytes(b"b")
+    assert find_split_parts(tmp_path) is None
+
+    (tmp_path / "01").mkdir()
+    assert find_split_parts(tmp_path) is None
+
+    assert find_split_parts(tmp_path / "game.nsp") is None
+
+
+def test_is_xci():
+    assert is_xci("a/game.XCI")
+    assert is_xci("game.xc0")
+    assert not is_xci("game.nsp")
+    assert not is_xci("game.xc1")
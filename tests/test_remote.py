@@ -0,0 +1,73 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nxroms.quick import quick_info
+from nxroms.remote import HttpError, HttpFile
+from nxroms.roms.nsp import Nsp
+from tests.helpers import RangeHandler, serve_files
+
+
+class FirstRangeHandler(RangeHandler):
+    # like a server that stops honouring ranges after the first request
+    def do_GET(self):
+        if not self.headers.get("Range", "").startswith("bytes=0-"):
+            del self.headers["Range"]
+        super().do_GET()
+
+
+def test_http_file_ranges(file_server, rom_dir):
+    data = (rom_dir / "game.nsp").read_bytes()
+    file = HttpFile(f"{file_server}/game.nsp", block_size=0x1000, cache_blocks=8)
+    try:
+        assert file.size == len(data)
+
+        for offset, size in [(0, 0x10), (0xFF0, 0x20), (0x5000, 0x3800), (len(data) - 5, 0x100)]:
+            assert file.peek_at(offset, size) == data[offset : offset + size]
+        assert file.peek_at(len(data), 0x10) == b""
+
+        # a cached block isn't requested again
+        requests = file.requests
+        file.peek_at(0x5000, 0x10)
+        assert file.requests == requests
+    finally:
+        file.close()
+
+
+def test_http_file_concurrent_reads(file_server, rom_dir):
+    data = (rom_dir / "game.nsp").read_bytes()
+    file = HttpFile(f"{file_server}/game.nsp", block_size=0x1000)
+    try:
+        offsets = range(0, len(data) - 0x2000, 0x1800)
+        with ThreadPoolExecutor(8) as executor:
+            chunks = list(executor.map(lambda x: file.peek_at(x, 0x2000), offsets))
+        assert chunks == [data[x : x + 0x2000] for x in offsets]
+
+        # every block was fetched once
+        assert file.bytes_fetched <= len(data) + 0x1000
+    finally:
+        file.close()
+
+
+def test_parse_over_http(file_server):
+    file = HttpFile(f"{file_server}/game.nsp")
+    try:
+        assert len(Nsp(file).get_ncas()) == 3
+    finally:
+        file.close()
+
+    info = quick_info(f"{file_server}/game.xci")
+    assert info.name == "Test Game"
+
+
+def test_http_file_rejects_ignored_ranges(rom_dir):
+    with serve_files(rom_dir, FirstRangeHandler) as url:
+        file = HttpFile(f"{url}/game.nsp", block_size=0x1000)
+        try:
+            with pytest.raises(HttpError):
+                file.peek_at(0x5000, 0x10)
+
+            # nothing was cached from the whole file response
+            assert 5 not in file._blocks
+        finally:
+            file.close()
@@ -0,0 +1,142 @@
+import os
+import shutil
+from pathlib import Path
+
+import pytest
+
+from nxroms import scanner as scanner_module
+from nxroms.scanner import (
+    JsonlCatalog,
+    LibraryScanner,
+    ScanRecord,
+    find_roms,
+    scan_file,
+    walk_roms,
+)
+from nxroms.trace import ChromeTraceSink, tracing
+
+
+@pytest.fixture
+def library(rom_dir, tmp_path) -> Path:
+    lib = tmp_path / "lib"
+    (lib / "nsp").mkdir(parents=True)
+    (lib / "xci").mkdir()
+    shutil.copy(rom_dir / "game.nsp", lib / "nsp" / "game.nsp")
+    shutil.copy(rom_dir / "game.xci", lib / "xci" / "game.xci")
+    (lib / "xci" / "notes.txt").write_text("not a rom")
+    return lib
+
+
+def test_scan_file(rom_dir):
+    for name in ("game.nsp", "game.xci"):
+        record = scan_file(str(rom_dir / name))
+        assert record.error is None
+        assert record.title_id == "0100000000001000"
+        assert record.name == "Test Game"
+        assert record.content_types == ["CONTROL", "META", "PROGRAM"]
+
+
+def test_scan_file_reports_errors(tmp_path):
+    path = tmp_path / "broken.nsp"
+    path.write_bytes(b"junk" * 0x100)
+    assert "InvalidHeader" in scan_file(str(path)).error
+
+
+def test_split_dump_missing_a_part(tmp_path):
+    for name in ["game.xc0", "game.xc2"]:
+        (tmp_path / name).write_bytes(b"data")
+
+    # it isn't listed until the part shows up, a direct scan reports it
+    assert list(find_roms([tmp_path])) == []
+    assert "Missing part game.xc1" in scan_file(str(tmp_path / "game.xc0")).error
+
+
+def test_find_roms_in_numbered_folders(rom_dir, tmp_path):
+    # laid out by title id and year, like many libraries
+    (tmp_path / "0100000000001000").mkdir()
+    (tmp_path / "2024").mkdir()
+    shutil.copy(rom_dir / "game.nsp", tmp_path / "0100000000001000" / "game.nsp")
+    shutil.copy(rom_dir / "game.xci", tmp_path / "2024" / "game.xci")
+
+    assert [Path(x).relative_to(tmp_path) for x in find_roms([tmp_path])] == [
+        Path("0100000000001000/game.nsp"),
+        Path("2024/game.xci"),
+    ]
+
+
+def test_walk_survives_symlink_loops(library):
+    os.symlink("..", library / "xci" / "up")
+    os.symlink("self", library / "self")
+
+    assert len(list(walk_roms([library]))) == 2
+
+
+@pytest.mark.parametrize("catalog", ["catalog.jsonl", "catalog.db"])
+def test_library_scan_is_incremental(library, keys, tmp_path, catalog):
+    scanner = LibraryScanner(tmp_path / catalog, jobs=2, key_path=str(keys))
+    try:
+        changes = scanner.update([library])
+        assert len(changes.added) == 2
+        assert all(x.error is None for x in changes.added)
+
+        assert not scanner.update([library])
+
+        nsp = library / "nsp" / "game.nsp"
+        st = os.stat(nsp)
+        os.utime(nsp, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        os.remove(library / "xci" / "game.xci")
+
+        changes = scanner.update([library])
+        assert [x.path for x in changes.changed] == [str(nsp)]
+        assert changes.removed == [str(library / "xci" / "game.xci")]
+    finally:
+        scanner.close()
+
+    scanner = LibraryScanner(tmp_path / catalog, jobs=1, key_path=str(keys))
+    try:
+        assert list(scanner.catalog.load()) == [str(nsp)]
+    finally:
+        scanner.close()
+
+
+def test_jsonl_catalog_compacts_stale_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(scanner_module, "JSONL_COMPACT_MIN_STALE", 4)
+    catalog = JsonlCatalog(tmp_path / "catalog.jsonl")
+    try:
+        for mtime in range(3):
+            catalog.write(ScanRecord("/roms/a.nsp", 1, mtime, 1))
+        catalog.write(ScanRecord("/roms/b.nsp", 1, 0, 1))
+        catalog.remove("/roms/b.nsp")
+
+        # 4 stale lines, not more than the minimum yet
+        assert list(catalog.load()) == ["/roms/a.nsp"]
+        assert len(catalog.path.read_text().splitlines()) == 5
+
+        catalog.write(ScanRecord("/roms/a.nsp", 1, 3, 1))
+        records = catalog.load()
+        assert records["/roms/a.nsp"].mtime == 3
+        assert len(catalog.path.read_text().splitlines()) == 1
+
+        # appending still works after the rewrite
+        catalog.write(ScanRecord("/roms/c.nsp", 1, 0, 1))
+        assert list(catalog.load()) == ["/roms/a.nsp", "/roms/c.nsp"]
+    finally:
+        catalog.close()
+
+
+def test_update_needs_a_catalog(library):
+    scanner = LibraryScanner(None, jobs=1)
+    with pytest.raises(ValueError, match="needs a catalog"):
+        scanner.update([library])
+
+
+def test_worker_spans_reach_the_parent(rom_dir, keys, tmp_path):
+    sink = ChromeTraceSink(tmp_path / "trace.json")
+    with tracing(sink):
+        scanner = LibraryScanner(None, jobs=2, key_path=str(keys))
+        records = list(scanner.scan_paths([str(rom_dir / "game.nsp"), str(rom_dir / "game.xci")]))
+
+    assert len(records) == 2
+    scans = [x for x in sink.events if x["name"] == "scan"]
+    assert len(scans) == 2
+    assert all(x["pid"] != os.getpid() for x in scans)
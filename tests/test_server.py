@@ -0,0 +1,95 @@
+import json
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+import pytest
+
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from nxroms.server import RomServer, parse_range
+from tests.helpers import get_program_romfs, serving
+
+
+def get(url: str, headers: dict | None = None):
+    with urlopen(Request(url, headers=headers or {})) as response:
+        return response.status, dict(response.headers), response.read()
+
+
+def get_error(url: str, headers: dict | None = None) -> int:
+    with pytest.raises(HTTPError) as e:
+        get(url, headers)
+    return e.value.code
+
+
+def test_listing(rom_server, entries):
+    status, headers, body = get(f"{rom_server}/game.nsp/")
+    assert status == 200
+    assert headers["Content-Type"] == "application/json"
+    assert json.loads(body) == [name for name, _ in entries]
+
+    _, _, body = get(f"{rom_server}/game.xci/")
+    assert json.loads(body) == ["update", "normal", "secure"]
+
+
+def test_romfs_file_with_range(rom_server, rom_dir):
+    file = File(str(rom_dir / "game.nsp"))
+    try:
+        nca, header = get_program_romfs(Nsp(file))
+        romfs = nca.open_romfs(header)
+        x = romfs.files[-1]
+        path, data = romfs.get_path(x), romfs.get_file(x).peek_at(0, x.size)
+    finally:
+        file.close()
+
+    url = f"{rom_server}/game.xci/secure/{nca.entry.name}/romfs/{quote(path.lstrip('/'))}"
+
+    status, _, body = get(url)
+    assert (status, body) == (200, data)
+
+    status, headers, body = get(url, {"Range": "bytes=16-31"})
+    assert (status, body) == (206, data[16:32])
+    assert headers["Content-Range"] == f"bytes 16-31/{len(data)}"
+
+    assert get_error(url, {"Range": f"bytes={len(data)}-"}) == 416
+
+    # an invalid range is ignored
+    status, _, body = get(url, {"Range": "bytes=31-16"})
+    assert (status, body) == (200, data)
+
+
+def test_errors(rom_server, tmp_path):
+    assert get_error(f"{rom_server}/missing.nsp/") == 404
+    assert get_error(f"{rom_server}/game.nsp/missing.nca") == 404
+    assert get_error(f"{rom_server}/../game.nsp") == 404
+
+
+def test_corrupt_roms_get_an_error_status(tmp_path):
+    (tmp_path / "junk.nsp").write_bytes(b"junk" * 0x400)
+    (tmp_path / "junk.xci").write_bytes(b"junk" * 0x4000)
+
+    with serving(RomServer(tmp_path, ("127.0.0.1", 0))) as url:
+        assert get_error(f"{url}/junk.nsp/") == 422
+        assert get_error(f"{url}/junk.xci/") == 422
+
+
+def test_unexpected_errors_get_a_500(rom_server, monkeypatch):
+    def fail(*args):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("nxroms.server.resolve", fail)
+    assert get_error(f"{rom_server}/game.nsp/") == 500
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=10-19", 100) == (10, 20)
+    assert parse_range("bytes=90-", 100) == (90, 100)
+    assert parse_range("bytes=90-200", 100) == (90, 100)
+    assert parse_range("bytes=-10", 100) == (90, 100)
+    assert parse_range("bytes=50-10", 100) is None
+
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+    with pytest.raises(ValueError):
+        parse_range("bytes=-0", 100)
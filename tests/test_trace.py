@@ -0,0 +1,46 @@
+import json
+import logging
+
+from nxroms.scanner import scan_file
+from nxroms.trace import ChromeTraceSink, LoggingSink, span, tracing
+
+
+def test_no_sink_times_nothing():
+    with span("nothing") as x:
+        assert x is None
+
+
+def test_spans_nest():
+    spans = []
+    with tracing(spans.append), span("outer", "game.nsp", size=1), span("inner"):
+        pass
+
+    inner, outer = spans
+    assert (outer.name, outer.depth, outer.args) == ("outer", 0, {"size": 1})
+    assert (inner.name, inner.depth, inner.container) == ("inner", 1, "game.nsp")
+    assert outer.start <= inner.start
+    assert inner.duration <= outer.duration
+
+
+def test_chrome_trace(rom_dir, tmp_path):
+    path = tmp_path / "trace.json"
+    with tracing(ChromeTraceSink(path)):
+        scan_file(str(rom_dir / "game.nsp"))
+
+    events = json.loads(path.read_text())["traceEvents"]
+    assert any(x["name"] == "scan" for x in events)
+    assert all(x["ph"] == "X" and x["dur"] >= 0 for x in events)
+    assert [x["ts"] for x in events] == sorted(x["ts"] for x in events)
+
+
+def test_logging_sink(caplog):
+    with (
+        caplog.at_level(logging.DEBUG, "nxroms.trace"),
+        tracing(LoggingSink()),
+        span("outer", "game.nsp"),
+        span("inner"),
+    ):
+        pass
+
+    assert [x.getMessage().split()[0] for x in caplog.records] == ["inner", "outer"]
+    assert caplog.records[0].getMessage().startswith("  inner")
@@ -0,0 +1,93 @@
+import os
+
+import pytest
+
+from nxroms.readers import File
+from nxroms.roms.trim import PaddingError, trim_xci, untrim_xci
+from nxroms.roms.xci import Xci
+from tests.helpers import flip_byte
+
+
+def _used_size(path) -> int:
+    file = File(str(path))
+    try:
+        return Xci(file).used_size()
+    finally:
+        file.close()
+
+
+def test_trim_to_other_file(xci_path, tmp_path):
+    used = _used_size(xci_path)
+    data = xci_path.read_bytes()
+    assert used < len(data)
+
+    assert trim_xci(xci_path, tmp_path / "out.xci") == used
+    assert (tmp_path / "out.xci").read_bytes() == data[:used]
+    assert xci_path.read_bytes() == data
+
+
+@pytest.mark.parametrize("out", [None, "same", "relative"])
+def test_trim_in_place(xci_path, out, monkeypatch):
+    data = xci_path.read_bytes()
+    used = _used_size(xci_path)
+
+    if out == "same":
+        out = xci_path
+    elif out == "relative":
+        monkeypatch.chdir(xci_path.parent)
+        out = "./" + xci_path.name
+
+    assert trim_xci(xci_path, out) == used
+    assert xci_path.read_bytes() == data[:used]
+
+
+def test_trim_keeps_data_after_used_size(xci_path, tmp_path):
+    used = _used_size(xci_path)
+    flip_byte(xci_path, used + 0x100)
+
+    with pytest.raises(PaddingError) as e:
+        trim_xci(xci_path, tmp_path / "out.xci")
+    assert e.value.offset >= used
+    assert not (tmp_path / "out.xci").exists()
+
+
+def test_untrim_round_trip(xci_path, tmp_path):
+    data = xci_path.read_bytes()
+    used = trim_xci(xci_path, tmp_path / "trimmed.xci")
+
+    # a small reserve would make a card sized image, this keeps it small
+    reserve = 0x40000000 - len(data) - 0x1000
+    capacity = untrim_xci(tmp_path / "trimmed.xci", tmp_path / "full.xci", reserve)
+
+    full = (tmp_path / "full.xci").read_bytes()
+    assert capacity == len(full) == len(data) + 0x1000
+    assert full[: len(data)] == data
+    assert full[len(data) :] == b"\xff" * 0x1000
+
+    assert trim_xci(tmp_path / "full.xci", tmp_path / "again.xci") == used
+    assert (tmp_path / "again.xci").read_bytes() == data[:used]
+
+
+def test_untrim_in_place(xci_path):
+    data = xci_path.read_bytes()
+    used = trim_xci(xci_path)
+
+    reserve = 0x40000000 - len(data) - 0x1000
+    assert untrim_xci(xci_path, xci_path, reserve) == len(data) + 0x1000
+    assert xci_path.read_bytes()[: len(data)] == data
+    assert trim_xci(xci_path) == used
+
+
+def test_split_part_as_output_is_rejected(xci_path, tmp_path):
+    data = xci_path.read_bytes()
+    parts = tmp_path / "split"
+    parts.mkdir()
+    (parts / "game.xc0").write_bytes(data[:0x8000])
+    (parts / "game.xc1").write_bytes(data[0x8000:])
+
+    with pytest.raises(ValueError):
+        trim_xci(parts / "game.xc0", parts / "game.xc1")
+    assert os.path.getsize(parts / "game.xc1") == len(data) - 0x8000
+
+    trim_xci(parts / "game.xc0", tmp_path / "joined.xci")
+    assert (tmp_path / "joined.xci").read_bytes() == data[: _used_size(xci_path)]
@@ -0,0 +1,205 @@
+import pytest
+
+from nxroms.fs.fs import UnsupportedHashType
+from nxroms.nca.verify import IntegrityError
+from nxroms.readers import File
+from nxroms.roms.nsp import Nsp
+from nxroms.roms.verify import get_name_hash, hash_items
+from nxroms.roms.xci import Xci
+from tests.helpers import flip_byte, get_program_romfs, romfs_data_offset
+
+
+def test_verify_sections_of_valid_rom(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        for nca in Nsp(file).get_ncas():
+            for header in nca.header.fs_headers:
+                assert nca.verify(header).valid
+    finally:
+        file.close()
+
+
+def test_verify_finds_flipped_byte(nsp_path):
+    flip_byte(nsp_path, romfs_data_offset(nsp_path) + 0x10)
+
+    file = File(str(nsp_path))
+    try:
+        nca, header = get_program_romfs(Nsp(file))
+        result = nca.verify(header)
+    finally:
+        file.close()
+
+    assert not result.valid
+    assert result.levels[-1].first_bad_block == 0
+    assert all(x.valid for x in result.levels[:-1])
+
+
+def test_verified_readable_matches_plain_reads(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        nca, header = get_program_romfs(Nsp(file))
+        verified = nca.open_romfs(header, verify=True)
+        plain = nca.open_romfs(header)
+
+        for x in plain.files:
+            assert verified.get_file(x).peek_at(0, x.size) == plain.get_file(x).peek_at(0, x.size)
+    finally:
+        file.close()
+
+
+def test_verified_readable_rejects_flipped_byte(nsp_path):
+    flip_byte(nsp_path, romfs_data_offset(nsp_path) + 0x10)
+
+    file = File(str(nsp_path))
+    try:
+        nca, header = get_program_romfs(Nsp(file))
+        section = nca.open_fs(header, verify=True)
+        with pytest.raises(IntegrityError):
+            section.peek_at(0, 0x100)
+    finally:
+        file.close()
+
+
+def test_verify_ncas(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        results = Nsp(file).verify_ncas(workers=2)
+    finally:
+        file.close()
+
+    assert len(results) == 3
+    assert all(x.valid for x in results)
+
+
+def test_verify_ncas_against_cnmt(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        results = Nsp(file).verify_ncas()
+    finally:
+        file.close()
+
+    # the program and control ncas are listed in the cnmt with their full hash
+    assert sum(len(x.expected) == 0x20 for x in results) == 2
+    assert all(x.valid for x in results)
+
+
+def test_verify_ncas_finds_flipped_byte(nsp_path, entries):
+    flip_byte(nsp_path, romfs_data_offset(nsp_path) + 0x10)
+
+    file = File(str(nsp_path))
+    try:
+        results = {x.name: x.valid for x in Nsp(file).verify_ncas()}
+    finally:
+        file.close()
+
+    # the program nca comes first
+    assert results.pop(entries[0][0]) is False
+    assert all(results.values())
+
+
+def test_hash_items_keeps_order(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        items = Nsp(file).get_items()
+        digests = hash_items(items, workers=4, chunk_size=0x1000)
+        for item, digest in zip(items, digests):
+            expected = get_name_hash(item.entry.name)
+            if expected is not None:
+                assert digest.startswith(expected)
+    finally:
+        file.close()
+
+
+def test_get_name_hash():
+    assert get_name_hash("00" * 16 + ".cnmt.nca") == bytes(16)
+    assert get_name_hash("ticket.tik") is None
+    assert get_name_hash("zz" * 16 + ".nca") is None
+
+
+def test_verify_partitions(xci_path):
+    file = File(str(xci_path))
+    try:
+        checks = Xci(file).verify_partitions(deep=True, workers=2)
+    finally:
+        file.close()
+
+    names = [x.name for x in checks]
+    assert names[:4] == ["root", "update", "normal", "secure"]
+    assert any(x.startswith("secure/") for x in names)
+    assert all(x.valid for x in checks)
+
+
+def test_verify_partitions_finds_flipped_byte(xci_path):
+    file = File(str(xci_path))
+    try:
+        xci = Xci(file)
+        secure = next(x for x in xci.hfs_header.entry_table if x.name == "secure")
+        offset = xci.header.hfs_header_offset + xci.hfs_header.raw_data_pos + secure.offset
+    finally:
+        file.close()
+
+    # inside the header of the secure partition, which its hash covers
+    flip_byte(xci_path, offset + 0x20)
+
+    file = File(str(xci_path))
+    try:
+        checks = {x.name: x.valid for x in Xci(file).verify_partitions()}
+    finally:
+        file.close()
+
+    assert checks == {"root": True, "update": True, "normal": True, "secure": False}
+
+
+def test_deep_verify_reports_unreadable_partition(xci_path):
+    file = File(str(xci_path))
+    try:
+        xci = Xci(file)
+        secure = next(x for x in xci.hfs_header.entry_table if x.name == "secure")
+        offset = xci.header.hfs_header_offset + xci.hfs_header.raw_data_pos + secure.offset
+    finally:
+        file.close()
+
+    # the magic of the secure partition, so it can't be opened
+    flip_byte(xci_path, offset)
+
+    file = File(str(xci_path))
+    try:
+        checks = Xci(file).verify_partitions(deep=True)
+    finally:
+        file.close()
+
+    assert [x.valid for x in checks if x.name == "secure"] == [False, False]
+    assert all(x.valid for x in checks if x.name.startswith("normal"))
+
+
+def test_hash_items_with_fewer_workers_than_items(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        items = Nsp(file).get_items()
+        assert hash_items(items, workers=1, chunk_size=0x1000) == hash_items(items, workers=len(items))
+    finally:
+        file.close()
+
+
+def test_hash_items_reports_truncated_item(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        items = Nsp(file).get_items()
+        with open(nsp_path, "r+b") as f:
+            f.truncate(f.seek(0, 2) - 1)
+
+        with pytest.raises(EOFError):
+            hash_items(items, workers=1, chunk_size=0x1000)
+    finally:
+        file.close()
+
+
+def test_unsupported_hash_type(nsp_path):
+    file = File(str(nsp_path))
+    try:
+        nca, header = get_program_romfs(Nsp(file))
+        header.hash_type = None
+        with pytest.raises(UnsupportedHashType):
+            nca.open_fs(header)
+    finally:
+        file.close()